@@ -0,0 +1,169 @@
+"""
+activity_utils.py — buffered ActivityLog writes.
+
+``_log_activity`` (views) appends to a per-request buffer installed by
+``api.middleware.ActivityLogBufferMiddleware``; the buffer is flushed with one
+``bulk_create`` once the response has been sent, so activity logging adds no
+INSERT to a write request's latency.
+
+With ``ACTIVITY_LOG_SPOOL_URL`` set, flushes push the entries onto a Redis list
+instead, and ``drain_activity_spool`` (Celery task / cron endpoint) inserts
+them in batches.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SPOOL_KEY = "equilo:activity_spool"
+
+_spool_client = None
+
+
+def _spool_url() -> str:
+    return (getattr(settings, "ACTIVITY_LOG_SPOOL_URL", "") or "").strip()
+
+
+def _get_spool_client():
+    global _spool_client
+    if _spool_client is None:
+        import redis
+
+        _spool_client = redis.Redis.from_url(_spool_url(), socket_connect_timeout=2, socket_timeout=2)
+    return _spool_client
+
+
+def _serialize(entry) -> str:
+    return json.dumps({
+        "user_id": entry.user_id,
+        "type": entry.type,
+        "place_id": entry.place_id,
+        "expense_id": entry.expense_id,
+        "target_user_id": entry.target_user_id,
+        "amount": str(entry.amount) if entry.amount is not None else None,
+        "description": entry.description,
+        "extra": entry.extra,
+        "created_at": entry.created_at.isoformat(),
+    })
+
+
+def _deserialize(raw):
+    from .models import ActivityLog
+
+    row = json.loads(raw)
+    row["amount"] = Decimal(row["amount"]) if row.get("amount") is not None else None
+    row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return ActivityLog(**row)
+
+
+def write_activity_entries(entries) -> None:
+    """Insert entries now with one bulk_create (falls back to per-row on error)."""
+    from .models import ActivityLog
+
+    entries = list(entries)
+    if not entries:
+        return
+    try:
+        ActivityLog.objects.bulk_create(entries)
+    except Exception:
+        logger.warning("activity log bulk insert failed; retrying row by row", exc_info=True)
+        for entry in entries:
+            try:
+                entry.save()
+            except Exception:
+                logger.warning("activity log insert failed for type=%s", entry.type, exc_info=True)
+
+
+class ActivityLogBuffer:
+    """Collects ActivityLog instances during one request."""
+
+    def __init__(self):
+        self.entries = []
+
+    def append(self, entry) -> None:
+        self.entries.append(entry)
+
+    def discard(self) -> None:
+        """Drop everything collected (the request failed)."""
+        self.entries = []
+
+    def flush(self) -> None:
+        entries, self.entries = self.entries, []
+        if not entries:
+            return
+        if _spool_url():
+            try:
+                _get_spool_client().rpush(SPOOL_KEY, *[_serialize(e) for e in entries])
+                return
+            except Exception:
+                logger.warning("activity spool push failed; writing directly", exc_info=True)
+        write_activity_entries(entries)
+
+
+def _drop_dangling(entries):
+    """
+    Mirror the FK on_delete rules for rows whose targets vanished while spooled:
+    CASCADE (user, place) drops the entry, SET_NULL (expense, target_user) clears it.
+    """
+    from django.contrib.auth import get_user_model
+
+    from .models import Expense, Place
+
+    User = get_user_model()
+    user_ids = {e.user_id for e in entries} | {e.target_user_id for e in entries if e.target_user_id}
+    place_ids = {e.place_id for e in entries if e.place_id}
+    expense_ids = {e.expense_id for e in entries if e.expense_id}
+    live_users = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+    live_places = set(Place.objects.filter(id__in=place_ids).values_list("id", flat=True))
+    live_expenses = set(Expense.objects.filter(id__in=expense_ids).values_list("id", flat=True))
+    kept = []
+    for e in entries:
+        if e.user_id not in live_users or (e.place_id and e.place_id not in live_places):
+            continue
+        if e.expense_id and e.expense_id not in live_expenses:
+            e.expense_id = None
+        if e.target_user_id and e.target_user_id not in live_users:
+            e.target_user_id = None
+        kept.append(e)
+    return kept
+
+
+def drain_activity_spool(batch_size: int = 500, max_batches: int = 20, budget=None) -> dict:
+    """
+    Move spooled entries into ActivityLog, batch_size rows per bulk_create.
+    With a ``budget`` (cron_utils.TimeBudget), no new batch starts once it is spent.
+    The spool list itself is the cursor, so a later call simply continues.
+    """
+    from .models import ActivityLog
+
+    if not _spool_url():
+        return {"drained": 0, "remaining": 0}
+    client = _get_spool_client()
+    drained = 0
+    for n in range(max_batches):
+        if budget is not None and n and budget.expired():
+            break
+        pipe = client.pipeline(transaction=True)
+        pipe.lrange(SPOOL_KEY, 0, batch_size - 1)
+        pipe.ltrim(SPOOL_KEY, batch_size, -1)
+        raw_batch, _ = pipe.execute()
+        if not raw_batch:
+            break
+        try:
+            entries = _drop_dangling([_deserialize(raw) for raw in raw_batch])
+            ActivityLog.objects.bulk_create(entries)
+        except Exception:
+            # Put the batch back at the head so the next drain retries it.
+            client.lpush(SPOOL_KEY, *reversed(raw_batch))
+            logger.warning("activity spool drain failed; batch requeued", exc_info=True)
+            break
+        drained += len(entries)
+        if len(raw_batch) < batch_size:
+            break
+    return {"drained": drained, "remaining": client.llen(SPOOL_KEY)}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Place, PlaceMember, ExpenseCategory, Expense, ExpenseSplit, PlaceInvite, Notification
+from .models import Place, PlaceMember, ExpenseCategory, Expense, ExpenseSplit, PlaceInvite, Notification, EmailOutbox
 
 
 @admin.register(Place)
@@ -34,6 +34,13 @@ class ExpenseAdmin(admin.ModelAdmin):
     inlines = [ExpenseSplitInline]
 
 
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['to_email', 'subject', 'template_name', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'template_name']
+    search_fields = ['to_email', 'subject']
+
+
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ['user', 'type', 'title', 'place', 'is_read', 'created_at']
@@ -5,3 +5,10 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = 'REST API'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from .search_utils import ensure_fts_triggers
+
+        post_migrate.connect(ensure_fts_triggers, sender=self)
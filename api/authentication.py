@@ -1,17 +1,29 @@
+import logging
+
+from django.conf import settings
 from django.utils import timezone
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication as BaseJWTAuthentication
 
 from .models import UserSession
+from .session_utils import is_session_revoked, record_session_touch
+
+logger = logging.getLogger(__name__)
 
 
 class SessionTrackingJWTAuthentication(BaseJWTAuthentication):
     """
-    JWT auth + session row check + last_used_at bump when access carries `sid`.
+    JWT auth + session revocation check + last_used_at bump when access carries `sid`.
 
-    If `sid` is present, the UserSession row must still exist. Revoking a session
-    deletes that row, so the next API call with that access token fails auth and
-    the client is forced to re-authenticate (not only after access expiry).
+    If `sid` is present, the session must not have been revoked. Revoking a session
+    deletes its row and (via session_utils.mark_sessions_revoked) adds its id to a
+    cache-backed revocation set, so the next API call with that access token fails
+    auth and the client is forced to re-authenticate (not only after access expiry).
+
+    With SESSION_REVOCATION_FAST_PATH on (shared cache), the check is one cache read
+    and last_used_at is buffered in Redis and written in bulk by a drainer — no DB
+    query per request. Otherwise (or when the cache is unreachable) the UserSession
+    row is checked in the DB.
     """
 
     def authenticate(self, request):
@@ -19,16 +31,42 @@ class SessionTrackingJWTAuthentication(BaseJWTAuthentication):
         if not result:
             return result
         user, validated_token = result
+        self.check_session(user, validated_token)
+        return result
+
+    def authenticate_raw_token(self, raw_token):
+        """Authenticate a bare access token (e.g. from a query string). Returns (user, token)."""
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        self.check_session(user, validated_token)
+        return user, validated_token
+
+    def check_session(self, user, validated_token):
+        """Raise AuthenticationFailed if the token's `sid` session has been revoked."""
         sid = None
         try:
             sid = validated_token.get('sid')
         except Exception:
             pass
-        if sid is not None:
-            if not UserSession.objects.filter(pk=sid, user_id=user.id).exists():
-                raise AuthenticationFailed(
-                    'Session has been revoked or expired.',
-                    code='session_revoked',
-                )
-            UserSession.objects.filter(pk=sid, user_id=user.id).update(last_used_at=timezone.now())
-        return result
+        if sid is None:
+            return
+        if getattr(settings, 'SESSION_REVOCATION_FAST_PATH', False):
+            try:
+                revoked = is_session_revoked(sid)
+            except Exception:
+                logger.warning('session revocation cache read failed; checking DB', exc_info=True)
+            else:
+                if revoked:
+                    self._session_revoked()
+                record_session_touch(sid, timezone.now())
+                return
+        if not UserSession.objects.filter(pk=sid, user_id=user.id).exists():
+            self._session_revoked()
+        UserSession.objects.filter(pk=sid, user_id=user.id).update(last_used_at=timezone.now())
+
+    @staticmethod
+    def _session_revoked():
+        raise AuthenticationFailed(
+            'Session has been revoked or expired.',
+            code='session_revoked',
+        )
@@ -0,0 +1,132 @@
+"""
+blacklist_utils.py — refresh-token blacklist backends.
+
+``REFRESH_BLACKLIST_BACKEND``:
+  - ``"db"`` (default): simplejwt's ``token_blacklist`` tables
+    (OutstandingToken / BlacklistedToken).
+  - ``"redis"``: one key per blacklisted jti (``equilo:jti_bl:<jti>``) that
+    expires with the token, so nothing accumulates and the refresh path never
+    queries the token_blacklist tables. Rotation claims the old jti with
+    ``SET NX``, so a refresh token can be rotated exactly once even when two
+    tabs refresh at the same time.
+
+Tokens blacklisted in the DB before switching to Redis stay rejected until they
+expire. With ``REFRESH_BLACKLIST_LEGACY_BLOOM`` each process loads those jtis
+once into an in-process bloom filter and only queries BlacklistedToken on a
+bloom hit (that table no longer changes, so the filter never goes stale).
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from datetime import datetime
+
+import mmh3
+from django.conf import settings
+from django.utils import timezone
+
+KEY_PREFIX = "equilo:jti_bl:"
+
+_client = None
+
+
+def use_redis_blacklist() -> bool:
+    return (getattr(settings, "REFRESH_BLACKLIST_BACKEND", "db") or "db").lower() == "redis"
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        import redis
+
+        _client = redis.Redis.from_url(
+            settings.REFRESH_BLACKLIST_URL, socket_connect_timeout=2, socket_timeout=2
+        )
+    return _client
+
+
+def _ttl_seconds(expires_at) -> int:
+    """Seconds until *expires_at* (datetime or epoch); refresh lifetime if unknown."""
+    if expires_at is None:
+        return int(settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"].total_seconds())
+    if isinstance(expires_at, datetime):
+        remaining = (expires_at - timezone.now()).total_seconds()
+    else:
+        remaining = float(expires_at) - time.time()
+    return max(1, math.ceil(remaining))
+
+
+def blacklist_jti(jti: str, expires_at=None) -> bool:
+    """Blacklist one jti until it expires. Returns False if it was already blacklisted."""
+    return bool(_get_client().set(KEY_PREFIX + jti, 1, ex=_ttl_seconds(expires_at), nx=True))
+
+
+def blacklist_jtis(expiries: dict) -> None:
+    """Blacklist many jtis ({jti: expires_at or None}) in one pipeline round trip."""
+    expiries = {jti: exp for jti, exp in expiries.items() if jti}
+    if not expiries:
+        return
+    pipe = _get_client().pipeline(transaction=False)
+    for jti, exp in expiries.items():
+        pipe.set(KEY_PREFIX + jti, 1, ex=_ttl_seconds(exp))
+    pipe.execute()
+
+
+def is_jti_blacklisted(jti: str) -> bool:
+    if _get_client().exists(KEY_PREFIX + jti):
+        return True
+    return _legacy_blacklisted(jti)
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (mmh3 double hashing)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1000)
+        self.size = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        h1, h2 = mmh3.hash64(key, signed=False)
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+_legacy_bloom = None
+_legacy_lock = threading.Lock()
+
+
+def _legacy_queryset():
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+    return BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+
+
+def _get_legacy_bloom() -> BloomFilter:
+    global _legacy_bloom
+    if _legacy_bloom is None:
+        with _legacy_lock:
+            if _legacy_bloom is None:
+                jtis = list(_legacy_queryset().values_list("token__jti", flat=True))
+                bloom = BloomFilter(len(jtis))
+                for jti in jtis:
+                    bloom.add(jti)
+                _legacy_bloom = bloom
+    return _legacy_bloom
+
+
+def _legacy_blacklisted(jti: str) -> bool:
+    """Was this jti blacklisted in the DB before the Redis backend took over?"""
+    if getattr(settings, "REFRESH_BLACKLIST_LEGACY_BLOOM", True):
+        if jti not in _get_legacy_bloom():
+            return False
+    return _legacy_queryset().filter(token__jti=jti).exists()
@@ -0,0 +1,96 @@
+"""
+cron_utils.py — time budgets and resumable cursors for the /api/cron/* endpoints.
+
+A cron invocation gets a time budget (``?budget=<seconds>``, capped by
+CRON_TIME_BUDGET_SECONDS) and stops starting new batches once it is spent.
+Where it stopped is kept in two places:
+
+  - the response's ``continuation`` token, which the caller can pass back as
+    ``?continuation=...``;
+  - the ``CronCursor`` row for the job, so a plain repeat of the scheduled call
+    resumes too. It is in the database rather than the cache because on Vercel the
+    default cache is per-instance LocMem and the next call may land elsewhere.
+
+Cursors are scoped to a run key (e.g. the date of the transition run), so a new
+day's run starts from the beginning. Jobs must be idempotent per batch: a batch
+interrupted by a timeout is simply done again.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import time
+
+from django.conf import settings
+
+from .models import CronCursor
+
+logger = logging.getLogger(__name__)
+
+
+class TimeBudget:
+    """Monotonic deadline. ``expired()`` once less than *margin* seconds remain."""
+
+    def __init__(self, seconds: float, margin: float = 0.0):
+        self.seconds = seconds
+        self.margin = margin
+        self._deadline = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self._deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= self.margin
+
+
+def budget_from_request(request) -> TimeBudget:
+    """?budget=<seconds>, clamped to (0, CRON_TIME_BUDGET_SECONDS]."""
+    limit = float(getattr(settings, 'CRON_TIME_BUDGET_SECONDS', 20))
+    try:
+        seconds = float(request.query_params.get('budget') or limit)
+    except (TypeError, ValueError):
+        seconds = limit
+    return TimeBudget(min(max(seconds, 0.1), limit))
+
+
+def encode_continuation(job: str, run: str, position) -> str:
+    raw = json.dumps({'j': job, 'r': run, 'p': position}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_continuation(token: str, job: str, run: str):
+    """Position from a token for this job and run, or None (missing, malformed, or stale)."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict) or data.get('j') != job or data.get('r') != run:
+        return None
+    return data.get('p')
+
+
+def load_cursor(job: str, run: str):
+    """Persisted position for this job's current run, or None."""
+    try:
+        stored = CronCursor.objects.filter(job=job).values('run', 'position').first()
+    except Exception:
+        logger.warning('could not load cron cursor for %s', job, exc_info=True)
+        return None
+    if not stored or stored['run'] != run:
+        return None  # a previous run's leftover is ignored; the next save replaces it
+    return stored['position']
+
+
+def save_cursor(job: str, run: str, position) -> None:
+    """Persist a position; ``None`` clears it (run finished)."""
+    try:
+        if position is None:
+            CronCursor.objects.filter(job=job).delete()
+        else:
+            CronCursor.objects.update_or_create(job=job, defaults={'run': run, 'position': position})
+    except Exception:
+        logger.warning('could not save cron cursor for %s', job, exc_info=True)
@@ -0,0 +1,117 @@
+"""
+db_router.py — read replica routing with read-your-writes stickiness.
+
+With DATABASE_REPLICA_URL set, settings add a ``replica`` database and install
+ReplicaRouter. Reads go to the replica only inside views wrapped in
+``replica_reads`` (dashboard, place summary, activity and the list endpoints);
+everything else, and every write, uses ``default``.
+
+A replica lags the primary, so right after a change the writer (and anyone
+refetching because of it) must read from the primary:
+
+  - ReplicaStickinessMiddleware pins the user after any successful unsafe request;
+  - ``publish_change`` pins the place and the notified users when the change commits,
+    so the realtime-triggered refetches of every member see it.
+
+A pinned user or place reads from the primary for REPLICA_STICKY_SECONDS, which
+should comfortably exceed replica lag. Pins live in the cache, so across
+processes they need Redis; if the cache is unreachable, reads use the primary.
+
+Local testing with two SQLite files: copy db.sqlite3 to the replica file (the
+copy is the "replication"), then set DATABASE_REPLICA_URL=sqlite:///<path>.
+"""
+from __future__ import annotations
+
+import functools
+import logging
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+
+# Alias reads go to inside the current view; None = Django's default routing.
+_read_alias: ContextVar[str | None] = ContextVar('db_read_alias', default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _user_key(user_id) -> str:
+    return f'db_primary_pin:user:{user_id}'
+
+
+def _place_key(place_id) -> str:
+    return f'db_primary_pin:place:{place_id}'
+
+
+def pin_to_primary(user_ids=(), place_id=None) -> None:
+    """Send these users' and this place's replica reads to the primary for REPLICA_STICKY_SECONDS."""
+    if not replica_configured():
+        return
+    keys = [_user_key(uid) for uid in user_ids if uid]
+    if place_id:
+        keys.append(_place_key(place_id))
+    if not keys:
+        return
+    try:
+        cache.set_many(dict.fromkeys(keys, 1), getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+    except Exception:
+        logger.warning('cache SET failed for replica pin', exc_info=True)
+
+
+def _read_alias_for(request, place_id=None) -> str | None:
+    if not replica_configured():
+        return None
+    keys = []
+    user_id = getattr(getattr(request, 'user', None), 'pk', None)
+    if user_id:
+        keys.append(_user_key(user_id))
+    if place_id is not None:
+        keys.append(_place_key(place_id))
+    try:
+        pinned = bool(keys) and bool(cache.get_many(keys))
+    except Exception:
+        logger.warning('cache GET failed for replica pin', exc_info=True)
+        pinned = True
+    return DEFAULT_DB_ALIAS if pinned else REPLICA_ALIAS
+
+
+def replica_reads(view):
+    """
+    Run a read-only view's queries on the replica unless the user (or the
+    ``place_id`` URL kwarg's place) is pinned to the primary. For class-based
+    views use ``method_decorator(replica_reads, name='list')``.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_alias.set(_read_alias_for(request, kwargs.get('place_id')))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """Reads follow ``replica_reads``; writes, migrations and everything else use the primary."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema by replication from the primary.
+        return db != REPLICA_ALIAS
@@ -0,0 +1,108 @@
+"""
+db_utils.py — how Django holds its PostgreSQL connections (DB_CONNECTION_MODE).
+
+  serverless  Safe behind PgBouncer in transaction mode (e.g. the Supabase pooler on
+              port 6543): a new connection per request (CONN_MAX_AGE=0) and no
+              server-side cursors or psycopg 3 prepared statements, because the pooler
+              may run the next statement of a session on a different backend.
+  pool        A psycopg 3 connection pool per process (Django's OPTIONS["pool"]), for
+              long-lived gunicorn/uvicorn workers on a direct or session-mode
+              connection. Optional: needs ``pip install "psycopg[binary,pool]"``, which
+              requirements.txt (psycopg2, enough for the other modes) leaves out.
+  persistent  One connection per thread, kept for DB_CONN_MAX_AGE seconds with health
+              checks (Django's persistent connections; the previous behaviour).
+
+Default: serverless on Vercel or when the URL uses the transaction pooler port,
+persistent otherwise. ``python manage.py bench_db_connections`` measures the
+per-request connection cost of each mode against a database.
+
+Imported by settings, so this module must not import models.
+"""
+from __future__ import annotations
+
+from urllib.parse import urlparse
+
+from django.core.exceptions import ImproperlyConfigured
+
+SERVERLESS = 'serverless'
+POOL = 'pool'
+PERSISTENT = 'persistent'
+CONNECTION_MODES = (SERVERLESS, POOL, PERSISTENT)
+# Supabase's transaction-mode pooler (PgBouncer / Supavisor) listens here; session mode on 5432.
+TRANSACTION_POOLER_PORT = 6543
+
+
+def default_connection_mode(database_url: str, serverless_platform: bool) -> str:
+    try:
+        port = urlparse(database_url).port
+    except ValueError:
+        port = None
+    if serverless_platform or port == TRANSACTION_POOLER_PORT:
+        return SERVERLESS
+    return PERSISTENT
+
+
+def psycopg3_available() -> bool:
+    """Django uses psycopg 3 over psycopg2 whenever it is importable."""
+    try:
+        import psycopg  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _is_postgres(db: dict) -> bool:
+    return 'postgresql' in (db.get('ENGINE') or '')
+
+
+def apply_connection_mode(
+    db: dict,
+    mode: str,
+    *,
+    conn_max_age: int = 600,
+    pool_min_size: int = 2,
+    pool_max_size: int = 10,
+    pool_timeout: float = 10.0,
+) -> dict:
+    """Copy of a DATABASES entry configured for *mode*. Raises ImproperlyConfigured."""
+    if mode not in CONNECTION_MODES:
+        raise ImproperlyConfigured(
+            f'DB_CONNECTION_MODE must be one of {", ".join(CONNECTION_MODES)} (got {mode!r}).'
+        )
+    db = {**db, 'OPTIONS': dict(db.get('OPTIONS') or {})}
+    db['OPTIONS'].pop('pool', None)
+
+    if mode == PERSISTENT:
+        db['CONN_MAX_AGE'] = conn_max_age
+        db['CONN_HEALTH_CHECKS'] = True
+        return db
+
+    # Both other modes hand connections back at the end of every request.
+    db['CONN_MAX_AGE'] = 0
+
+    if mode == SERVERLESS:
+        db['CONN_HEALTH_CHECKS'] = False  # a fresh connection needs no check
+        if _is_postgres(db):
+            db['DISABLE_SERVER_SIDE_CURSORS'] = True
+            if psycopg3_available():
+                # Automatic prepared statements live on one backend; the pooler may switch it.
+                db['OPTIONS']['prepare_threshold'] = None
+        return db
+
+    if not _is_postgres(db):
+        raise ImproperlyConfigured('DB_CONNECTION_MODE=pool needs a PostgreSQL DATABASE_URL.')
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured(
+            'DB_CONNECTION_MODE=pool needs psycopg 3 with its pool: pip install "psycopg[binary,pool]".'
+        )
+    # With a pool, Django turns health checks into a check on every checkout, so
+    # connections the server dropped while idle are replaced instead of failing a request.
+    db['CONN_HEALTH_CHECKS'] = True
+    db['OPTIONS']['pool'] = {
+        'min_size': pool_min_size,
+        'max_size': pool_max_size,
+        'timeout': pool_timeout,
+    }
+    return db
@@ -0,0 +1,141 @@
+"""
+digest_utils.py — daily / weekly notification digest emails.
+
+Users with ``UserProfile.email_digest`` set to daily or weekly get no per-event
+emails (see email_utils); instead ``send_digests`` mails them one summary of
+their unread notifications across all places since ``last_digest_at``.
+
+Runs once a day (Celery Beat, or /api/cron/send-digests/). Users are processed
+in batches of BATCH_SIZE: one query loads the due profiles, one query loads the
+batch's notifications, and one UPDATE advances their ``last_digest_at``, so
+re-running after an interruption only picks up users not yet done.
+"""
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+# Newest notifications shown per digest; the rest are summarised as a count.
+MAX_ITEMS = 30
+
+
+def digest_period(mode: str) -> timedelta | None:
+    from .models import UserProfile
+
+    return {
+        UserProfile.DIGEST_DAILY: timedelta(days=1),
+        UserProfile.DIGEST_WEEKLY: timedelta(days=7),
+    }.get(mode)
+
+
+def _due_profiles(now, after_user_id: int, limit: int):
+    from .models import UserProfile
+
+    # An hour of slack so a run that starts a little early still catches yesterday's users.
+    slack = timedelta(hours=1)
+    due = Q(last_digest_at__isnull=True)
+    for mode in (UserProfile.DIGEST_DAILY, UserProfile.DIGEST_WEEKLY):
+        due |= Q(email_digest=mode, last_digest_at__lte=now - digest_period(mode) + slack)
+    return list(
+        UserProfile.objects.filter(
+            due,
+            email_digest__in=[UserProfile.DIGEST_DAILY, UserProfile.DIGEST_WEEKLY],
+            email_notifications_enabled=True,
+            user_id__gt=after_user_id,
+        )
+        .select_related('user')
+        .order_by('user_id')[:limit]
+    )
+
+
+def _group_by_place(notifications):
+    """[(place_name or None, [notification, ...]), ...] with places in first-seen order."""
+    groups = defaultdict(list)
+    for n in notifications:
+        groups[n.place.name if n.place_id else None].append(n)
+    return list(groups.items())
+
+
+def _send_digest(profile, notifications) -> bool:
+    from .email_utils import send_transactional_email
+
+    mode_label = 'daily' if profile.email_digest == profile.DIGEST_DAILY else 'weekly'
+    shown = notifications[:MAX_ITEMS]
+    count = len(notifications)
+    subject = f"Your {mode_label} Equilo digest: {count} update{'s' if count != 1 else ''}"
+    frontend_url = (getattr(settings, 'FRONTEND_URL', '') or '').rstrip('/')
+    return send_transactional_email(
+        profile.user,
+        template_name='digest',
+        subject=subject,
+        ctx={
+            'mode_label': mode_label,
+            'count': count,
+            'groups': _group_by_place(shown),
+            'more_count': count - len(shown),
+            'deep_link': f"{frontend_url}/",
+        },
+    )
+
+
+def send_digests(now=None, batch_size: int = BATCH_SIZE, budget=None) -> dict:
+    """
+    Send every due digest. With a ``budget`` (cron_utils.TimeBudget), no new
+    batch starts once it is spent and ``more`` is set.
+    """
+    from .models import Notification, UserProfile
+
+    now = now or timezone.now()
+    totals = {'users': 0, 'sent': 0, 'empty': 0, 'more': False}
+    after = 0
+    while True:
+        if budget is not None and totals['users'] and budget.expired():
+            totals['more'] = True
+            break
+        profiles = _due_profiles(now, after, batch_size)
+        if not profiles:
+            break
+        after = profiles[-1].user_id
+        since = {
+            p.user_id: p.last_digest_at or now - digest_period(p.email_digest)
+            for p in profiles
+        }
+        by_user = defaultdict(list)
+        rows = (
+            Notification.objects.filter(
+                user_id__in=since.keys(),
+                is_read=False,
+                created_at__gt=min(since.values()),
+                created_at__lte=now,
+            )
+            .select_related('place')
+            .order_by('user_id', '-created_at')
+        )
+        for n in rows:
+            if n.created_at > since[n.user_id]:
+                by_user[n.user_id].append(n)
+
+        for profile in profiles:
+            notifications = by_user.get(profile.user_id)
+            if not notifications:
+                totals['empty'] += 1
+                continue
+            try:
+                if _send_digest(profile, notifications):
+                    totals['sent'] += 1
+            except Exception:
+                logger.warning('digest email failed for user_id=%s', profile.user_id, exc_info=True)
+        # Advance everyone in the batch, including users with nothing new, so they are not rescanned.
+        UserProfile.objects.filter(user_id__in=since.keys()).update(last_digest_at=now)
+        totals['users'] += len(profiles)
+        if len(profiles) < batch_size:
+            break
+    return totals
@@ -3,21 +3,29 @@ email_utils.py — single entry point for transactional email.
 
 All call sites should use ``send_transactional_email`` so that:
   - opt-out flag (UserProfile.email_notifications_enabled) is honoured
+  - digest users (UserProfile.email_digest daily/weekly) get no per-event
+    emails; their notifications go out in api.digest_utils instead
   - unsubscribe URL + List-Unsubscribe header are added consistently
   - Brevo (or any future provider) can be swapped in one place
   - SMTP failures never break the originating request
+  - with EMAIL_OUTBOX_ENABLED, messages are queued in the outbox and sent in
+    batches by api.outbox_utils.drain_email_outbox instead of inline
 """
 from __future__ import annotations
 
 import logging
-from typing import Any, Mapping, Optional
+from typing import Any, Mapping, NamedTuple, Optional
 
 from django.conf import settings
 from django.core import signing
 from django.core.mail import EmailMultiAlternatives
 from django.template import TemplateDoesNotExist
-from django.template.loader import render_to_string
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .outbox_utils import enqueue_email, outbox_enabled
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +35,8 @@ _UNSUB_SALT = "api.email_utils.unsubscribe"
 # 60 days is well beyond any reasonable digest cadence; users can re-enable in
 # Settings if they unsubscribed by mistake.
 _UNSUB_MAX_AGE_SECONDS = 60 * 24 * 60 * 60
+# Templates still sent to users who chose a daily/weekly digest.
+DIGEST_TEMPLATES = frozenset({"digest"})
 
 
 def make_unsubscribe_token(user_id: int) -> str:
@@ -73,31 +83,22 @@ def _emails_enabled_for(user) -> bool:
     return bool(getattr(profile, "email_notifications_enabled", True))
 
 
-def send_transactional_email(
-    user,
-    template_name: str,
-    subject: str,
-    ctx: Optional[Mapping[str, Any]] = None,
-) -> bool:
-    """
-    Render and send a transactional email to *user*.
+def _wants_digest(user) -> bool:
+    profile = getattr(user, "profile", None)
+    return getattr(profile, "email_digest", "immediate") != "immediate"
 
-    Looks up two templates:
-      - ``emails/<template_name>.html``  (HTML body, required)
-      - ``emails/<template_name>.txt``   (plaintext body, required for
-                                          deliverability — most providers
-                                          downrank HTML-only mail)
 
-    Returns True if the message was handed to the email backend, False if it
-    was skipped (no email, opted out, missing config) or failed.
-    """
+def _recipient_email(user, template_name: str) -> Optional[str]:
+    """The address to mail *user* at, or None when the email should be skipped."""
     if user is None:
-        return False
+        return None
     email = _user_email(user)
     if not email:
-        return False
+        return None
     if not _emails_enabled_for(user):
-        return False
+        return None
+    if template_name not in DIGEST_TEMPLATES and _wants_digest(user):
+        return None
 
     # In production we want SMTP creds set; in dev the console backend works
     # without creds and is genuinely useful (you can read the email in the
@@ -106,41 +107,53 @@ def send_transactional_email(
     backend = getattr(settings, "EMAIL_BACKEND", "")
     if backend.endswith("smtp.EmailBackend") and not getattr(settings, "EMAIL_HOST_USER", ""):
         logger.info("email skipped: SMTP backend configured but no EMAIL_HOST_USER")
-        return False
+        return None
+    return email
 
-    full_ctx: dict[str, Any] = {
-        "user": user,
-        "user_display_name": (
-            getattr(getattr(user, "profile", None), "display_name", "")
-            or getattr(user, "username", "")
-            or "there"
-        ).strip(),
-        "frontend_url": (getattr(settings, "FRONTEND_URL", "") or "").rstrip("/"),
-        "unsubscribe_url": _absolute_unsubscribe_url(user.id),
-        "subject": subject,
-    }
-    if ctx:
-        full_ctx.update(ctx)
 
-    try:
-        html_body = render_to_string(f"emails/{template_name}.html", full_ctx)
-        text_body = render_to_string(f"emails/{template_name}.txt", full_ctx)
-    except TemplateDoesNotExist:
-        logger.exception("email template missing for %s", template_name)
-        return False
+def _display_name(user) -> str:
+    return (
+        getattr(getattr(user, "profile", None), "display_name", "")
+        or getattr(user, "username", "")
+        or "there"
+    ).strip()
+
 
+class RenderedEmail(NamedTuple):
+    to: str
+    subject: str
+    text_body: str
+    html_body: str
+    unsubscribe_url: str
+
+
+def _deliver(user, template_name: str, rendered: RenderedEmail) -> bool:
+    """Queue (EMAIL_OUTBOX_ENABLED) or send one rendered message. Never raises."""
     msg = EmailMultiAlternatives(
-        subject=subject,
-        body=text_body,
+        subject=rendered.subject,
+        body=rendered.text_body,
         from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
-        to=[email],
+        to=[rendered.to],
     )
-    msg.attach_alternative(html_body, "text/html")
+    msg.attach_alternative(rendered.html_body, "text/html")
     # RFC 2369 / 8058 — gives Gmail/Outlook a one-click unsubscribe button and
     # protects sender reputation.
-    msg.extra_headers["List-Unsubscribe"] = f"<{full_ctx['unsubscribe_url']}>"
+    msg.extra_headers["List-Unsubscribe"] = f"<{rendered.unsubscribe_url}>"
     msg.extra_headers["List-Unsubscribe-Post"] = "List-Unsubscribe=One-Click"
 
+    if outbox_enabled():
+        try:
+            enqueue_email(msg, user=user, template_name=template_name)
+            return True
+        except Exception:
+            logger.warning(
+                "transactional email enqueue failed for template=%s user_id=%s",
+                template_name,
+                getattr(user, "id", None),
+                exc_info=True,
+            )
+            return False
+
     try:
         # fail_silently=False so we get the traceback in our log; outer
         # try/except still prevents request failure.
@@ -154,3 +167,150 @@ def send_transactional_email(
             exc_info=True,
         )
         return False
+
+
+def render_transactional_email(
+    user,
+    template_name: str,
+    subject: str,
+    ctx: Optional[Mapping[str, Any]] = None,
+) -> Optional[RenderedEmail]:
+    """
+    Render a transactional email for *user*, or return None when it should not
+    be sent (no email, opted out, missing config, missing template).
+
+    Looks up two templates:
+      - ``emails/<template_name>.html``  (HTML body, required)
+      - ``emails/<template_name>.txt``   (plaintext body, required for
+                                          deliverability — most providers
+                                          downrank HTML-only mail)
+    """
+    email = _recipient_email(user, template_name)
+    if not email:
+        return None
+
+    full_ctx: dict[str, Any] = {
+        "user": user,
+        "user_display_name": _display_name(user),
+        "frontend_url": (getattr(settings, "FRONTEND_URL", "") or "").rstrip("/"),
+        "unsubscribe_url": _absolute_unsubscribe_url(user.id),
+        "subject": subject,
+    }
+    if ctx:
+        full_ctx.update(ctx)
+
+    try:
+        html_body = render_to_string(f"emails/{template_name}.html", full_ctx)
+        text_body = render_to_string(f"emails/{template_name}.txt", full_ctx)
+    except TemplateDoesNotExist:
+        logger.exception("email template missing for %s", template_name)
+        return None
+    return RenderedEmail(email, subject, text_body, html_body, full_ctx["unsubscribe_url"])
+
+
+def send_transactional_email(
+    user,
+    template_name: str,
+    subject: str,
+    ctx: Optional[Mapping[str, Any]] = None,
+) -> bool:
+    """
+    Render (see render_transactional_email) and send a transactional email to *user*.
+
+    Returns True if the message was queued in the outbox or handed to the
+    email backend, False if it was skipped (no email, opted out, missing
+    config) or failed.
+    """
+    rendered = render_transactional_email(user, template_name, subject, ctx)
+    if rendered is None:
+        return False
+    return _deliver(user, template_name, rendered)
+
+
+class BatchEmailRenderer:
+    """
+    Renders one email template for many recipients, for batch jobs such as the
+    cycle-ended fan-out.
+
+    - The html/txt templates (and per-recipient block partials) are compiled
+      once per renderer.
+    - ``skeleton(shared_ctx)`` renders the recipient-invariant parts once (e.g.
+      once per place), with markers where per-recipient values go.
+    - ``send(skeleton, user, block_ctx)`` fills in the markers: display name,
+      unsubscribe URL (token signed once per user per renderer), and each block
+      rendered from its small partial with *block_ctx*.
+
+    Output is identical to ``send_transactional_email`` as long as the template
+    reads nothing per-recipient except ``user_display_name``, ``unsubscribe_url``
+    and the declared blocks. A block is a context variable the template prints
+    when set and otherwise fills by including the same partial.
+
+    One renderer may be shared by threads (the cycle transition's thread pool):
+    compiled templates render with a fresh context per call, and the only
+    mutable state is the unsubscribe-URL memo, where a race at worst signs the
+    same token twice.
+    """
+
+    _MARK = "[[equilo:{}]]"
+
+    def __init__(self, template_name: str, blocks: Optional[Mapping[str, str]] = None):
+        self.template_name = template_name
+        self.html = get_template(f"emails/{template_name}.html")
+        self.text = get_template(f"emails/{template_name}.txt")
+        # {context var: partial name} -> compiled (html, txt) partials
+        self.blocks = {
+            var: (get_template(f"emails/{partial}.html"), get_template(f"emails/{partial}.txt"))
+            for var, partial in (blocks or {}).items()
+        }
+        self._frontend_url = (getattr(settings, "FRONTEND_URL", "") or "").rstrip("/")
+        self._unsubscribe_urls: dict[int, str] = {}
+
+    def _unsubscribe_url(self, user_id: int) -> str:
+        url = self._unsubscribe_urls.get(user_id)
+        if url is None:
+            url = self._unsubscribe_urls[user_id] = _absolute_unsubscribe_url(user_id)
+        return url
+
+    def skeleton(self, subject: str, shared_ctx: Mapping[str, Any]) -> dict:
+        ctx: dict[str, Any] = {
+            "user": None,
+            "user_display_name": self._MARK.format("name"),
+            "frontend_url": self._frontend_url,
+            "unsubscribe_url": self._MARK.format("unsubscribe"),
+            "subject": subject,
+            **shared_ctx,
+        }
+        for var in self.blocks:
+            ctx[var] = mark_safe(self._MARK.format(var))
+        return {"subject": subject, "html": self.html.render(ctx), "text": self.text.render(ctx)}
+
+    def _fill(self, body: str, values: Mapping[str, str]) -> str:
+        for key, value in values.items():
+            body = body.replace(self._MARK.format(key), value)
+        return body
+
+    def render(self, skeleton: Mapping[str, str], user,
+               block_ctx: Optional[Mapping[str, Any]] = None) -> Optional[RenderedEmail]:
+        """Fill the skeleton for *user*; None when the user should not be emailed."""
+        email = _recipient_email(user, self.template_name)
+        if not email:
+            return None
+        unsubscribe_url = self._unsubscribe_url(user.id)
+        # Escaped the way {{ }} would have escaped them (autoescape is on for .txt too).
+        values = {"name": escape(_display_name(user)), "unsubscribe": escape(unsubscribe_url)}
+        html_values, text_values = dict(values), dict(values)
+        for var, (html_partial, text_partial) in self.blocks.items():
+            html_values[var] = html_partial.render(block_ctx or {})
+            text_values[var] = text_partial.render(block_ctx or {})
+        return RenderedEmail(
+            email, skeleton["subject"],
+            self._fill(skeleton["text"], text_values), self._fill(skeleton["html"], html_values),
+            unsubscribe_url,
+        )
+
+    def send(self, skeleton: Mapping[str, str], user, block_ctx: Optional[Mapping[str, Any]] = None) -> bool:
+        """Render for *user* and queue/send it. Same return value as send_transactional_email."""
+        rendered = self.render(skeleton, user, block_ctx)
+        if rendered is None:
+            return False
+        return _deliver(user, self.template_name, rendered)
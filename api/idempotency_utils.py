@@ -0,0 +1,139 @@
+"""
+idempotency_utils.py — replay-safe POSTs via the ``Idempotency-Key`` header.
+
+The first response for a (user, path, key) is stored in the cache for
+IDEMPOTENCY_TTL_SECONDS; retries with the same key get that response back
+(``Idempotent-Replayed: true``) without running the view again. A retry that
+arrives while the first request is still running waits briefly on a cache lock,
+then replays or gets 409. Reusing a key with a different body is a 422.
+
+Usage:
+    @api_view(['POST'])
+    @permission_classes([IsAuthenticated])
+    @idempotent
+    def settlement_create(request): ...
+
+    # ViewSet actions:
+    def create(self, request, *args, **kwargs):
+        return run_idempotent(request, lambda: super(MyViewSet, self).create(request, *args, **kwargs))
+
+Requests without the header behave exactly as before.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# Long enough for the slowest write view; the lock expires on its own if a worker dies.
+LOCK_TTL = 30
+# How long a concurrent duplicate waits for the first request to finish.
+LOCK_WAIT_SECONDS = 5.0
+_POLL_INTERVAL = 0.1
+
+
+def _cache_key(request, key: str) -> str:
+    digest = hashlib.sha256(f"{request.user.pk}:{request.path}:{key}".encode()).hexdigest()
+    return f"idempotency:{digest}"
+
+
+def _fingerprint(request) -> str:
+    try:
+        body = json.dumps(request.data, sort_keys=True, default=str)
+    except Exception:
+        body = ""
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _replay(stored) -> Response:
+    response = Response(stored["data"], status=stored["status"])
+    response[REPLAY_HEADER] = "true"
+    return response
+
+
+def _cacheable(response) -> bool:
+    # Store successes and client errors; 409/429 and server errors are worth retrying.
+    code = response.status_code
+    return hasattr(response, "data") and (200 <= code < 300 or (400 <= code < 500 and code not in (409, 429)))
+
+
+def run_idempotent(request, handler):
+    """Run *handler()* once per Idempotency-Key; replay its stored response for retries."""
+    key = (request.headers.get(HEADER) or "").strip()
+    if not key or not getattr(request.user, "is_authenticated", False):
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    result_key = _cache_key(request, key)
+    lock_key = f"{result_key}:lock"
+    fingerprint = _fingerprint(request)
+    ttl = getattr(settings, "IDEMPOTENCY_TTL_SECONDS", 86400)
+
+    try:
+        stored = cache.get(result_key)
+        locked = stored is None and cache.add(lock_key, 1, LOCK_TTL)
+    except Exception:
+        logger.warning("idempotency cache unavailable; running request", exc_info=True)
+        return handler()
+
+    if stored is None and not locked:
+        # Same key in flight: wait for the first request to store its response.
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while stored is None and time.monotonic() < deadline:
+            time.sleep(_POLL_INTERVAL)
+            stored = cache.get(result_key)
+        if stored is None:
+            return Response(
+                {"error": "A request with this Idempotency-Key is still being processed."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+    if stored is not None:
+        if stored["fingerprint"] != fingerprint:
+            return Response(
+                {"error": f"{HEADER} was already used with a different request body."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return _replay(stored)
+
+    try:
+        response = handler()
+        if _cacheable(response):
+            cache.set(
+                result_key,
+                {"status": response.status_code, "data": response.data, "fingerprint": fingerprint},
+                ttl,
+            )
+        return response
+    finally:
+        try:
+            cache.delete(lock_key)
+        except Exception:
+            logger.warning("idempotency lock release failed", exc_info=True)
+
+
+def idempotent(view):
+    """Decorator form of run_idempotent for function views (place it under @api_view)."""
+
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        return run_idempotent(request, lambda: view(request, *args, **kwargs))
+
+    return wrapped
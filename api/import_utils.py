@@ -0,0 +1,205 @@
+"""
+import_utils.py — bulk expense import (CSV / NDJSON) for /places/<id>/expenses/import/.
+
+Rows are parsed one line at a time from the upload, validated against maps of
+the place's members and categories loaded once up front, and inserted in chunks:
+one ``bulk_create`` for the chunk's expenses and one for their splits, each chunk
+in its own transaction. Invalid rows are skipped and reported by row number.
+
+Columns / keys (CSV header names or NDJSON object keys):
+  amount       required, > 0, at most 2 decimal places
+  description  required, <= 255 chars
+  date         required, YYYY-MM-DD
+  paid_by      optional member id, username or email (default: the importer)
+  split        optional members separated by ';' or '|' in CSV, or a list in
+               NDJSON (default: the payer only)
+  category     optional category id or name
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import json
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import Expense, ExpenseCategory, ExpenseSplit, PlaceMember
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 200
+
+
+def detect_format(filename: str, content_type: str) -> str:
+    name = (filename or "").lower()
+    ctype = (content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in ctype or "jsonlines" in ctype:
+        return FORMAT_NDJSON
+    return FORMAT_CSV
+
+
+def _iter_lines(stream):
+    """Decode a binary stream line by line (UTF-8, BOM tolerated) without reading it all."""
+    return codecs.iterdecode(stream, "utf-8-sig")
+
+
+def iter_rows(stream, fmt: str):
+    """Yield (row_number, dict) from a binary stream; bad NDJSON lines yield (n, None)."""
+    lines = _iter_lines(stream)
+    if fmt == FORMAT_NDJSON:
+        for n, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                yield n, None
+                continue
+            yield n, obj if isinstance(obj, dict) else None
+        return
+    reader = csv.DictReader(lines)
+    for row in reader:
+        # Row 1 is the header, so data rows start at 2 (matches spreadsheet numbering).
+        yield reader.line_num, {(k or "").strip().lower(): v for k, v in row.items()}
+
+
+class _PlaceMaps:
+    """Member and category lookups for one place (two queries)."""
+
+    def __init__(self, place_id: int):
+        self.member_ids = set()
+        self.members = {}
+        rows = PlaceMember.objects.filter(place_id=place_id).values_list(
+            "user_id", "user__username", "user__email"
+        )
+        for user_id, username, email in rows:
+            self.member_ids.add(user_id)
+            self.members[str(user_id)] = user_id
+            self.members[(username or "").lower()] = user_id
+            if email:
+                self.members.setdefault(email.lower(), user_id)
+        self.categories = {}
+        for cat_id, name in ExpenseCategory.objects.filter(place_id=place_id).values_list("id", "name"):
+            self.categories[str(cat_id)] = cat_id
+            self.categories[name.lower()] = cat_id
+
+    def member(self, value):
+        return self.members.get(str(value).strip().lower())
+
+
+def _split_values(raw):
+    if raw is None or raw == "":
+        return []
+    if isinstance(raw, list):
+        return [v for v in raw if str(v).strip()]
+    return [v for v in str(raw).replace("|", ";").split(";") if v.strip()]
+
+
+def validate_row(row, maps: _PlaceMaps, default_payer_id: int):
+    """Return ((amount, description, date, payer_id, category_id, split_ids), errors)."""
+    errors = []
+    try:
+        amount = Decimal(str(row.get("amount", "")).strip())
+        if not amount.is_finite() or amount <= 0 or amount.as_tuple().exponent < -2 or amount >= Decimal("1e10"):
+            raise InvalidOperation
+    except (InvalidOperation, ValueError):
+        amount = None
+        errors.append("amount must be a positive number with at most 2 decimal places")
+
+    description = str(row.get("description") or "").strip()
+    if not description:
+        errors.append("description is required")
+    elif len(description) > 255:
+        errors.append("description is longer than 255 characters")
+
+    try:
+        expense_date = date.fromisoformat(str(row.get("date") or "").strip())
+    except ValueError:
+        expense_date = None
+        errors.append("date must be YYYY-MM-DD")
+
+    payer_raw = row.get("paid_by")
+    payer_id = default_payer_id
+    if payer_raw not in (None, ""):
+        payer_id = maps.member(payer_raw)
+        if payer_id is None:
+            errors.append(f"paid_by {payer_raw!r} is not a member of this place")
+
+    category_id = None
+    category_raw = row.get("category")
+    if category_raw not in (None, ""):
+        category_id = maps.categories.get(str(category_raw).strip().lower())
+        if category_id is None:
+            errors.append(f"unknown category {category_raw!r}")
+
+    split_ids = []
+    for value in _split_values(row.get("split")):
+        uid = maps.member(value)
+        if uid is None:
+            errors.append(f"split user {value!r} is not a member of this place")
+        elif uid not in split_ids:
+            split_ids.append(uid)
+
+    if errors:
+        return None, errors
+    return (amount, description, expense_date, payer_id, category_id, split_ids or [payer_id]), []
+
+
+def _insert_chunk(place_id: int, cycle_id: int, added_by_id: int, chunk) -> int:
+    with transaction.atomic():
+        expenses = Expense.objects.bulk_create([
+            Expense(
+                place_id=place_id,
+                cycle_id=cycle_id,
+                paid_by_id=payer_id,
+                added_by_id=added_by_id,
+                amount=amount,
+                description=description,
+                date=expense_date,
+                category_id=category_id,
+            )
+            for amount, description, expense_date, payer_id, category_id, _ in chunk
+        ])
+        ExpenseSplit.objects.bulk_create([
+            ExpenseSplit(expense_id=expense.pk, user_id=uid)
+            for expense, (*_, split_ids) in zip(expenses, chunk)
+            for uid in split_ids
+        ])
+    return len(expenses)
+
+
+def import_expenses(stream, fmt: str, *, place_id: int, cycle_id: int, user_id: int,
+                    max_rows: int, dry_run: bool = False) -> dict:
+    """
+    Validate and insert every row of *stream*. Returns
+    ``{"imported", "failed", "errors": [{"row", "errors"}], "truncated"}``.
+    """
+    maps = _PlaceMaps(place_id)
+    chunk, imported, failed, seen = [], 0, 0, 0
+    errors = []
+    truncated = False
+    for row_number, row in iter_rows(stream, fmt):
+        seen += 1
+        if seen > max_rows:
+            truncated = True
+            break
+        if row is None:
+            values, row_errors = None, ["line is not a JSON object"]
+        else:
+            values, row_errors = validate_row(row, maps, user_id)
+        if row_errors:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": row_number, "errors": row_errors})
+            continue
+        chunk.append(values)
+        if len(chunk) >= CHUNK_SIZE:
+            imported += len(chunk) if dry_run else _insert_chunk(place_id, cycle_id, user_id, chunk)
+            chunk = []
+    if chunk:
+        imported += len(chunk) if dry_run else _insert_chunk(place_id, cycle_id, user_id, chunk)
+    return {"imported": imported, "failed": failed, "errors": errors, "truncated": truncated}
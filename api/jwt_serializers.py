@@ -5,17 +5,17 @@ from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.settings import api_settings
-from rest_framework_simplejwt.tokens import RefreshToken
 
 from .session_utils import (
     touch_session_by_jti,
     update_session_after_refresh,
     upsert_session_for_refresh_token,
 )
+from .tokens import EquiloRefreshToken
 
 
 class EquiloTokenObtainPairSerializer(TokenObtainSerializer):
-    token_class = RefreshToken
+    token_class = EquiloRefreshToken
 
     def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
         data = super().validate(attrs)
@@ -34,6 +34,7 @@ class EquiloTokenObtainPairSerializer(TokenObtainSerializer):
 
 class EquiloTokenRefreshSerializer(TokenRefreshSerializer):
     refresh = serializers.CharField(required=False, allow_blank=True)
+    token_class = EquiloRefreshToken
 
     def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
         from django.conf import settings as dj_settings
@@ -46,7 +47,8 @@ class EquiloTokenRefreshSerializer(TokenRefreshSerializer):
         if not raw:
             raise serializers.ValidationError({'refresh': _('This field is required.')})
 
-        old_refresh = self.token_class(raw)
+        # Only reads the jti; super().validate() verifies (and blacklist-checks) once.
+        old_refresh = self.token_class(raw, verify=False)
         old_jti = str(old_refresh.get('jti', '') or '')
 
         attrs = {'refresh': raw}
@@ -0,0 +1,107 @@
+"""
+Benchmark cycle-ended email rendering: per-recipient render_to_string (the
+send_transactional_email path) vs BatchEmailRenderer (one skeleton per place).
+
+    python manage.py bench_cycle_emails --places 200 --members 25 --verify
+
+Only rendering is timed (no MIME building or delivery). Uses unsaved in-memory
+users and places, so it needs no data and sends nothing.
+"""
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api.email_utils import render_transactional_email
+from api.models import ExpenseCycle, Place, UserProfile
+from api.views import cycle_ended_email_renderer
+
+
+def _fixtures(places, members):
+    User = get_user_model()
+    users = []
+    for i in range(members):
+        user = User(id=i + 1, username=f"member{i}", email=f"member{i}@example.com")
+        user.profile = UserProfile(user=user, display_name=f"Member O'Neil {i}")
+        users.append(user)
+    cycle = ExpenseCycle(id=1, start_date=date(2026, 9, 1), end_date=date(2026, 9, 14))
+    runs = []
+    for p in range(places):
+        place = Place(id=p + 1, name=f"Flat <{p}> & Co")
+        lines = {
+            u.id: [f"You owe ${Decimal(7 + j):.2f} to member{(u.id + j) % members}" for j in range(u.id % 4)]
+            for u in users
+        }
+        runs.append((place, lines))
+    return users, cycle, runs
+
+
+class Command(BaseCommand):
+    help = "Measure cycle-ended email rendering throughput (per-recipient vs batch)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--places", type=int, default=200)
+        parser.add_argument("--members", type=int, default=25)
+        parser.add_argument("--verify", action="store_true", help="Check both paths render identical emails.")
+
+    def handle(self, *args, places, members, verify, **options):
+        users, cycle, runs = _fixtures(places, members)
+        period_label = "Sep 01 – Sep 14"
+
+        def shared(place):
+            return {
+                "place": place,
+                "cycle": cycle,
+                "period_label": period_label,
+                "deep_link": f"https://app.example.com/places/{place.id}?tab=summary&settle=1",
+            }
+
+        def per_recipient():
+            out = []
+            for place, lines in runs:
+                title = f"Cycle ended: {place.name} ({period_label})"
+                for user in users:
+                    out.append(render_transactional_email(
+                        user, "cycle_ended", title, {**shared(place), "balance_lines": lines[user.id]}
+                    ))
+            return out
+
+        def batch():
+            out = []
+            renderer = cycle_ended_email_renderer()
+            for place, lines in runs:
+                skeleton = renderer.skeleton(f"Cycle ended: {place.name} ({period_label})", shared(place))
+                for user in users:
+                    out.append(renderer.render(skeleton, user, {"balance_lines": lines[user.id]}))
+            return out
+
+        # SMTP-without-credentials would skip every recipient; rendering does not need a backend.
+        with override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+            results = {}
+            for name, fn in (("per-recipient", per_recipient), ("batch", batch)):
+                started = time.perf_counter()
+                emails = fn()
+                elapsed = time.perf_counter() - started
+                results[name] = (elapsed, emails)
+                self.stdout.write(f"{name:>14}: {len(emails)} emails in {elapsed:.2f}s ({len(emails) / elapsed:,.0f}/s)")
+            self.stdout.write(f"{'speedup':>14}: {results['per-recipient'][0] / results['batch'][0]:.1f}x")
+
+        if verify:
+            def normalized(rendered):
+                # Unsubscribe tokens carry a timestamp, so runs seconds apart sign different URLs.
+                url = rendered.unsubscribe_url
+                return rendered._replace(
+                    text_body=rendered.text_body.replace(url, ""),
+                    html_body=rendered.html_body.replace(url, ""),
+                    unsubscribe_url="",
+                )
+
+            slow, fast = results["per-recipient"][1], results["batch"][1]
+            mismatched = sum(1 for a, b in zip(slow, fast) if normalized(a) != normalized(b))
+            if len(slow) != len(fast) or mismatched:
+                self.stderr.write(f"verify: {mismatched} of {len(slow)} emails differ")
+            else:
+                self.stdout.write(f"verify: all {len(slow)} emails identical")
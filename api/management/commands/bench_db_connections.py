@@ -0,0 +1,109 @@
+"""
+Benchmark per-request database connection cost for each DB_CONNECTION_MODE
+(see api.db_utils): serverless (connect per request), pool (psycopg 3 pool) and
+persistent (CONN_MAX_AGE).
+
+    python manage.py bench_db_connections --requests 500 --queries 3 --threads 4
+    python manage.py bench_db_connections --database-url postgresql://... --modes serverless,pool
+
+Each simulated request runs Django's request_started / request_finished
+connection handling around ``--queries`` trivial queries, so the timings are the
+connection overhead a view pays, not query work. Uses DATABASE_URL (or the
+configured default database) unless --database-url is given; writes nothing.
+"""
+import statistics
+import threading
+import time
+
+import dj_database_url
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import ConnectionHandler
+
+from api.db_utils import CONNECTION_MODES, POOL, apply_connection_mode
+
+
+def _request(conn, queries, stats):
+    conn.close_if_unusable_or_obsolete()  # request_started
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        for _ in range(queries):
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        if conn.vendor == 'postgresql':
+            cursor.execute('SELECT pg_backend_pid()')
+            stats['backends'].add(cursor.fetchone()[0])
+    conn.close_if_unusable_or_obsolete()  # request_finished
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "Measure per-request connection overhead of each DB_CONNECTION_MODE."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database-url", default="", help="Defaults to DATABASE_URL / the default database.")
+        parser.add_argument("--modes", default=",".join(CONNECTION_MODES))
+        parser.add_argument("--requests", type=int, default=300)
+        parser.add_argument("--queries", type=int, default=3, help="Queries per simulated request.")
+        parser.add_argument("--threads", type=int, default=1, help="Concurrent request threads.")
+
+    def handle(self, *args, database_url, modes, requests, queries, threads, **options):
+        url = database_url or getattr(settings, "DATABASE_URL", "")
+        base = dj_database_url.parse(url) if url else dict(settings.DATABASES["default"])
+        self.stdout.write(
+            f"{base.get('ENGINE', '').rsplit('.', 1)[-1]} {base.get('HOST') or base.get('NAME')}: "
+            f"{requests} requests x {queries} queries, {threads} thread(s)"
+        )
+        self.stdout.write(f"{'mode':>11}  {'mean ms':>8}  {'p50 ms':>7}  {'p95 ms':>7}  {'connect ms/req':>14}  backends")
+        for mode in [m.strip() for m in modes.split(",") if m.strip()]:
+            try:
+                db = apply_connection_mode(base, mode, pool_max_size=max(threads, 2))
+            except ImproperlyConfigured as exc:
+                if mode not in CONNECTION_MODES:
+                    raise CommandError(str(exc))
+                self.stdout.write(f"{mode:>11}  skipped: {exc}")
+                continue
+            self._bench(mode, db, requests, queries, threads)
+
+    def _bench(self, mode, db, requests, queries, threads):
+        alias = f"bench_{mode}"
+        # ConnectionHandler insists on a "default" entry; the benchmark never touches it.
+        handler = ConnectionHandler({"default": settings.DATABASES["default"], alias: db})
+        stats = {"connect": 0.0, "connects": 0, "backends": set()}
+        lock = threading.Lock()
+        timings = []
+
+        def worker(n):
+            conn = handler[alias]
+            connect = conn.connect
+
+            def timed_connect():
+                started = time.perf_counter()
+                connect()
+                with lock:
+                    stats["connect"] += time.perf_counter() - started
+                    stats["connects"] += 1
+
+            conn.connect = timed_connect
+            local = [_request(conn, queries, stats) for _ in range(n)]
+            conn.close()
+            with lock:
+                timings.extend(local)
+
+        per_thread = [requests // threads + (1 if i < requests % threads else 0) for i in range(threads)]
+        pool_threads = [threading.Thread(target=worker, args=(n,)) for n in per_thread]
+        for t in pool_threads:
+            t.start()
+        for t in pool_threads:
+            t.join()
+        if mode == POOL:
+            handler[alias].close_pool()
+
+        ms = sorted(t * 1000 for t in timings)
+        p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+        backends = len(stats["backends"]) if stats["backends"] else "-"
+        self.stdout.write(
+            f"{mode:>11}  {statistics.fmean(ms):8.2f}  {statistics.median(ms):7.2f}  {p95:7.2f}  "
+            f"{stats['connect'] * 1000 / len(ms):14.2f}  {backends}"
+        )
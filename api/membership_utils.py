@@ -0,0 +1,155 @@
+"""
+membership_utils.py — place-membership checks served from access-token claims.
+
+With ``PLACE_CLAIMS_IN_TOKENS`` on, access tokens minted at login/refresh carry:
+
+    "pm": {"<place_id>": ["o"|"m", <joined_at epoch µs>], ...}
+    "mv": "<membership version>"
+
+``mv`` is the user's membership version from the cache at mint time. Anything
+that adds or removes a membership calls ``bump_membership_version`` (after
+commit), so older tokens stop matching and checks fall back to the DB until the
+client refreshes. With a fresh token, ``is_place_member`` / ``get_membership``
+answer from the already-validated JWT plus one cache read per request.
+
+Users in more than PLACE_CLAIMS_MAX_PLACES places get no claims (DB checks only).
+"""
+from __future__ import annotations
+
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone as dt_utc
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CLAIM_PLACES = "pm"
+CLAIM_VERSION = "mv"
+
+_ROLE_CODES = {"owner": "o", "member": "m"}
+_CODE_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+_UNSET = object()
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_utc.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class Membership(NamedTuple):
+    role: str
+    joined_at: datetime
+
+
+def _version_key(user_id) -> str:
+    return f"membership_version:{user_id}"
+
+
+def claims_enabled() -> bool:
+    return getattr(settings, "PLACE_CLAIMS_IN_TOKENS", False)
+
+
+def bump_membership_version(user_ids) -> None:
+    """Invalidate membership claims in these users' outstanding access tokens (after commit)."""
+    user_ids = list(user_ids or ())
+    if not user_ids or not claims_enabled():
+        return
+
+    def _bump():
+        try:
+            cache.set_many({_version_key(uid): uuid.uuid4().hex[:12] for uid in user_ids}, None)
+        except Exception:
+            logger.warning("cache SET failed for membership version", exc_info=True)
+
+    transaction.on_commit(_bump)
+
+
+def add_membership_claims(access_token, user_id) -> None:
+    """Stamp place/role claims and the current membership version onto an access token."""
+    from .models import PlaceMember
+
+    if not claims_enabled() or user_id is None:
+        return
+    try:
+        # Read the version before memberships: a concurrent bump then leaves this token stale.
+        key = _version_key(user_id)
+        cache.add(key, uuid.uuid4().hex[:12], None)
+        version = cache.get(key)
+    except Exception:
+        logger.warning("cache GET failed for membership version", exc_info=True)
+        return
+    if not version:
+        return
+    limit = getattr(settings, "PLACE_CLAIMS_MAX_PLACES", 50)
+    rows = list(
+        PlaceMember.objects.filter(user_id=user_id).values_list("place_id", "role", "joined_at")[: limit + 1]
+    )
+    if len(rows) > limit:
+        return
+    access_token[CLAIM_PLACES] = {
+        str(place_id): [_ROLE_CODES.get(role, "m"), (joined_at - _EPOCH) // _MICROSECOND]
+        for place_id, role, joined_at in rows
+    }
+    access_token[CLAIM_VERSION] = version
+
+
+def _fresh_claims(request):
+    """The token's place claims if they are still current, else None. Memoized per request."""
+    cached = getattr(request, "_membership_claims", _UNSET)
+    if cached is not _UNSET:
+        return cached
+    claims = None
+    token = getattr(request, "auth", None)
+    if claims_enabled() and token is not None:
+        try:
+            places = token.get(CLAIM_PLACES)
+            version = token.get(CLAIM_VERSION)
+            if places is not None and version and cache.get(_version_key(request.user.pk)) == version:
+                claims = places
+        except Exception:
+            logger.warning("membership claim check failed; using DB", exc_info=True)
+    try:
+        request._membership_claims = claims
+    except AttributeError:
+        pass
+    return claims
+
+
+def get_membership(request, place_id) -> Membership | None:
+    """The current user's (role, joined_at) in a place, or None if not a member."""
+    from .models import PlaceMember
+
+    claims = _fresh_claims(request)
+    if claims is not None:
+        entry = claims.get(str(place_id))
+        if not entry:
+            return None
+        code, joined_us = entry
+        return Membership(
+            _CODE_ROLES.get(code, PlaceMember.ROLE_MEMBER),
+            _EPOCH + joined_us * _MICROSECOND,
+        )
+    # DB fallback, memoized so a view and its permission checks share one query.
+    memo = getattr(request, "_membership_rows", None)
+    if memo is None:
+        memo = {}
+        try:
+            request._membership_rows = memo
+        except AttributeError:
+            pass
+    key = str(place_id)
+    if key not in memo:
+        row = (
+            PlaceMember.objects.filter(place_id=place_id, user=request.user)
+            .values_list("role", "joined_at")
+            .first()
+        )
+        memo[key] = Membership(*row) if row else None
+    return memo[key]
+
+
+def is_place_member(request, place_id, role: str | None = None) -> bool:
+    """True if the current user belongs to the place (optionally with *role*)."""
+    membership = get_membership(request, place_id)
+    return membership is not None and (role is None or membership.role == role)
@@ -0,0 +1,49 @@
+from django.utils.deprecation import MiddlewareMixin
+
+from .activity_utils import ActivityLogBuffer
+from .db_router import pin_to_primary
+
+
+class ActivityLogBufferMiddleware(MiddlewareMixin):
+    """
+    Give each request an ActivityLog buffer and flush it once the response has
+    been sent (response close), so activity rows never add to request latency.
+    Entries only reach the buffer when their transaction commits (_log_activity);
+    a request that raises or answers 4xx/5xx writes nothing.
+    """
+
+    def process_request(self, request):
+        request.activity_log_buffer = ActivityLogBuffer()
+
+    def process_exception(self, request, exception):
+        buffer = getattr(request, 'activity_log_buffer', None)
+        if buffer is not None:
+            buffer.discard()
+
+    def process_response(self, request, response):
+        buffer = getattr(request, 'activity_log_buffer', None)
+        if buffer is None:
+            return response
+        if response.status_code >= 400:
+            buffer.discard()
+        else:
+            # Closers run from HttpResponse.close(), after the body is delivered.
+            response._resource_closers.append(buffer.flush)
+        return response
+
+
+class ReplicaStickinessMiddleware(MiddlewareMixin):
+    """
+    Read-your-writes for the read replica: after a successful unsafe request the
+    user reads from the primary for REPLICA_STICKY_SECONDS (see api.db_router).
+    Installed only when DATABASE_REPLICA_URL is set.
+    """
+
+    def process_response(self, request, response):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400:
+            return response
+        # DRF copies the JWT-authenticated user onto the Django request.
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user_ids=[user.pk])
+        return response
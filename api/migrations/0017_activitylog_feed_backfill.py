@@ -0,0 +1,95 @@
+# ActivityLog becomes the single source for the activity feed:
+# add keyset indexes and backfill legacy expense_added / place_created events.
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_activity_log(apps, schema_editor):
+    ActivityLog = apps.get_model('api', 'ActivityLog')
+    Expense = apps.get_model('api', 'Expense')
+    Place = apps.get_model('api', 'Place')
+
+    # Keep the original event time instead of "now".
+    created_at_field = ActivityLog._meta.get_field('created_at')
+    created_at_field.auto_now_add = False
+    try:
+        logged_expense_ids = set(
+            ActivityLog.objects.filter(type='expense_added', expense__isnull=False)
+            .values_list('expense_id', flat=True)
+        )
+        batch = []
+        expenses = (
+            Expense.objects.order_by('id')
+            .values('id', 'place_id', 'added_by_id', 'paid_by_id', 'amount', 'description', 'created_at')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        for e in expenses:
+            if e['id'] in logged_expense_ids:
+                continue
+            batch.append(ActivityLog(
+                user_id=e['added_by_id'] or e['paid_by_id'],
+                type='expense_added',
+                place_id=e['place_id'],
+                expense_id=e['id'],
+                amount=e['amount'],
+                description=(e['description'] or '')[:500],
+                extra={'backfilled': True},
+                created_at=e['created_at'],
+            ))
+            if len(batch) >= BATCH_SIZE:
+                ActivityLog.objects.bulk_create(batch)
+                batch = []
+
+        logged_place_ids = set(
+            ActivityLog.objects.filter(type='place_created', place__isnull=False)
+            .values_list('place_id', flat=True)
+        )
+        places = (
+            Place.objects.order_by('id')
+            .values('id', 'name', 'created_by_id', 'created_at')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        for p in places:
+            if p['id'] in logged_place_ids:
+                continue
+            batch.append(ActivityLog(
+                user_id=p['created_by_id'],
+                type='place_created',
+                place_id=p['id'],
+                description=(p['name'] or '')[:500],
+                extra={'backfilled': True},
+                created_at=p['created_at'],
+            ))
+            if len(batch) >= BATCH_SIZE:
+                ActivityLog.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            ActivityLog.objects.bulk_create(batch)
+    finally:
+        created_at_field.auto_now_add = True
+
+
+def remove_backfilled(apps, schema_editor):
+    ActivityLog = apps.get_model('api', 'ActivityLog')
+    ActivityLog.objects.filter(extra__backfilled=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_userprofile_email_notifications_enabled'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['place', '-created_at', '-id'], name='activity_place_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='activity_user_feed_idx'),
+        ),
+        migrations.RunPython(backfill_activity_log, remove_backfilled),
+    ]
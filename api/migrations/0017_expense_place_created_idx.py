@@ -0,0 +1,18 @@
+# Keyset index for ExpenseCursorPagination: (place, -created_at, -id) lets every page
+# of a place's expenses be an index range scan instead of a sort of the whole place.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_activitylog_feed_backfill'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['place', '-created_at', '-id'], name='expense_place_created_idx'),
+        ),
+    ]
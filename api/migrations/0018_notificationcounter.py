@@ -0,0 +1,50 @@
+# NotificationCounter: denormalized per-user unread counts, backfilled from Notification.
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    Notification = apps.get_model('api', 'Notification')
+    NotificationCounter = apps.get_model('api', 'NotificationCounter')
+    counts = {}
+    unread = Notification.objects.filter(is_read=False)
+    for row in unread.values('user_id').annotate(n=Count('id')):
+        counts[(row['user_id'], 'total')] = row['n']
+    for row in unread.values('user_id', 'type').annotate(n=Count('id')):
+        counts[(row['user_id'], row['type'])] = row['n']
+    for n in unread.only('user_id', 'type', 'data').iterator(chunk_size=2000):
+        kind = (n.data or {}).get('kind') if isinstance(n.data, dict) else None
+        if kind:
+            key = (n.user_id, f"{n.type}:{kind}")
+            counts[key] = counts.get(key, 0) + 1
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=uid, key=key, unread=n) for (uid, key), n in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_expense_place_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=80)),
+                ('unread', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'key')},
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Expense search: composite filter indexes (the list's keyset index is in 0017) plus a
+# vendor-specific description index (pg_trgm GIN on PostgreSQL, an FTS5 table kept in
+# sync by triggers on SQLite).
+
+from django.db import migrations, models
+
+PG_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS expense_description_trgm_idx '
+    'ON api_expense USING gin (description gin_trgm_ops)',
+]
+PG_REVERSE = [
+    'DROP INDEX IF EXISTS expense_description_trgm_idx',
+]
+
+# External-content FTS5 table: stores only the index, rows are read from api_expense.
+# SQLite drops triggers when it rebuilds api_expense (most AlterField/RemoveField ops do), and
+# nothing warns; api.search_utils.ensure_fts_triggers() recreates them from this list on post_migrate.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_expense_fts USING fts5("
+    "description, content='api_expense', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS api_expense_fts_ai AFTER INSERT ON api_expense BEGIN "
+    "INSERT INTO api_expense_fts(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS api_expense_fts_ad AFTER DELETE ON api_expense BEGIN "
+    "INSERT INTO api_expense_fts(api_expense_fts, rowid, description) VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS api_expense_fts_au AFTER UPDATE OF description ON api_expense BEGIN "
+    "INSERT INTO api_expense_fts(api_expense_fts, rowid, description) VALUES ('delete', old.id, old.description); "
+    "INSERT INTO api_expense_fts(rowid, description) VALUES (new.id, new.description); END",
+    "INSERT INTO api_expense_fts(api_expense_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS api_expense_fts_au',
+    'DROP TRIGGER IF EXISTS api_expense_fts_ad',
+    'DROP TRIGGER IF EXISTS api_expense_fts_ai',
+    'DROP TABLE IF EXISTS api_expense_fts',
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for sql in statements_by_vendor.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+    return run
+
+
+create_text_index = _run({'postgresql': PG_FORWARD, 'sqlite': SQLITE_FORWARD})
+drop_text_index = _run({'postgresql': PG_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_activitylog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['place', 'date'], name='expense_place_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['place', 'paid_by'], name='expense_place_payer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['place', 'category'], name='expense_place_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['place', 'amount'], name='expense_place_amount_idx'),
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+    ]
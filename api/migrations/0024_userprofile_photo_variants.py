@@ -0,0 +1,36 @@
+# UserProfile.photo_hash / photo_status: resized profile photo variants rendered off-request.
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def queue_existing_photos(apps, schema_editor):
+    # Photos uploaded before this pipeline get variants from the pending-photo sweep.
+    UserProfile = apps.get_model('api', 'UserProfile')
+    UserProfile.objects.exclude(profile_photo='').exclude(profile_photo__isnull=True).update(photo_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_userprofile_email_digest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['photo_status', 'user'], name='profile_photo_status_idx'),
+        ),
+        migrations.RunPython(queue_existing_photos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# PaymentRequestCooldown: one row per (requester, target, place) for the manual
+# payment-request cooldown, seeded from requests sent in the last 12 hours.
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_recent_requests(apps, schema_editor):
+    Notification = apps.get_model('api', 'Notification')
+    PaymentRequestCooldown = apps.get_model('api', 'PaymentRequestCooldown')
+    latest = {}
+    rows = Notification.objects.filter(
+        type='payment_request',
+        created_at__gte=timezone.now() - timedelta(hours=12),
+        place__isnull=False,
+    ).values_list('user_id', 'place_id', 'data', 'created_at')
+    for target_id, place_id, data, created_at in rows:
+        if not isinstance(data, dict) or data.get('kind') != 'manual' or not data.get('from_user_id'):
+            continue
+        key = (data['from_user_id'], target_id, place_id)
+        latest[key] = max(latest.get(key, created_at), created_at)
+    PaymentRequestCooldown.objects.bulk_create(
+        [
+            PaymentRequestCooldown(requester_id=r, target_id=t, place_id=p, last_sent_at=at)
+            for (r, t, p), at in latest.items()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_userprofile_photo_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRequestCooldown',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_sent_at', models.DateTimeField()),
+                ('place', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.place')),
+                ('requester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('requester', 'target', 'place')},
+            },
+        ),
+        migrations.RunPython(seed_recent_requests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# CronCursor: resumable cron positions move from the cache to the database.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_paymentrequestcooldown'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CronCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=64, unique=True)),
+                ('run', models.CharField(max_length=64)),
+                ('position', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
@@ -5,14 +7,45 @@ from django.utils import timezone
 
 class UserProfile(models.Model):
     """Optional profile: display name and photo. One-to-one with User."""
+    DIGEST_IMMEDIATE = 'immediate'  # one email per event (welcome, payment request, cycle end)
+    DIGEST_DAILY = 'daily'
+    DIGEST_WEEKLY = 'weekly'
+    DIGEST_CHOICES = [
+        (DIGEST_IMMEDIATE, 'Immediately'),
+        (DIGEST_DAILY, 'Daily digest'),
+        (DIGEST_WEEKLY, 'Weekly digest'),
+    ]
+    PHOTO_PENDING = 'pending'  # raw upload stored; variants not rendered yet
+    PHOTO_READY = 'ready'
+    PHOTO_FAILED = 'failed'  # not a decodable image; the raw upload is served as-is
+    PHOTO_STATUS_CHOICES = [
+        (PHOTO_PENDING, 'Pending'),
+        (PHOTO_READY, 'Ready'),
+        (PHOTO_FAILED, 'Failed'),
+    ]
+
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name='profile'
     )
     display_name = models.CharField(max_length=255, blank=True)
+    # The upload as received; resized variants are derived from it (api.photo_utils).
     profile_photo = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    # sha256 of the upload; names the variant files so identical uploads share them.
+    photo_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    photo_status = models.CharField(max_length=10, choices=PHOTO_STATUS_CHOICES, blank=True)
     email_notifications_enabled = models.BooleanField(default=True)
+    # Daily/weekly: per-event emails are replaced by one digest email (api.digest_utils).
+    email_digest = models.CharField(max_length=10, choices=DIGEST_CHOICES, default=DIGEST_IMMEDIATE)
+    # Notifications after this go into the next digest, which is due one period later.
+    last_digest_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['email_digest', 'last_digest_at'], name='profile_digest_due_idx'),
+            models.Index(fields=['photo_status', 'user'], name='profile_photo_status_idx'),
+        ]
 
     def __str__(self):
         return f"Profile for {self.user.username}"
@@ -208,6 +241,15 @@ class Expense(models.Model):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Expense list / search: place-scoped, newest first (keyset order of ExpenseCursorPagination)
+            models.Index(fields=['place', '-created_at', '-id'], name='expense_place_created_idx'),
+            models.Index(fields=['place', 'date'], name='expense_place_date_idx'),
+            models.Index(fields=['place', 'paid_by'], name='expense_place_payer_idx'),
+            models.Index(fields=['place', 'category'], name='expense_place_category_idx'),
+            models.Index(fields=['place', 'amount'], name='expense_place_amount_idx'),
+        ]
+        # Description text search indexes are vendor-specific (pg_trgm / FTS5); see migration 0021.
 
     def __str__(self):
         return f"{self.description} - {self.amount} ({self.place})"
@@ -315,10 +357,16 @@ class ActivityLog(models.Model):
     amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     description = models.CharField(max_length=500, blank=True)
     extra = models.JSONField(default=dict, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the (buffered / spooled) row is inserted.
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Activity feed: keyset pagination on (created_at, id) per place / per user.
+            models.Index(fields=['place', '-created_at', '-id'], name='activity_place_feed_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='activity_user_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user_id} {self.type} @ {self.created_at}"
@@ -363,6 +411,9 @@ class Notification(models.Model):
 
     is_read = models.BooleanField(default=False)
     read_at = models.DateTimeField(null=True, blank=True)
+    # Number of events merged into this row (see notification_utils.coalesce_notifications).
+    coalesced_count = models.PositiveIntegerField(default=1)
+    # For coalesced rows this is bumped to the latest merged event so the row sorts first.
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -371,6 +422,66 @@ class Notification(models.Model):
     def __str__(self):
         return f"{self.user}: {self.title}"
 
+    def counter_keys(self):
+        """NotificationCounter keys this notification counts towards while unread."""
+        keys = [NotificationCounter.KEY_TOTAL, self.type]
+        kind = (self.data or {}).get('kind') if isinstance(self.data, dict) else None
+        if kind:
+            keys.append(f"{self.type}:{kind}")
+        return keys
+
+
+class NotificationCounter(models.Model):
+    """
+    Denormalized unread notification counts per user, so badge polls read one row
+    instead of counting the notifications table.
+    key: 'total', a notification type (e.g. 'payment_request'), or 'type:kind'
+    (e.g. 'payment_request:manual'). Maintained by api.notification_utils.
+    """
+    KEY_TOTAL = 'total'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notification_counters',
+    )
+    key = models.CharField(max_length=80)
+    unread = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'key']
+
+    def __str__(self):
+        return f"{self.user_id} {self.key}={self.unread}"
+
+
+class PaymentRequestCooldown(models.Model):
+    """
+    When a member last sent a manual payment request to another member of a place.
+    One row per (requester, target, place), claimed with a conditional UPDATE, so the
+    12-hour cooldown costs one indexed row write instead of a scan of notifications.
+    """
+    COOLDOWN = timedelta(hours=12)
+
+    requester = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    target = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='+')
+    last_sent_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['requester', 'target', 'place']
+
+    def __str__(self):
+        return f"{self.requester_id}->{self.target_id} @ {self.place_id}: {self.last_sent_at}"
+
 
 class UserSession(models.Model):
     """
@@ -396,3 +507,84 @@ class UserSession(models.Model):
 
     def __str__(self):
         return f"{self.user.username} @ {self.device_label or self.jti[:8]}"
+
+
+class StreamTicket(models.Model):
+    """
+    Single-use, short-lived credential for opening the SSE stream (/api/events/).
+    EventSource cannot send headers, so the stream URL carries a ticket instead of
+    the access token; only its SHA-256 is stored. See api.realtime.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    key_hash = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} until {self.expires_at}"
+
+
+class EmailOutbox(models.Model):
+    """
+    Rendered transactional email waiting to be sent. Request paths enqueue rows
+    (send_transactional_email); api.outbox_utils.drain_email_outbox sends them in
+    batches over one connection, retrying failures with backoff.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'  # gave up after EMAIL_OUTBOX_MAX_ATTEMPTS
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='outbox_emails',
+    )
+    template_name = models.CharField(max_length=100, blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body_text = models.TextField()
+    body_html = models.TextField(blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Earliest time a drainer may pick the row up: retry backoff, or the lease of a running drain.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email}: {self.subject} ({self.status})"
+
+
+class CronCursor(models.Model):
+    """
+    Where a budgeted /api/cron/* job stopped within a run (see api.cron_utils).
+    Kept in the database because a per-instance cache would lose it between
+    invocations that land on different serverless instances.
+    """
+    job = models.CharField(max_length=64, unique=True)
+    run = models.CharField(max_length=64)
+    position = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.job} [{self.run}] @ {self.position}"
@@ -0,0 +1,216 @@
+"""
+notification_utils.py — create / mark-read helpers that keep NotificationCounter in sync.
+
+Every write that changes a notification's unread state should go through here so
+the per-user counters stay accurate and badge reads never scan the notifications
+table:
+
+    from .notification_utils import (
+        create_notification,
+        bulk_create_notifications,
+        coalesce_notifications,
+        mark_notification_read,
+        mark_all_notifications_read,
+        get_unread_count,
+    )
+"""
+from __future__ import annotations
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from .models import Notification, NotificationCounter
+from .realtime import publish_change
+
+
+def _bump_counters(deltas: Counter) -> None:
+    """Apply {(user_id, key): delta} to NotificationCounter, creating missing rows."""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=uid, key=key) for uid, key in deltas],
+        ignore_conflicts=True,
+    )
+    # Group by delta so a fan-out (same +1 for many users) is a single UPDATE.
+    by_delta: dict[int, list[tuple[int, str]]] = {}
+    for pair, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(pair)
+    for delta, pairs in by_delta.items():
+        by_key: dict[str, list[int]] = {}
+        for uid, key in pairs:
+            by_key.setdefault(key, []).append(uid)
+        for key, user_ids in by_key.items():
+            NotificationCounter.objects.filter(user_id__in=user_ids, key=key).update(
+                unread=F('unread') + delta
+            )
+
+
+def _unread_deltas(notifications, sign: int = 1) -> Counter:
+    deltas: Counter = Counter()
+    for n in notifications:
+        for key in n.counter_keys():
+            deltas[(n.user_id, key)] += sign
+    return deltas
+
+
+def create_notification(**fields) -> Notification:
+    """Notification.objects.create(...) plus counter increments."""
+    with transaction.atomic():
+        notification = Notification.objects.create(**fields)
+        if not notification.is_read:
+            _bump_counters(_unread_deltas([notification]))
+        publish_change('notification', user_ids=[notification.user_id])
+    return notification
+
+
+def bulk_create_notifications(notifications: list[Notification]) -> list[Notification]:
+    """Notification.objects.bulk_create(...) plus counter increments (constant queries per key)."""
+    if not notifications:
+        return []
+    with transaction.atomic():
+        created = Notification.objects.bulk_create(notifications)
+        _bump_counters(_unread_deltas(n for n in created if not n.is_read))
+        publish_change('notification', user_ids={n.user_id for n in created})
+    return created
+
+
+def coalesce_notifications(
+    user_ids,
+    *,
+    place,
+    type: str,
+    title: str,
+    burst_title: str,
+    message: str,
+    data: dict,
+    window_seconds: int,
+) -> None:
+    """
+    Fan out one event to *user_ids*, merging it into each recipient's unread
+    notification of the same (place, type) touched within *window_seconds*.
+
+    Merged rows are upserted in a single UPDATE: ``coalesced_count`` goes up,
+    the title becomes *burst_title* (``{count}`` is filled in by the database),
+    and ``created_at`` moves to now so the row sorts first. They are already
+    unread, so counters are not bumped again. Recipients without such a row get
+    a fresh notification. With ``window_seconds <= 0`` every event is inserted.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    if window_seconds <= 0:
+        bulk_create_notifications([
+            Notification(user_id=uid, place=place, type=type, title=title, message=message, data=data)
+            for uid in user_ids
+        ])
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        open_rows = (
+            Notification.objects.filter(
+                user_id__in=user_ids,
+                place=place,
+                type=type,
+                is_read=False,
+                created_at__gte=now - timedelta(seconds=window_seconds),
+            )
+            .order_by('user_id', '-created_at')
+            .values_list('id', 'user_id')
+        )
+        merge_ids = {}
+        for pk, uid in open_rows:
+            merge_ids.setdefault(uid, pk)
+        if merge_ids:
+            prefix, _, suffix = burst_title.partition('{count}')
+            Notification.objects.filter(pk__in=merge_ids.values()).update(
+                coalesced_count=F('coalesced_count') + 1,
+                title=Concat(
+                    Value(prefix),
+                    Cast(F('coalesced_count') + 1, output_field=models.CharField()),
+                    Value(suffix),
+                    output_field=models.CharField(),
+                ),
+                message=message,
+                data=data,
+                created_at=now,
+            )
+            publish_change('notification', user_ids=merge_ids.keys())
+        bulk_create_notifications([
+            Notification(user_id=uid, place=place, type=type, title=title, message=message, data=data)
+            for uid in user_ids - merge_ids.keys()
+        ])
+
+
+def mark_notification_read(user, notification_id) -> bool:
+    """Mark one notification read. Returns True if it was unread before."""
+    with transaction.atomic():
+        notification = (
+            Notification.objects.filter(user=user, id=notification_id, is_read=False)
+            .only('id', 'user_id', 'type', 'data')
+            .first()
+        )
+        if notification is None:
+            return False
+        # Conditional update: concurrent requests only decrement once.
+        updated = Notification.objects.filter(pk=notification.pk, is_read=False).update(
+            is_read=True, read_at=timezone.now()
+        )
+        if updated:
+            _bump_counters(_unread_deltas([notification], sign=-1))
+            publish_change('notification', user_ids=[notification.user_id])
+        return bool(updated)
+
+
+def mark_all_notifications_read(user) -> int:
+    """Mark every unread notification read and zero the user's counters."""
+    with transaction.atomic():
+        updated = Notification.objects.filter(user=user, is_read=False).update(
+            is_read=True, read_at=timezone.now()
+        )
+        NotificationCounter.objects.filter(user=user).exclude(unread=0).update(unread=0)
+        if updated:
+            publish_change('notification', user_ids=[user.id])
+    return updated
+
+
+def get_unread_count(user, key: str = NotificationCounter.KEY_TOTAL) -> int:
+    """Unread count for one counter key (one indexed row read)."""
+    value = (
+        NotificationCounter.objects.filter(user=user, key=key)
+        .values_list('unread', flat=True)
+        .first()
+    )
+    return max(0, value or 0)
+
+
+def recount_notification_counters(user_ids) -> None:
+    """
+    Rebuild counters from the notifications table for these users.
+
+    Needed after bulk deletes that bypass the helpers above (e.g. a place
+    deletion cascading to its notifications).
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    unread = Notification.objects.filter(user_id__in=user_ids, is_read=False)
+    deltas: Counter = Counter()
+    for row in unread.values('user_id').annotate(n=Count('id')):
+        deltas[(row['user_id'], NotificationCounter.KEY_TOTAL)] = row['n']
+    for row in unread.values('user_id', 'type').annotate(n=Count('id')):
+        deltas[(row['user_id'], row['type'])] = row['n']
+    for n in unread.exclude(data__kind__isnull=True).only('user_id', 'type', 'data'):
+        kind = (n.data or {}).get('kind')
+        if kind:
+            deltas[(n.user_id, f"{n.type}:{kind}")] += 1
+    with transaction.atomic():
+        NotificationCounter.objects.filter(user_id__in=user_ids).delete()
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=uid, key=key, unread=n) for (uid, key), n in deltas.items()]
+        )
@@ -0,0 +1,169 @@
+"""
+outbox_utils.py — transactional email outbox.
+
+With EMAIL_OUTBOX_ENABLED, ``send_transactional_email`` stores the rendered
+message as an EmailOutbox row instead of talking to SMTP inside the request.
+Enqueueing joins the caller's transaction, so an email is only sent if the
+change that triggered it commits.
+
+``drain_email_outbox`` (Celery Beat every minute, or /api/cron/drain-email-outbox/)
+claims due rows in batches and sends them over one backend connection. Failed
+sends are retried with exponential backoff up to EMAIL_OUTBOX_MAX_ATTEMPTS, then
+marked failed.
+
+Claiming stamps a random token on due rows with a conditional UPDATE and pushes
+``next_attempt_at`` past a lease, so overlapping drainers never send the same row
+and rows held by a crashed drain become due again after the lease.
+"""
+from __future__ import annotations
+
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+# How long claimed rows stay invisible to other drainers.
+LEASE = timedelta(minutes=5)
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 6 * 3600
+# Sent rows are kept this long for support lookups, then deleted by the drainer.
+SENT_RETENTION = timedelta(days=7)
+
+
+def outbox_enabled() -> bool:
+    return getattr(settings, "EMAIL_OUTBOX_ENABLED", False)
+
+
+def enqueue_email(msg: EmailMultiAlternatives, user=None, template_name: str = ""):
+    """Store a built message for the drainer. Returns the EmailOutbox row."""
+    from .models import EmailOutbox
+
+    html = next((content for content, mimetype in msg.alternatives if mimetype == "text/html"), "")
+    return EmailOutbox.objects.create(
+        user=user,
+        template_name=template_name[:100],
+        from_email=msg.from_email or "",
+        to_email=msg.to[0],
+        subject=msg.subject[:255],
+        body_text=msg.body,
+        body_html=html,
+        headers=dict(msg.extra_headers),
+    )
+
+
+def _build_message(row, connection) -> EmailMultiAlternatives:
+    msg = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body_text,
+        from_email=row.from_email or getattr(settings, "DEFAULT_FROM_EMAIL", None),
+        to=[row.to_email],
+        headers=row.headers or None,
+        connection=connection,
+    )
+    if row.body_html:
+        msg.attach_alternative(row.body_html, "text/html")
+    return msg
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS))
+
+
+def _claim(batch_size: int, now):
+    """Claim up to *batch_size* due rows for this drainer; returns them (oldest first)."""
+    from .models import EmailOutbox
+
+    due_ids = list(
+        EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+        .order_by("next_attempt_at", "id")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not due_ids:
+        return []
+    token = uuid.uuid4().hex
+    # Conditional on still being due: rows another drainer claimed in between are skipped.
+    EmailOutbox.objects.filter(
+        id__in=due_ids, status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=now
+    ).update(claim_token=token, next_attempt_at=now + LEASE)
+    return list(EmailOutbox.objects.filter(claim_token=token).order_by("id"))
+
+
+def _send_batch(rows) -> tuple[list, list]:
+    """Send *rows* over one connection. Returns (sent_rows, [(row, error), ...])."""
+    sent, failed = [], []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning("email outbox: could not open backend connection", exc_info=True)
+        return [], [(row, exc) for row in rows]
+    try:
+        for row in rows:
+            try:
+                # One message per call so a rejected recipient does not fail the rest.
+                if connection.send_messages([_build_message(row, connection)]):
+                    sent.append(row)
+                else:
+                    failed.append((row, RuntimeError("backend reported 0 messages sent")))
+            except Exception as exc:
+                failed.append((row, exc))
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            logger.warning("email outbox: closing backend connection failed", exc_info=True)
+    return sent, failed
+
+
+def drain_email_outbox(batch_size: int = BATCH_SIZE, max_batches: int = 20, budget=None) -> dict:
+    """
+    Send due outbox rows, ``batch_size`` per connection. With a ``budget``
+    (cron_utils.TimeBudget), no new batch starts once it is spent.
+    """
+    from .models import EmailOutbox
+
+    max_attempts = getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 6)
+    totals = {"sent": 0, "retrying": 0, "failed": 0}
+    for n in range(max_batches):
+        if budget is not None and n and budget.expired():
+            break
+        now = timezone.now()
+        rows = _claim(batch_size, now)
+        if not rows:
+            break
+        sent, failed = _send_batch(rows)
+        if sent:
+            EmailOutbox.objects.filter(id__in=[row.id for row in sent]).update(
+                status=EmailOutbox.STATUS_SENT, sent_at=timezone.now(), claim_token="",
+                attempts=F("attempts") + 1, last_error="",
+            )
+            totals["sent"] += len(sent)
+        for row, exc in failed:
+            attempts = row.attempts + 1
+            give_up = attempts >= max_attempts
+            EmailOutbox.objects.filter(id=row.id).update(
+                status=EmailOutbox.STATUS_FAILED if give_up else EmailOutbox.STATUS_PENDING,
+                attempts=attempts,
+                next_attempt_at=now + _backoff(attempts),
+                claim_token="",
+                last_error=f"{type(exc).__name__}: {exc}"[:2000],
+            )
+            totals["failed" if give_up else "retrying"] += 1
+            logger.warning("email outbox: send to row %s failed (attempt %s): %s", row.id, attempts, exc)
+        if len(rows) < batch_size:
+            break
+
+    EmailOutbox.objects.filter(
+        status=EmailOutbox.STATUS_SENT, sent_at__lt=timezone.now() - SENT_RETENTION
+    ).delete()
+    totals["remaining"] = EmailOutbox.objects.filter(
+        status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=timezone.now()
+    ).count()
+    return totals
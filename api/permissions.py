@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .membership_utils import is_place_member
+
 
 class IsPlaceMember(permissions.BasePermission):
     """Only members of the Place can access."""
@@ -11,7 +13,7 @@ class IsPlaceMember(permissions.BasePermission):
         place = getattr(obj, 'place', None) or obj
         if place is None:
             return False
-        return place.members.filter(user=request.user).exists()
+        return is_place_member(request, place.pk)
 
 
 class IsPlaceMemberOrReadOnly(permissions.BasePermission):
@@ -19,4 +21,4 @@ class IsPlaceMemberOrReadOnly(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         place = getattr(obj, 'place', None) or obj
-        return place.members.filter(user=request.user).exists()
+        return is_place_member(request, place.pk)
@@ -0,0 +1,334 @@
+"""
+photo_utils.py — profile photo storage and resized variants.
+
+The ``me`` PATCH only stores the upload as-is (``profiles/raw/<sha256>.<ext>``)
+and marks the profile ``pending``; decoding and resizing happen off-request:
+
+  - PROFILE_PHOTO_EXECUTOR=process (default on long-lived servers): a small
+    process pool in the web process, started when the upload commits;
+  - ``celery``: the ``process_profile_photo`` task;
+  - ``cron`` (default on Vercel, where a function is frozen once it responds and
+    a pool would never finish): nothing on the request path; the photo stays
+    pending until the next /api/cron/process-profile-photos/ run;
+  - ``sync``: inline after the upload commits (still inside the request).
+
+Anything left pending (the ``cron`` executor, a web process that went away, a pool
+error, photos from before this pipeline) is picked up by ``process_pending_photos``
+(Celery Beat, or /api/cron/process-profile-photos/).
+
+Variants are 64/128/512 px WebP and JPEG under
+``profiles/v<VARIANT_VERSION>/<sha256>/<size>.<ext>``. Names depend only on the
+upload's content, so identical uploads share one set of files and the objects
+never change: they are uploaded with a year-long Cache-Control. Until variants
+exist, URLs fall back to the raw upload.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+SIZES = (64, 128, 512)
+# Avatars in lists and the API's default ``profile_photo`` URL.
+DEFAULT_SIZE = 128
+FORMATS = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+# Bump when sizes or encoder settings change so new variants get new (uncached) names.
+VARIANT_VERSION = 1
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+RAW_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif', 'MPO': 'jpg'}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class InvalidPhoto(ValueError):
+    """The upload is not an image Pillow can read; message is client-facing."""
+
+
+def variant_name(digest: str, size: int, fmt: str) -> str:
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f'profiles/v{VARIANT_VERSION}/{digest}/{size}.{ext}'
+
+
+def _flatten(img):
+    """RGB image; transparent areas become white instead of black."""
+    from PIL import Image
+
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def render_variants(data: bytes) -> dict | None:
+    """
+    {(size, fmt): encoded bytes} for every SIZES x FORMATS, or None if *data* is
+    not a readable image. Pure function of the bytes; runs in pool processes.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        # JPEG: let libjpeg decode at 1/2, 1/4 or 1/8 scale while staying >= the largest size.
+        img.draft('RGB', (max(SIZES), max(SIZES)))
+        img = ImageOps.exif_transpose(img)
+        img = _flatten(img)
+    except Exception:
+        return None
+
+    out = {}
+    for size in sorted(SIZES, reverse=True):
+        # Each size is reduced from the previous, smaller, one rather than the full decode.
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt in FORMATS:
+            buf = io.BytesIO()
+            if fmt == 'webp':
+                img.save(buf, format='WEBP', quality=WEBP_QUALITY, method=4)
+            else:
+                img.save(buf, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=size >= 512)
+            out[(size, fmt)] = buf.getvalue()
+    return out
+
+
+def _supabase_bucket(storage=None):
+    """(bucket API, storage) for the Supabase media backend, or (None, storage)."""
+    storage = storage or default_storage
+    client = getattr(storage, 'client', None)
+    if client is not None and hasattr(storage, 'bucket_name'):
+        return client.storage.from_(storage.bucket_name), storage
+    return None, storage
+
+
+def _bucket_path(storage, name: str) -> str:
+    # Where SupabaseMediaStorage._save puts *name*; its _open does not add folder_path.
+    return f'{storage.folder_path}/{name}'.lstrip('/')
+
+
+def _get(name: str) -> bytes:
+    """Read an object written by _put or by the storage's save()."""
+    bucket, storage = _supabase_bucket()
+    if bucket is not None:
+        return bucket.download(_bucket_path(storage, name))
+    with storage.open(name, 'rb') as f:
+        return f.read()
+
+
+def _put(name: str, data: bytes, content_type: str) -> None:
+    """Write an immutable object once, with a long Cache-Control where the backend supports it."""
+    bucket, storage = _supabase_bucket()
+    if bucket is not None:
+        # Supabase: upload directly so Cache-Control / Content-Type are set on the object.
+        bucket.upload(
+            path=_bucket_path(storage, name),
+            file=data,
+            file_options={
+                'upsert': 'true',
+                'content-type': content_type,
+                'cache-control': str(getattr(settings, 'PROFILE_PHOTO_CACHE_SECONDS', 31536000)),
+            },
+        )
+        return
+    if not storage.exists(name):
+        storage.save(name, ContentFile(data))
+
+
+def store_upload(profile, uploaded_file) -> bytes:
+    """
+    Store an upload unchanged under its content hash and mark the profile pending
+    (or ready right away when the same image was processed before). Only reads the
+    image header. Returns the upload's bytes. Raises InvalidPhoto. Does not save *profile*.
+    """
+    data = uploaded_file.read()
+    fmt = None
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None:
+        try:
+            fmt = Image.open(io.BytesIO(data)).format
+        except Exception:
+            raise InvalidPhoto('Upload a valid image (JPEG, PNG, WebP or GIF).')
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"profiles/raw/{digest}.{RAW_EXTENSIONS.get(fmt, 'jpg')}"
+    content_type = f'image/{(fmt or "jpeg").lower()}'
+    _put(name, data, content_type)
+
+    from .models import UserProfile
+
+    profile.profile_photo.name = name
+    profile.photo_hash = digest
+    if Image is None:
+        profile.photo_status = ''  # no variants without Pillow; the raw upload is served
+    elif UserProfile.objects.filter(photo_hash=digest, photo_status=UserProfile.PHOTO_READY).exists():
+        profile.photo_status = UserProfile.PHOTO_READY
+    else:
+        profile.photo_status = UserProfile.PHOTO_PENDING
+    return data
+
+
+def clear_photo(profile) -> None:
+    """Remove the photo from *profile* (files stay: other profiles may share them)."""
+    profile.profile_photo = None
+    profile.photo_hash = ''
+    profile.photo_status = ''
+
+
+def _finish(user_id: int, digest: str, variants) -> str:
+    """Store rendered variants and mark the profile; returns the resulting status."""
+    from .models import UserProfile
+
+    if variants is None:
+        status = UserProfile.PHOTO_FAILED
+    else:
+        for (size, fmt), data in variants.items():
+            _put(variant_name(digest, size, fmt), data, FORMATS[fmt])
+        status = UserProfile.PHOTO_READY
+    # Conditional on the same upload still being pending: a newer photo is not overwritten.
+    UserProfile.objects.filter(
+        user_id=user_id, photo_hash=digest, photo_status=UserProfile.PHOTO_PENDING
+    ).update(photo_status=status)
+    if status == UserProfile.PHOTO_FAILED:
+        logger.warning('profile photo for user_id=%s could not be decoded', user_id)
+    return status
+
+
+def process_profile_photo(user_id: int, data: bytes | None = None) -> str:
+    """
+    Render and store the variants for one pending profile. Returns the profile's
+    photo status afterwards ('' when it has no photo).
+    """
+    from .models import UserProfile
+
+    profile = UserProfile.objects.filter(user_id=user_id).first()
+    if profile is None or not profile.profile_photo:
+        return ''
+    if profile.photo_status != UserProfile.PHOTO_PENDING:
+        return profile.photo_status
+    if data is None:
+        data = _get(profile.profile_photo.name)
+    digest = profile.photo_hash
+    if not digest:
+        # Uploaded before this pipeline: hash what is stored.
+        digest = hashlib.sha256(data).hexdigest()
+        UserProfile.objects.filter(pk=profile.pk, photo_hash='').update(photo_hash=digest)
+    if UserProfile.objects.filter(photo_hash=digest, photo_status=UserProfile.PHOTO_READY).exists():
+        UserProfile.objects.filter(
+            pk=profile.pk, photo_hash=digest, photo_status=UserProfile.PHOTO_PENDING
+        ).update(photo_status=UserProfile.PHOTO_READY)
+        return UserProfile.PHOTO_READY
+    return _finish(user_id, digest, render_variants(data))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+
+            # spawn: forking a threaded web server can copy held locks into the child.
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'PROFILE_PHOTO_MAX_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def _on_rendered(user_id: int, digest: str, future) -> None:
+    try:
+        _finish(user_id, digest, future.result())
+    except Exception:
+        # Left pending; process_pending_photos retries it.
+        logger.warning('profile photo processing failed for user_id=%s', user_id, exc_info=True)
+    finally:
+        # Runs on the pool's management thread, which has its own DB connection.
+        connection.close()
+
+
+def schedule_processing(profile, data: bytes | None = None) -> None:
+    """
+    After the current transaction commits, render *profile*'s pending photo
+    off-request. Pass the upload's *data* to spare the worker a storage read.
+    """
+    from .models import UserProfile
+
+    executor = getattr(settings, 'PROFILE_PHOTO_EXECUTOR', 'process')
+    if profile.photo_status != UserProfile.PHOTO_PENDING or executor == 'cron':
+        return  # 'cron': left for process_pending_photos; URLs serve the raw upload meanwhile
+    user_id, digest = profile.user_id, profile.photo_hash
+
+    def run():
+        try:
+            if executor == 'celery':
+                from .tasks import process_profile_photo as task
+
+                task.delay(user_id)
+            elif executor == 'sync' or data is None:
+                process_profile_photo(user_id, data)
+            else:
+                future = _get_pool().submit(render_variants, data)
+                future.add_done_callback(lambda f: _on_rendered(user_id, digest, f))
+        except Exception:
+            logger.warning('could not schedule profile photo processing for user_id=%s', user_id, exc_info=True)
+
+    transaction.on_commit(run)
+
+
+def process_pending_photos(limit: int = 50, budget=None) -> dict:
+    """
+    Process pending profile photos one by one. With a ``budget``
+    (cron_utils.TimeBudget), stops starting new photos once it is spent.
+    """
+    from .models import UserProfile
+
+    totals = {'processed': 0, 'failed': 0, 'errors': 0}
+    user_ids = list(
+        UserProfile.objects.filter(photo_status=UserProfile.PHOTO_PENDING)
+        .order_by('user_id')
+        .values_list('user_id', flat=True)[:limit]
+    )
+    for n, user_id in enumerate(user_ids):
+        if budget is not None and n and budget.expired():
+            break
+        try:
+            status = process_profile_photo(user_id)
+        except Exception:
+            logger.warning('profile photo processing failed for user_id=%s', user_id, exc_info=True)
+            totals['errors'] += 1
+            continue
+        totals['failed' if status == UserProfile.PHOTO_FAILED else 'processed'] += 1
+    totals['remaining'] = UserProfile.objects.filter(photo_status=UserProfile.PHOTO_PENDING).count()
+    return totals
+
+
+def profile_photo_url(profile, size: int = DEFAULT_SIZE, fmt: str = 'jpeg') -> str | None:
+    """Storage URL of the *size* variant, the raw upload while it is processing, or None."""
+    if profile is None or not profile.profile_photo:
+        return None
+    if profile.photo_status == profile.PHOTO_READY and profile.photo_hash:
+        return default_storage.url(variant_name(profile.photo_hash, size, fmt))
+    return profile.profile_photo.url
+
+
+def profile_photo_variants(profile) -> dict | None:
+    """{fmt: {size: url}} once variants exist, else None."""
+    if profile is None or not profile.profile_photo or profile.photo_status != profile.PHOTO_READY:
+        return None
+    if not profile.photo_hash:
+        return None
+    return {
+        fmt: {str(size): default_storage.url(variant_name(profile.photo_hash, size, fmt)) for size in SIZES}
+        for fmt in FORMATS
+    }
@@ -0,0 +1,175 @@
+"""
+ratelimit_utils.py — shared GCRA rate limiting (token bucket without a refill job).
+
+Each (scope, key) keeps one value: its "theoretical arrival time" (TAT). A hit is
+allowed while the TAT is no more than (burst - 1) emission intervals ahead of now,
+and pushes it one interval further. With ``RATELIMIT_URL`` set the check runs as
+a single Lua script on Redis, so limits hold across gunicorn workers and
+serverless instances; otherwise an in-process table is used (local dev).
+
+Rates live in ``settings.RATELIMITS`` as ``"<count>/<period>"`` strings
+(period: ``s``, ``m``, ``h``, ``d``, optionally prefixed by a number, e.g.
+``"1/12h"``); ``burst`` defaults to ``count``.
+
+Usage:
+    from .ratelimit_utils import hit, rate_limit
+
+    allowed, retry_after = hit('expense_import', str(request.user.pk))
+
+    @rate_limit('settlement')
+    def settlement_create(request): ...
+"""
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "equilo:rl:"
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$")
+
+# KEYS[1] = bucket; ARGV = interval_ms, tolerance_ms. Returns {allowed, retry_after_ms}.
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+if tat - now > tolerance then
+  return {0, tat - now - tolerance}
+end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, 0}
+"""
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """'10/m' -> (10, 60.0); '1/12h' -> (1, 43200.0)."""
+    match = _RATE_RE.match(rate or "")
+    if not match:
+        raise ValueError(f"Invalid rate {rate!r}; expected e.g. '10/m' or '1/12h'")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * _UNITS[unit]
+
+
+class _LocalBackend:
+    """Process-local GCRA table (single process only; used when no Redis URL is set)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tat: dict[str, float] = {}
+
+    def hit(self, key: str, interval_ms: int, tolerance_ms: int) -> tuple[bool, int]:
+        now = time.time() * 1000
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            if tat - now > tolerance_ms:
+                return False, int(tat - now - tolerance_ms)
+            self._tat[key] = tat + interval_ms
+            if len(self._tat) > 10000:
+                self._tat = {k: v for k, v in self._tat.items() if v > now}
+            return True, 0
+
+
+class _RedisBackend:
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_connect_timeout=2, socket_timeout=2)
+        self._script = self._client.register_script(_GCRA_LUA)
+
+    def hit(self, key: str, interval_ms: int, tolerance_ms: int) -> tuple[bool, int]:
+        allowed, retry_ms = self._script(keys=[key], args=[interval_ms, tolerance_ms])
+        return bool(allowed), int(retry_ms)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = (getattr(settings, "RATELIMIT_URL", "") or "").strip()
+                _backend = _RedisBackend(url) if url else _LocalBackend()
+    return _backend
+
+
+def hit(scope: str, key: str, rate: str | None = None, burst: int | None = None) -> tuple[bool, float]:
+    """
+    Count one request for (scope, key). Returns (allowed, retry_after_seconds).
+
+    *rate* defaults to ``settings.RATELIMITS[scope]``. Unknown scopes and a
+    disabled limiter always allow; backend errors fail open so an unreachable
+    Redis never blocks logins.
+    """
+    if not getattr(settings, "RATELIMIT_ENABLED", True):
+        return True, 0.0
+    rate = rate or getattr(settings, "RATELIMITS", {}).get(scope)
+    if not rate:
+        return True, 0.0
+    count, period = parse_rate(rate)
+    burst = burst or count
+    interval_ms = max(1, math.ceil(period * 1000 / count))
+    tolerance_ms = interval_ms * (burst - 1)
+    try:
+        allowed, retry_ms = _get_backend().hit(f"{KEY_PREFIX}{scope}:{key}", interval_ms, tolerance_ms)
+    except Exception:
+        logger.warning("rate limiter unavailable for scope=%s; allowing", scope, exc_info=True)
+        return True, 0.0
+    return allowed, retry_ms / 1000
+
+
+def _user_or_ip(request) -> str:
+    from .session_utils import get_client_ip
+
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{get_client_ip(request) or 'unknown'}"
+
+
+def too_many_requests(retry_after: float, detail: str = "Request was throttled.") -> JsonResponse:
+    wait = max(1, math.ceil(retry_after))
+    response = JsonResponse(
+        {"detail": f"{detail} Expected available in {wait} seconds."}, status=429
+    )
+    response["Retry-After"] = str(wait)
+    return response
+
+
+def rate_limit(scope: str, key=None):
+    """
+    View decorator: 429 + Retry-After once *scope* is exhausted for the caller.
+
+    *key* is a callable (request) -> str; defaults to the user id, or client IP
+    for anonymous requests. Put it under ``@api_view`` so ``request.user`` is
+    the DRF-authenticated user.
+    """
+    key_func = key or _user_or_ip
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            allowed, retry_after = hit(scope, key_func(request))
+            if not allowed:
+                return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+
+        return wrapped
+
+    return decorator
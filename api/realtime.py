@@ -0,0 +1,239 @@
+"""
+realtime.py — lightweight change events for the SSE stream (/api/events/).
+
+Write paths call ``publish_change`` after their transaction commits; every
+connected client subscribed to the affected channel gets a tiny event
+(``{"place_id", "entity", "version"}``) and refetches only what changed
+instead of polling.
+
+Channels:
+  - ``place:<id>`` — expenses, settlements, cycles, members of one place
+  - ``user:<id>``  — that user's notifications and memberships
+
+Fan-out goes through Redis pub/sub when ``REALTIME_BROKER_URL`` is set (works
+across gunicorn workers / instances). Otherwise an in-process broker is used,
+which is enough for ``runserver`` / a single local ASGI process.
+
+Connecting: ``issue_stream_ticket`` (POST /api/events/ticket/, JWT-authenticated)
+returns a short-lived single-use ticket that the client puts in the stream URL
+(``?ticket=...``), so the access token never appears in URLs or server logs.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .db_router import pin_to_primary
+
+logger = logging.getLogger(__name__)
+
+_CHANNEL_PREFIX = "equilo:rt:"
+_VERSION_PREFIX = "rt_version:"
+
+
+def place_channel(place_id: int) -> str:
+    return f"place:{place_id}"
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+class _MemorySubscription:
+    def __init__(self, broker, channels):
+        self._broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.channels = frozenset(channels)
+
+    async def get(self, timeout):
+        """Next payload, or None if nothing arrived within *timeout* seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self._broker._unsubscribe(self)
+
+
+class InMemoryBroker:
+    """Process-local pub/sub. Publishers may run in any thread; subscribers are asyncio tasks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: list[_MemorySubscription] = []
+
+    def publish(self, channel: str, payload: str) -> None:
+        with self._lock:
+            targets = [sub for sub in self._subscriptions if channel in sub.channels]
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub.queue.put_nowait, payload)
+            except RuntimeError:
+                # Subscriber's loop already closed; it unregisters itself on close().
+                pass
+
+    async def subscribe(self, channels) -> _MemorySubscription:
+        sub = _MemorySubscription(self, channels)
+        with self._lock:
+            self._subscriptions.append(sub)
+        return sub
+
+    def _unsubscribe(self, sub) -> None:
+        with self._lock:
+            if sub in self._subscriptions:
+                self._subscriptions.remove(sub)
+
+
+class _RedisSubscription:
+    def __init__(self, client, pubsub):
+        self._client = client
+        self._pubsub = pubsub
+
+    async def get(self, timeout):
+        """Next payload, or None if nothing arrived within *timeout* seconds."""
+        msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if not msg:
+            return None
+        data = msg.get("data")
+        return data.decode() if isinstance(data, bytes) else data
+
+    async def close(self):
+        try:
+            await self._pubsub.aclose()
+            await self._client.aclose()
+        except Exception:
+            logger.warning("realtime: redis subscriber cleanup failed", exc_info=True)
+
+
+class RedisBroker:
+    """Redis pub/sub broker: sync publish from request threads, async subscribe in the SSE view."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+
+    def _sync_client(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(self.url, socket_connect_timeout=2, socket_timeout=2)
+        return self._client
+
+    def publish(self, channel: str, payload: str) -> None:
+        self._sync_client().publish(_CHANNEL_PREFIX + channel, payload)
+
+    async def subscribe(self, channels) -> _RedisSubscription:
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*[_CHANNEL_PREFIX + c for c in channels])
+        return _RedisSubscription(client, pubsub)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                url = (getattr(settings, "REALTIME_BROKER_URL", "") or "").strip()
+                _broker = RedisBroker(url) if url else InMemoryBroker()
+    return _broker
+
+
+def _next_version(channel: str) -> int:
+    """Monotonic per-channel version so clients can skip events they already saw."""
+    key = _VERSION_PREFIX + channel
+    try:
+        cache.add(key, 0, None)
+        return cache.incr(key)
+    except Exception:
+        logger.warning("realtime: version bump failed for %s", channel, exc_info=True)
+        return 0
+
+
+def _publish_now(entity: str, place_id: int | None, user_ids) -> None:
+    channels = []
+    if place_id is not None:
+        channels.append(place_channel(place_id))
+    channels.extend(user_channel(uid) for uid in (user_ids or ()))
+    broker = get_broker()
+    for channel in channels:
+        payload = json.dumps({
+            "place_id": place_id,
+            "entity": entity,
+            "version": _next_version(channel),
+        })
+        try:
+            broker.publish(channel, payload)
+        except Exception:
+            # Live updates are best-effort; clients still have their normal fetches.
+            logger.warning("realtime: publish failed for %s", channel, exc_info=True)
+
+
+def publish_change(entity: str, place_id: int | None = None, user_ids=None) -> None:
+    """
+    Announce that *entity* changed for a place and/or specific users.
+
+    Deferred until the surrounding transaction commits, so clients never
+    refetch before the data is visible.
+    """
+    user_ids = list(user_ids or ())
+
+    def on_commit():
+        # Refetches triggered by this event must not read from a lagging replica.
+        pin_to_primary(user_ids=user_ids, place_id=place_id)
+        _publish_now(entity, place_id, user_ids)
+
+    transaction.on_commit(on_commit)
+
+
+def _ticket_hash(ticket: str) -> str:
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+
+def issue_stream_ticket(user) -> tuple[str, int]:
+    """New single-use stream ticket for *user*; returns (ticket, ttl_seconds)."""
+    from .models import StreamTicket
+
+    ttl = int(getattr(settings, "REALTIME_TICKET_SECONDS", 30))
+    now = timezone.now()
+    # Expired tickets are never redeemed; clearing them here keeps the table tiny.
+    StreamTicket.objects.filter(expires_at__lte=now).delete()
+    ticket = secrets.token_urlsafe(32)
+    StreamTicket.objects.create(user=user, key_hash=_ticket_hash(ticket), expires_at=now + timedelta(seconds=ttl))
+    return ticket, ttl
+
+
+def redeem_stream_ticket(ticket: str):
+    """The active user a ticket was issued to, consuming it; None if unknown, expired or used."""
+    from .models import StreamTicket
+
+    row = (
+        StreamTicket.objects.select_related("user")
+        .filter(key_hash=_ticket_hash(ticket), expires_at__gt=timezone.now())
+        .first()
+    )
+    if row is None:
+        return None
+    # The DELETE is the claim: of two connections racing on one ticket, only one removes the row.
+    deleted, _ = StreamTicket.objects.filter(pk=row.pk).delete()
+    if not deleted or not row.user.is_active:
+        return None
+    return row.user
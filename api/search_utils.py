@@ -0,0 +1,185 @@
+"""
+search_utils.py — server-side expense search and filters for ExpenseViewSet.
+
+Query params (all optional, combinable):
+  q              text matched against the description
+  category       category id
+  category_type  fixed | variable | one_time
+  paid_by        payer user id
+  amount_min     inclusive lower bound
+  amount_max     inclusive upper bound
+  date_from      inclusive, YYYY-MM-DD
+  date_to        inclusive, YYYY-MM-DD
+
+Text search is index-backed per database (see migration 0021):
+  - PostgreSQL: ``description ILIKE '%q%'`` served by the pg_trgm GIN index on
+    ``description``. Django's ``icontains`` would emit ``UPPER(description::text) LIKE``,
+    an expression that index does not cover, so ``_TrigramIContains`` is used instead.
+  - SQLite: the ``api_expense_fts`` FTS5 table (prefix match on every word).
+Other backends fall back to a plain ``icontains`` scan.
+"""
+from __future__ import annotations
+
+import importlib
+import logging
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.db.models.lookups import IContains
+
+from .models import ExpenseCategory
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PARAMS = (
+    'q', 'category', 'category_type', 'paid_by',
+    'amount_min', 'amount_max', 'date_from', 'date_to',
+)
+MAX_QUERY_LENGTH = 100
+
+FTS_TABLE = 'api_expense_fts'
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class _TrigramIContains(IContains):
+    """
+    ``icontains`` as a bare ``ILIKE`` on PostgreSQL, matching the trigram index's
+    expression. Used as an expression in ``filter()``, not registered on the field.
+    """
+
+    # Any name but 'icontains', whose backend cast would wrap the column in UPPER().
+    lookup_name = 'trgm_icontains'
+
+    def as_postgresql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs_sql} ILIKE {rhs_sql}', (*lhs_params, *rhs_params)
+
+
+class SearchParamError(ValueError):
+    """A search/filter query param could not be parsed; message is client-facing."""
+
+
+def has_search_params(params) -> bool:
+    return any(params.get(name) not in (None, '') for name in SEARCH_PARAMS)
+
+
+def _fts_query(text: str) -> str:
+    # Quote each word so FTS5 operators in user input are treated as text; '*' = prefix match.
+    return ' '.join(f'"{word}"*' for word in _WORD_RE.findall(text))
+
+
+def search_description(qs, text: str):
+    text = text.strip()[:MAX_QUERY_LENGTH]
+    if not text:
+        return qs
+    if connection.vendor == 'sqlite':
+        match = _fts_query(text)
+        if not match:
+            return qs.none()
+        return qs.filter(id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+    if connection.vendor == 'postgresql':
+        # Plain ILIKE '%...%' on the column, so the trigram GIN index answers it without a sequential scan.
+        return qs.filter(_TrigramIContains(F('description'), text))
+    return qs.filter(description__icontains=text)
+
+
+def ensure_fts_triggers(using='default', **kwargs):
+    """
+    post_migrate hook: recreate the SQLite FTS5 sync triggers if a table rebuild dropped them.
+
+    SQLite implements most ALTERs on api_expense by copying it into a new table, which
+    silently discards its triggers; the index would then stop tracking edits. The statements
+    come from migration 0021 so there is one copy of the SQL.
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        tables = conn.introspection.table_names(cursor)
+        if FTS_TABLE not in tables or 'api_expense' not in tables:
+            return  # 0021 not applied (yet) on this database
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'api_expense' AND name LIKE %s",
+            [f'{FTS_TABLE}_%'],
+        )
+        if cursor.fetchone()[0] == 3:
+            return
+        logger.warning('FTS triggers on api_expense missing; recreating them and rebuilding %s', FTS_TABLE)
+        migration = importlib.import_module('api.migrations.0021_expense_search_indexes')
+        # IF NOT EXISTS on every statement; the trailing 'rebuild' resyncs rows edited meanwhile.
+        for sql in migration.SQLITE_FORWARD:
+            cursor.execute(sql)
+
+
+def _int(params, name):
+    raw = params.get(name)
+    if raw in (None, ''):
+        return None
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        raise SearchParamError(f'{name} must be an integer')
+
+
+def _decimal(params, name):
+    raw = params.get(name)
+    if raw in (None, ''):
+        return None
+    try:
+        value = Decimal(str(raw))
+    except InvalidOperation:
+        raise SearchParamError(f'{name} must be a number')
+    if not value.is_finite():
+        raise SearchParamError(f'{name} must be a number')
+    return value
+
+
+def _date(params, name):
+    raw = params.get(name)
+    if raw in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        raise SearchParamError(f'{name} must be YYYY-MM-DD')
+
+
+def apply_expense_filters(qs, params):
+    """Narrow an Expense queryset by the search params. Raises SearchParamError on bad input."""
+    category_id = _int(params, 'category')
+    if category_id is not None:
+        qs = qs.filter(category_id=category_id)
+
+    category_type = params.get('category_type')
+    if category_type:
+        if category_type not in dict(ExpenseCategory.TYPE_CHOICES):
+            raise SearchParamError('category_type must be one of: fixed, variable, one_time')
+        qs = qs.filter(category__category_type=category_type)
+
+    paid_by = _int(params, 'paid_by')
+    if paid_by is not None:
+        qs = qs.filter(paid_by_id=paid_by)
+
+    amount_min = _decimal(params, 'amount_min')
+    if amount_min is not None:
+        qs = qs.filter(amount__gte=amount_min)
+    amount_max = _decimal(params, 'amount_max')
+    if amount_max is not None:
+        qs = qs.filter(amount__lte=amount_max)
+
+    date_from = _date(params, 'date_from')
+    if date_from is not None:
+        qs = qs.filter(date__gte=date_from)
+    date_to = _date(params, 'date_to')
+    if date_to is not None:
+        qs = qs.filter(date__lte=date_to)
+
+    text = params.get('q')
+    if text:
+        qs = search_description(qs, text)
+    return qs
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework import serializers
 from .models import Place, PlaceMember, ExpenseCategory, Expense, ExpenseSplit, PlaceInvite, UserProfile, Notification, ExpenseCycle, UserSession
+from .photo_utils import profile_photo_url
 
 User = get_user_model()
 
@@ -21,15 +23,16 @@ class UserSerializer(serializers.ModelSerializer):
             return obj.username
 
     def get_profile_photo(self, obj):
+        """Avatar-sized (128px) variant; the raw upload while variants are being rendered."""
         try:
-            if obj.profile.profile_photo:
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(obj.profile.profile_photo.url)
-                return obj.profile.profile_photo.url
+            url = profile_photo_url(obj.profile)
         except UserProfile.DoesNotExist:
-            pass
-        return None
+            return None
+        if url:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(url)
+        return url
 
 
 class PlaceMemberSerializer(serializers.ModelSerializer):
@@ -237,54 +240,120 @@ class ExpenseSerializer(serializers.ModelSerializer):
         except (TypeError, ValueError):
             return None
 
+    def _member_ids(self, place_id):
+        """User ids in the place: from context (view already loaded them) or one query."""
+        member_ids = self.context.get('member_ids')
+        if member_ids is None:
+            member_ids = set(PlaceMember.objects.filter(place_id=place_id).values_list('user_id', flat=True))
+        return member_ids
+
+    @staticmethod
+    def _split_ids(split_user_ids, member_ids, fallback_id):
+        """Requested split users that are members (deduplicated, in order); fallback if none."""
+        ids = list(dict.fromkeys(uid for uid in split_user_ids if uid in member_ids))
+        return ids or [fallback_id]
+
     def create(self, validated_data):
         split_user_ids = validated_data.pop('split_user_ids', [])
         user = self.context['request'].user
         place = validated_data.pop('place', None) or self.context.get('place')
-        if not place or not place.members.filter(user=user).exists():
+        member_ids = self._member_ids(place.id) if place else set()
+        if not place or user.id not in member_ids:
             raise serializers.ValidationError('You are not a member of this place.')
         current_cycle = self.context.get('current_cycle')
         paid_by_id = self._paid_by_id_from_initial(getattr(self, 'initial_data', None))
-        paid_by = user
-        if paid_by_id and place.members.filter(user_id=paid_by_id).exists():
-            paid_by = User.objects.get(pk=paid_by_id)
-        expense = Expense.objects.create(
-            place=place,
-            cycle=current_cycle,
-            paid_by=paid_by,
-            added_by=user,
-            amount=validated_data.get('amount'),
-            description=validated_data.get('description'),
-            date=validated_data.get('date'),
-            category=validated_data.get('category'),
-        )
-        for uid in split_user_ids:
-            if place.members.filter(user_id=uid).exists():
-                ExpenseSplit.objects.get_or_create(expense=expense, user_id=uid)
-        if not expense.splits.exists():
-            ExpenseSplit.objects.get_or_create(expense=expense, user=user)
+        if not paid_by_id or paid_by_id not in member_ids:
+            paid_by_id = user.id
+        with transaction.atomic():
+            expense = Expense.objects.create(
+                place=place,
+                cycle=current_cycle,
+                paid_by_id=paid_by_id,
+                added_by=user,
+                amount=validated_data.get('amount'),
+                description=validated_data.get('description'),
+                date=validated_data.get('date'),
+                category=validated_data.get('category'),
+            )
+            ExpenseSplit.objects.bulk_create([
+                ExpenseSplit(expense=expense, user_id=uid)
+                for uid in self._split_ids(split_user_ids, member_ids, user.id)
+            ])
         return expense
 
     def update(self, instance, validated_data):
         split_user_ids = validated_data.pop('split_user_ids', None)
-        place = instance.place
         paid_by_id = self._paid_by_id_from_initial(getattr(self, 'initial_data', None))
-        if paid_by_id is not None and place.members.filter(user_id=paid_by_id).exists():
+        member_ids = None
+        if paid_by_id is not None or split_user_ids is not None:
+            member_ids = self._member_ids(instance.place_id)
+        if paid_by_id is not None and paid_by_id in member_ids:
             instance.paid_by_id = paid_by_id
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
-        if split_user_ids is not None:
-            instance.splits.all().delete()
-            place = instance.place
-            for uid in split_user_ids:
-                if place.members.filter(user_id=uid).exists():
-                    ExpenseSplit.objects.get_or_create(expense=instance, user_id=uid)
-            if not instance.splits.exists():
-                ExpenseSplit.objects.get_or_create(expense=instance, user=instance.paid_by)
+        with transaction.atomic():
+            instance.save()
+            if split_user_ids is not None:
+                # Diff against the stored splits: untouched rows stay, only changes are written.
+                new_ids = set(self._split_ids(split_user_ids, member_ids, instance.paid_by_id))
+                old_ids = set(instance.splits.values_list('user_id', flat=True))
+                if old_ids - new_ids:
+                    instance.splits.filter(user_id__in=old_ids - new_ids).delete()
+                ExpenseSplit.objects.bulk_create([
+                    ExpenseSplit(expense=instance, user_id=uid) for uid in new_ids - old_ids
+                ])
         return instance
 
 
+class NormalizedExpenseSerializer(serializers.ModelSerializer):
+    """
+    Read-only expense shape for ?normalized=1 list responses: related users, category
+    and cycle are ids; the objects themselves are serialized once by build_expense_included.
+    """
+    split_user_ids = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Expense
+        fields = [
+            'id', 'place', 'cycle', 'amount', 'description', 'date',
+            'paid_by', 'added_by', 'category', 'created_at', 'split_user_ids',
+        ]
+        read_only_fields = fields
+
+    def get_split_user_ids(self, obj):
+        # Reads the prefetched splits; no per-row query.
+        return [split.user_id for split in obj.splits.all()]
+
+
+def build_expense_included(expenses, context):
+    """
+    Serialize each user, category and cycle referenced by *expenses* exactly once.
+    Returns {"users": {id: ...}, "categories": {id: ...}, "cycles": {id: ...}}.
+    Expects paid_by/added_by (with profile), category and cycle select_related and
+    splits prefetched; split users not already loaded cost one extra query.
+    """
+    users, categories, cycles = {}, {}, {}
+    split_user_ids = set()
+    for expense in expenses:
+        for user in (expense.paid_by, expense.added_by):
+            if user is not None:
+                users.setdefault(user.pk, user)
+        if expense.category is not None:
+            categories.setdefault(expense.category.pk, expense.category)
+        if expense.cycle is not None:
+            cycles.setdefault(expense.cycle.pk, expense.cycle)
+        split_user_ids.update(split.user_id for split in expense.splits.all())
+    missing = split_user_ids - users.keys()
+    if missing:
+        for user in User.objects.filter(pk__in=missing).select_related('profile'):
+            users[user.pk] = user
+    return {
+        'users': {pk: UserSerializer(user, context=context).data for pk, user in users.items()},
+        'categories': {pk: ExpenseCategorySerializer(cat).data for pk, cat in categories.items()},
+        'cycles': {pk: ExpenseCycleSerializer(cycle).data for pk, cycle in cycles.items()},
+    }
+
+
 class PlaceInviteSerializer(serializers.ModelSerializer):
     invited_by = UserSerializer(read_only=True)
     email = serializers.EmailField(required=False, allow_blank=True)
@@ -310,6 +379,7 @@ class NotificationSerializer(serializers.ModelSerializer):
             'place_name',
             'is_read',
             'read_at',
+            'coalesced_count',
             'created_at',
         ]
         read_only_fields = fields
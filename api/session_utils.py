@@ -4,14 +4,125 @@ Session tracking, refresh cookies, JWT blacklist by jti, and cleanup helpers.
 from __future__ import annotations
 
 import hashlib
+import logging
 import re
 from datetime import datetime, timezone as dt_utc
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Case, Value, When
 from django.utils import timezone
 
+from .blacklist_utils import blacklist_jtis, use_redis_blacklist
+
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+def _revoked_key(session_id) -> str:
+    return f"session_revoked:{session_id}"
+
+
+def mark_sessions_revoked(session_ids) -> None:
+    """
+    Add UserSession ids to the cache-backed revocation set checked by
+    SessionTrackingJWTAuthentication. Entries only need to outlive the access
+    tokens already minted for those sessions.
+    """
+    session_ids = [pk for pk in session_ids if pk is not None]
+    if not session_ids:
+        return
+    ttl = int(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()) + 60
+    try:
+        cache.set_many({_revoked_key(pk): 1 for pk in session_ids}, ttl)
+    except Exception:
+        logger.warning("cache SET failed for session revocation", exc_info=True)
+
+
+def is_session_revoked(session_id) -> bool:
+    """True if the session id is in the revocation set. Raises if the cache is unreachable."""
+    return bool(cache.get(_revoked_key(session_id)))
+
+
+# Write-behind for UserSession.last_used_at: a Redis hash of {session id: ISO timestamp},
+# so repeated touches of one session coalesce to the latest. flush_session_touches
+# (Celery Beat / cron) writes it with one bulk_update.
+SESSION_TOUCH_KEY = "equilo:session_touches"
+
+_touch_client = None
+
+
+def _touch_url() -> str:
+    return (getattr(settings, "SESSION_TOUCH_URL", "") or "").strip()
+
+
+def _get_touch_client():
+    global _touch_client
+    if _touch_client is None:
+        import redis
+
+        _touch_client = redis.Redis.from_url(_touch_url(), socket_connect_timeout=2, socket_timeout=2)
+    return _touch_client
+
+
+def record_session_touch(session_id, when) -> None:
+    """
+    Note that a session was used. Buffered in Redis when SESSION_TOUCH_URL is set;
+    otherwise (local dev, one process) written directly at most once per
+    SESSION_TOUCH_INTERVAL_SECONDS. Never raises: a lost touch only makes
+    last_used_at a little stale.
+    """
+    from .models import UserSession
+
+    if _touch_url():
+        try:
+            _get_touch_client().hset(SESSION_TOUCH_KEY, str(session_id), when.isoformat())
+        except Exception:
+            logger.warning("session touch buffer unavailable; dropping touch", exc_info=True)
+        return
+    interval = getattr(settings, "SESSION_TOUCH_INTERVAL_SECONDS", 60)
+    try:
+        if not cache.add(f"session_touch:{session_id}", 1, interval):
+            return
+        UserSession.objects.filter(pk=session_id).update(last_used_at=when)
+    except Exception:
+        logger.warning("session last_used_at update failed", exc_info=True)
+
+
+def flush_session_touches() -> dict:
+    """
+    Write buffered last_used_at values with one bulk_update. Runs at most once per
+    SESSION_TOUCH_INTERVAL_SECONDS however often it is scheduled; on a DB error the
+    timestamps go back into the buffer (without overwriting newer ones).
+    """
+    from .models import UserSession
+
+    if not _touch_url():
+        return {"flushed": 0}
+    if not cache.add("session_touch:flush_lock", 1, getattr(settings, "SESSION_TOUCH_INTERVAL_SECONDS", 60)):
+        return {"flushed": 0, "skipped": True}
+    client = _get_touch_client()
+    pipe = client.pipeline(transaction=True)
+    pipe.hgetall(SESSION_TOUCH_KEY)
+    pipe.delete(SESSION_TOUCH_KEY)
+    pending, _ = pipe.execute()
+    if not pending:
+        return {"flushed": 0}
+    touches = {int(pk): datetime.fromisoformat(ts.decode()) for pk, ts in pending.items()}
+    try:
+        # Sessions revoked since their touch simply have no row left to update.
+        live = UserSession.objects.filter(pk__in=touches).values_list("pk", flat=True)
+        sessions = [UserSession(pk=pk, last_used_at=touches[pk]) for pk in live]
+        UserSession.objects.bulk_update(sessions, ["last_used_at"], batch_size=500)
+    except Exception:
+        requeue = client.pipeline(transaction=False)
+        for pk, ts in pending.items():
+            requeue.hsetnx(SESSION_TOUCH_KEY, pk, ts)
+        requeue.execute()
+        logger.warning("session touch flush failed; touches requeued", exc_info=True)
+        return {"flushed": 0, "requeued": len(pending)}
+    return {"flushed": len(sessions)}
 
 
 def get_client_ip(request) -> str | None:
@@ -67,17 +178,51 @@ def _device_label_from_request(request):
     return f'{browser} on {os_name}'
 
 
-def blacklist_outstanding_for_jti(jti: str, user_id=None) -> None:
-    """Blacklist refresh token(s) with this jti via the token_blacklist app."""
-    if not jti:
+def blacklist_outstanding_for_jti(jti: str, user_id=None, expires_at=None) -> None:
+    """Blacklist refresh token(s) with this jti (Redis or the token_blacklist app)."""
+    blacklist_outstanding_for_jtis([jti], user_id, expires={jti: expires_at})
+
+
+def blacklist_outstanding_for_jtis(jtis, user_id=None, expires: dict | None = None) -> None:
+    """
+    Blacklist refresh tokens for many jtis: one SELECT + one bulk INSERT, or one
+    Redis pipeline with the Redis backend (*expires* maps jti -> expiry for the TTL).
+    """
+    jtis = [j for j in jtis if j]
+    if not jtis:
+        return
+    if use_redis_blacklist():
+        expires = expires or {}
+        blacklist_jtis({jti: expires.get(jti) for jti in jtis})
         return
     from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 
-    qs = OutstandingToken.objects.filter(jti=jti)
+    qs = OutstandingToken.objects.filter(jti__in=jtis)
     if user_id is not None:
         qs = qs.filter(user_id=user_id)
-    for ot in qs:
-        BlacklistedToken.objects.get_or_create(token=ot)
+    BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token_id=pk) for pk in qs.values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+
+
+def revoke_sessions(sessions, user_id=None) -> int:
+    """
+    Revoke a UserSession queryset in constant queries: blacklist every refresh jti,
+    add the ids to the revocation set, then delete the rows. Returns rows revoked.
+    """
+    from .models import UserSession
+
+    rows = list(sessions.values_list('pk', 'jti', 'expires_at'))
+    if not rows:
+        return 0
+    blacklist_outstanding_for_jtis(
+        [jti for _, jti, _ in rows], user_id, expires={jti: exp for _, jti, exp in rows}
+    )
+    pks = [pk for pk, _, _ in rows]
+    mark_sessions_revoked(pks)
+    UserSession.objects.filter(pk__in=pks).delete()
+    return len(rows)
 
 
 def set_refresh_cookie(response, refresh_str: str) -> None:
@@ -144,10 +289,10 @@ def session_pk_from_access_header(request) -> int | None:
 
 
 def jti_from_refresh_string(refresh_str: str) -> str | None:
-    from rest_framework_simplejwt.tokens import RefreshToken
+    from .tokens import EquiloRefreshToken
 
     try:
-        token = RefreshToken(refresh_str)
+        token = EquiloRefreshToken(refresh_str)
         jti = str(token.get('jti', '') or '')
         if jti:
             return jti
@@ -157,21 +302,25 @@ def jti_from_refresh_string(refresh_str: str) -> str | None:
 
 
 def enforce_max_sessions(user, protect_jti: str | None = None) -> None:
-    """Revoke oldest sessions when above max (blacklist jti + delete row)."""
+    """
+    Revoke oldest sessions when above max (blacklist jti + delete row).
+
+    Sessions are ranked newest-first (the protected one always first) and everything
+    past the cap is revoked in one pass, so the cost does not grow with device count.
+    """
     from .models import UserSession
 
     max_n = getattr(settings, 'MAX_ACTIVE_SESSIONS_PER_USER', 10)
     if max_n <= 0:
         return
-    while UserSession.objects.filter(user=user, expires_at__gt=timezone.now()).count() > max_n:
-        qs = UserSession.objects.filter(user=user, expires_at__gt=timezone.now()).order_by('last_used_at', 'created_at')
-        if protect_jti:
-            qs = qs.exclude(jti=protect_jti)
-        victim = qs.first()
-        if not victim:
-            break
-        blacklist_outstanding_for_jti(victim.jti, user.id)
-        victim.delete()
+    ranked = (
+        UserSession.objects.filter(user=user, expires_at__gt=timezone.now())
+        .annotate(protected=Case(When(jti=protect_jti or '', then=Value(0)), default=Value(1)))
+        .order_by('protected', '-last_used_at', '-created_at')
+    )
+    victim_pks = list(ranked.values_list('pk', flat=True)[max_n:])
+    if victim_pks:
+        revoke_sessions(UserSession.objects.filter(pk__in=victim_pks), user.id)
 
 
 def upsert_session_for_refresh_token(refresh_str: str, request, user) -> 'UserSession | None':
@@ -179,12 +328,12 @@ def upsert_session_for_refresh_token(refresh_str: str, request, user) -> 'UserSe
     Create or update UserSession for this refresh token (no raw token stored).
     Returns the UserSession row or None.
     """
-    from rest_framework_simplejwt.tokens import RefreshToken
+    from .tokens import EquiloRefreshToken
 
     from .models import UserSession
 
     try:
-        token = RefreshToken(refresh_str)
+        token = EquiloRefreshToken(refresh_str)
         jti = str(token.get('jti', '') or '')
         if not jti:
             jti = hashlib.sha256(refresh_str.encode()).hexdigest()[:64]
@@ -220,14 +369,14 @@ def upsert_session_for_refresh_token(refresh_str: str, request, user) -> 'UserSe
 
 def update_session_after_refresh(old_jti: str, new_refresh_str: str, request) -> None:
     """After rotation: move UserSession row from old jti to new jti."""
-    from rest_framework_simplejwt.tokens import RefreshToken
+    from .tokens import EquiloRefreshToken
 
     from .models import UserSession
 
     if not old_jti or not new_refresh_str:
         return
     try:
-        new_t = RefreshToken(new_refresh_str)
+        new_t = EquiloRefreshToken(new_refresh_str)
         new_jti = str(new_t.get('jti', '') or '')
         exp = new_t.get('exp')
         if not new_jti or not exp:
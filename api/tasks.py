@@ -6,49 +6,250 @@ so the actual production trigger for the daily cycle transition is the
 ``/api/cron/transition-cycles/`` HTTP endpoint invoked by Vercel Cron. Both
 paths share the same implementation in :func:`transition_pending_cycles`.
 """
-from celery import shared_task
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import group, shared_task
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
 
+logger = logging.getLogger(__name__)
+
+
+def _due_cycles_by_place(today, after_place_id=None) -> dict:
+    """{place_id: [cycle_id, ...]} for OPEN cycles whose end_date has passed, in place order."""
+    from .models import ExpenseCycle
+
+    units = defaultdict(list)
+    rows = ExpenseCycle.objects.filter(
+        status=ExpenseCycle.STATUS_OPEN,
+        end_date__lt=today,
+    )
+    if after_place_id is not None:
+        rows = rows.filter(place_id__gt=after_place_id)
+    rows = rows.order_by('place_id', 'end_date').values_list('place_id', 'id')
+    for place_id, cycle_id in rows:
+        units[place_id].append(cycle_id)
+    return dict(units)
+
 
-def transition_pending_cycles() -> dict:
+def transition_place_cycles(place_id: int, cycle_ids, renderer=None) -> int:
+    """
+    Move one place's due cycles to PENDING_SETTLEMENT and send their cycle-ended
+    notifications + emails. Returns how many cycles this call transitioned.
+
+    The status flip is a conditional UPDATE, so a cycle already moved by an
+    overlapping run is skipped instead of notified twice. It commits together
+    with the cycle's notifications (and outbox emails): if they fail, the cycle
+    stays OPEN and the next run retries it. Emails sent directly over SMTP go out
+    only after that commit, so a rolled-back cycle never mails anyone.
+    """
+    from .models import ExpenseCycle
+    from .realtime import publish_change
+    from .views import _send_cycle_ended_notifications, cycle_ended_email_renderer
+
+    renderer = renderer or cycle_ended_email_renderer()
+    count = 0
+    cycles = ExpenseCycle.objects.filter(place_id=place_id, id__in=cycle_ids).select_related('place')
+    for cycle in cycles:
+        with transaction.atomic():
+            moved = ExpenseCycle.objects.filter(pk=cycle.pk, status=ExpenseCycle.STATUS_OPEN).update(
+                status=ExpenseCycle.STATUS_PENDING_SETTLEMENT
+            )
+            if not moved:
+                continue
+            cycle.status = ExpenseCycle.STATUS_PENDING_SETTLEMENT
+            _send_cycle_ended_notifications(cycle.place, cycle, renderer)
+        count += 1
+    if count:
+        publish_change('cycle', place_id)
+    return count
+
+
+def _run_place_unit(place_id: int, cycle_ids, close_connection: bool = False, renderer=None) -> dict:
+    """One place's transition with its errors contained, so other places still run."""
+    try:
+        return {'place_id': place_id, 'transitioned': transition_place_cycles(place_id, cycle_ids, renderer)}
+    except Exception as exc:
+        logger.exception('cycle transition failed for place %s', place_id)
+        return {'place_id': place_id, 'transitioned': 0, 'error': f'{type(exc).__name__}: {exc}'}
+    finally:
+        if close_connection:
+            # Pool threads open their own DB connection; do not leave it dangling.
+            connection.close()
+
+
+def _run_celery_batch(batch, budget=None) -> list:
+    """
+    Run one batch of place units as a Celery group and collect their results,
+    waiting at most until *budget* runs out. A unit whose result has not come
+    back by then keeps running on its worker and is reported as ``unconfirmed``.
+    """
+    async_results = group(transition_place_cycles_task.s(pid, cids) for pid, cids in batch).apply_async().results
+    results = []
+    for (place_id, _), async_result in zip(batch, async_results):
+        timeout = None if budget is None else max(budget.remaining(), 0.1)
+        try:
+            result = async_result.get(timeout=timeout, propagate=False)
+        except CeleryTimeoutError:
+            result = {'place_id': place_id, 'transitioned': 0, 'unconfirmed': True}
+        if not isinstance(result, dict):
+            # The task itself failed (worker lost, etc.); get() returned the exception.
+            result = {'place_id': place_id, 'transitioned': 0, 'error': f'{type(result).__name__}: {result}'}
+        results.append(result)
+    return results
+
+
+def transition_pending_cycles(budget=None, after_place_id=None, executor=None) -> dict:
     """
     Find OPEN cycles past their ``end_date``, move them to PENDING_SETTLEMENT,
     and fire the cycle-ended notification + email batch for each.
 
-    Pure function (no Celery / no HTTP), so the same body is reused by:
+    Work is split into one unit per place. *executor* (default
+    CYCLE_TRANSITION_EXECUTOR) picks how the units run:
+      - "threads" (default): a pool of CYCLE_TRANSITION_MAX_WORKERS threads
+      - "celery": Celery groups of ``transition_place_cycles_task``, one task per
+        place and CYCLE_TRANSITION_MAX_WORKERS places per group; each group's results
+        are collected (needs CELERY_RESULT_BACKEND) before the next is sent
+      - "serial": one after another in this process
+    A failing place is logged and reported in ``failed_places``; the rest still run.
+    With "celery", a place whose result did not come back before the budget ran out
+    is listed in ``unconfirmed_places`` and not counted in ``transitioned_to_pending``:
+    it is still running on a worker.
+
+    With a ``budget`` (cron_utils.TimeBudget), places are processed in id order in
+    batches and no new batch starts once it is spent; the result then has
+    ``more=True`` and ``cursor`` = the last place id handled, to pass back as
+    ``after_place_id``. Units are idempotent, so re-running a batch is safe.
+
+    Pure function (no HTTP), so the same body is reused by:
       - the Celery Beat task below (local dev)
       - the Vercel Cron HTTP endpoint (production)
     """
-    from .models import ExpenseCycle
-    from .views import _send_cycle_ended_notifications
+    units = _due_cycles_by_place(timezone.now().date(), after_place_id)
+    if not units:
+        return {
+            'transitioned_to_pending': 0, 'places': 0, 'failed_places': [], 'unconfirmed_places': [],
+            'more': False, 'cursor': None,
+        }
 
-    today = timezone.now().date()
-    to_transition = ExpenseCycle.objects.filter(
-        status=ExpenseCycle.STATUS_OPEN,
-        end_date__lt=today,
-    ).select_related('place')
+    executor = executor or getattr(settings, 'CYCLE_TRANSITION_EXECUTOR', 'threads')
+    max_workers = min(getattr(settings, 'CYCLE_TRANSITION_MAX_WORKERS', 4), len(units))
+    renderer = None
+    if executor != 'celery':
+        from .views import cycle_ended_email_renderer
 
-    count = 0
-    for cycle in to_transition:
-        cycle.status = ExpenseCycle.STATUS_PENDING_SETTLEMENT
-        cycle.save(update_fields=['status'])
-        _send_cycle_ended_notifications(cycle.place, cycle)
-        count += 1
+        # One renderer per run: templates compiled once, unsubscribe tokens signed once per user.
+        renderer = cycle_ended_email_renderer()
+    serial = executor == 'serial' or max_workers <= 1
+    pending = list(units.items())
+    results = []
+    pool = None
+    if executor != 'celery' and not serial:
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cycle-transition')
+    try:
+        while pending and not (budget is not None and results and budget.expired()):
+            batch, pending = pending[:max_workers], pending[max_workers:]
+            if executor == 'celery':
+                results.extend(_run_celery_batch(batch, budget))
+            elif serial:
+                results.extend(_run_place_unit(pid, cids, renderer=renderer) for pid, cids in batch)
+            else:
+                results.extend(pool.map(
+                    lambda unit: _run_place_unit(*unit, close_connection=True, renderer=renderer), batch
+                ))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return {
+        'transitioned_to_pending': sum(r['transitioned'] for r in results),
+        'places': len(results),
+        'failed_places': [{'place_id': r['place_id'], 'error': r['error']} for r in results if 'error' in r],
+        'unconfirmed_places': [r['place_id'] for r in results if r.get('unconfirmed')],
+        'more': bool(pending),
+        'cursor': results[-1]['place_id'] if pending else None,
+    }
 
-    return {'transitioned_to_pending': count}
+
+@shared_task(ignore_result=False)
+def transition_place_cycles_task(place_id, cycle_ids):
+    """Celery unit of :func:`transition_pending_cycles` (CYCLE_TRANSITION_EXECUTOR=celery)."""
+    result = _run_place_unit(place_id, cycle_ids)
+    if 'error' in result:
+        logger.warning('cycle transition unit failed: %s', result)
+    return result
 
 
 @shared_task
 def auto_transition_past_cycles_to_pending():
-    """Celery wrapper around :func:`transition_pending_cycles`."""
-    return transition_pending_cycles()
+    """
+    Celery wrapper around :func:`transition_pending_cycles`. This already runs on a
+    worker, which must not block on other tasks, so the "celery" executor runs the
+    units on threads here.
+    """
+    executor = getattr(settings, 'CYCLE_TRANSITION_EXECUTOR', 'threads')
+    return transition_pending_cycles(executor='threads' if executor == 'celery' else executor)
+
+
+@shared_task
+def drain_activity_log_spool():
+    """Insert spooled ActivityLog entries in batches (see api.activity_utils)."""
+    from .activity_utils import drain_activity_spool
+
+    return drain_activity_spool()
+
+
+@shared_task
+def drain_email_outbox():
+    """Send queued transactional email in batches (see api.outbox_utils)."""
+    from .outbox_utils import drain_email_outbox as drain
+
+    return drain()
+
+
+@shared_task
+def send_email_digests():
+    """Daily/weekly notification digest emails (see api.digest_utils)."""
+    from .digest_utils import send_digests
+
+    return send_digests()
+
+
+@shared_task
+def process_profile_photo(user_id):
+    """Render one uploaded profile photo's variants (PROFILE_PHOTO_EXECUTOR=celery)."""
+    from .photo_utils import process_profile_photo as process
+
+    return process(user_id)
+
+
+@shared_task
+def process_pending_profile_photos():
+    """Sweep profile photos still pending (see api.photo_utils)."""
+    from .photo_utils import process_pending_photos
+
+    return process_pending_photos()
+
+
+@shared_task
+def flush_session_touches():
+    """Write buffered UserSession.last_used_at values (see api.session_utils)."""
+    from .session_utils import flush_session_touches as flush
+
+    return flush()
 
 
 @shared_task
 def cleanup_expired_sessions():
     """Delete UserSession rows past refresh expiry (cron / Celery Beat)."""
     from .models import UserSession
+    from .session_utils import mark_sessions_revoked
 
     qs = UserSession.objects.filter(expires_at__lt=timezone.now())
+    mark_sessions_revoked(qs.values_list('pk', flat=True))
     deleted, _ = qs.delete()
     return {'deleted_sessions': deleted}
@@ -0,0 +1,42 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from api.models import Expense, ExpenseSplit, Place, PlaceMember
+
+User = get_user_model()
+
+
+def make_user(username, **extra):
+    return User.objects.create_user(username=username, password='pw-123456', **extra)
+
+
+def make_place(owner, *members, name='Flat'):
+    place = Place.objects.create(name=name, created_by=owner)
+    PlaceMember.objects.create(place=place, user=owner, role=PlaceMember.ROLE_OWNER)
+    for member in members:
+        PlaceMember.objects.create(place=place, user=member)
+    return place
+
+
+def make_expense(place, paid_by, amount='20.00', split_with=(), description='Groceries', **extra):
+    expense = Expense.objects.create(
+        place=place,
+        paid_by=paid_by,
+        added_by=paid_by,
+        amount=Decimal(amount),
+        description=description,
+        date=extra.pop('date', date.today()),
+        **extra,
+    )
+    for user in {paid_by, *split_with}:
+        ExpenseSplit.objects.create(expense=expense, user=user)
+    return expense
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
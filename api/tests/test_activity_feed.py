@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from api.models import ActivityLog
+
+from .helpers import client_for, make_place, make_user
+
+
+class ActivityFeedTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.place = make_place(self.alice, self.bob)
+        now = timezone.now()
+        ActivityLog.objects.create(
+            user=self.alice, type=ActivityLog.TYPE_PLACE_CREATED, place=self.place,
+            description=self.place.name, created_at=now - timedelta(minutes=3),
+        )
+        ActivityLog.objects.create(
+            user=self.bob, type=ActivityLog.TYPE_PLACE_JOINED, place=self.place,
+            created_at=now - timedelta(minutes=2),
+        )
+        ActivityLog.objects.create(
+            user=self.alice, type=ActivityLog.TYPE_EXPENSE_ADDED, place=self.place,
+            description='Rent', created_at=now - timedelta(minutes=1),
+        )
+
+    def _types(self, user, **params):
+        response = client_for(user).get('/api/activity/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['type'] for item in response.data['results']], response.data['next_cursor']
+
+    def test_place_created_only_in_the_creators_feed(self):
+        self.assertEqual(self._types(self.alice)[0], ['expense_added', 'place_joined', 'place_created'])
+        self.assertEqual(self._types(self.bob)[0], ['expense_added', 'place_joined'])
+
+    def test_cursor_pages_skip_other_members_place_created(self):
+        first, cursor = self._types(self.bob, limit=1)
+        self.assertEqual(first, ['expense_added'])
+        second, cursor = self._types(self.bob, limit=1, cursor=cursor)
+        self.assertEqual(second, ['place_joined'])
+        self.assertIsNone(cursor)
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.cron_utils import load_cursor, save_cursor
+from api.models import CronCursor
+
+
+class CronCursorTests(TestCase):
+    def test_round_trip_scoped_to_run(self):
+        save_cursor('job', '2026-01-01', 42)
+        self.assertEqual(load_cursor('job', '2026-01-01'), 42)
+        self.assertIsNone(load_cursor('job', '2026-01-02'))
+        self.assertIsNone(load_cursor('other', '2026-01-01'))
+
+        save_cursor('job', '2026-01-02', 7)
+        self.assertEqual(CronCursor.objects.get(job='job').position, 7)
+
+        save_cursor('job', '2026-01-02', None)
+        self.assertFalse(CronCursor.objects.filter(job='job').exists())
+
+    def test_survives_a_cache_that_is_not_shared(self):
+        save_cursor('job', 'run', {'after': 3})
+        cache.clear()  # what a fresh serverless instance sees
+        self.assertEqual(load_cursor('job', 'run'), {'after': 3})
+
+
+@override_settings(CRON_SECRET='s3cret')
+class CronTransitionResumeTests(TestCase):
+    def _call(self):
+        client = APIClient()
+        return client.get('/api/cron/transition-cycles/', HTTP_AUTHORIZATION='Bearer s3cret')
+
+    def test_plain_repeat_resumes_from_the_stored_cursor(self):
+        results = [
+            {'transitioned': 2, 'more': True, 'cursor': 10},
+            {'transitioned': 1, 'more': False, 'cursor': None},
+        ]
+        with mock.patch('api.tasks.transition_pending_cycles', side_effect=results) as run:
+            first = self._call()
+            self.assertTrue(first.data['more'])
+            self.assertIsNotNone(first.data['continuation'])
+            cache.clear()
+            second = self._call()
+
+        self.assertEqual(run.call_args_list[0].kwargs['after_place_id'], None)
+        self.assertEqual(run.call_args_list[1].kwargs['after_place_id'], 10)
+        self.assertIsNone(second.data['continuation'])
+        self.assertFalse(CronCursor.objects.exists())
@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase, override_settings
+
+from api import tasks, views
+from api.models import EmailOutbox, ExpenseCycle, Notification
+
+from .helpers import make_place, make_user
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class CycleTransitionTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner', email='owner@example.com')
+        self.member = make_user('member', email='member@example.com')
+        self.place = make_place(self.owner, self.member)
+        today = date.today()
+        self.cycle = ExpenseCycle.objects.create(
+            place=self.place, start_date=today - timedelta(days=8), end_date=today - timedelta(days=1),
+        )
+
+    def _run(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return tasks.transition_pending_cycles(executor='serial')
+
+    @override_settings(EMAIL_OUTBOX_ENABLED=False)
+    def test_transition_notifies_and_mails_members_after_commit(self):
+        result = self._run()
+        self.assertEqual(result['transitioned_to_pending'], 1)
+        self.cycle.refresh_from_db()
+        self.assertEqual(self.cycle.status, ExpenseCycle.STATUS_PENDING_SETTLEMENT)
+        self.assertEqual(Notification.objects.filter(type=Notification.TYPE_CYCLE_ENDED).count(), 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['member@example.com', 'owner@example.com'])
+
+    @override_settings(EMAIL_OUTBOX_ENABLED=False)
+    def test_failure_part_way_rolls_back_without_sending_mail(self):
+        calls = {'n': 0}
+        original = views.create_notification
+
+        def fail_second(**fields):
+            calls['n'] += 1
+            if calls['n'] == 2:
+                raise RuntimeError('notification insert failed')
+            return original(**fields)
+
+        with mock.patch.object(views, 'create_notification', side_effect=fail_second):
+            result = self._run()
+        self.assertEqual(result['transitioned_to_pending'], 0)
+        self.assertEqual(len(result['failed_places']), 1)
+        self.cycle.refresh_from_db()
+        self.assertEqual(self.cycle.status, ExpenseCycle.STATUS_OPEN)
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(Notification.objects.filter(type=Notification.TYPE_CYCLE_ENDED).exists())
+
+        # The retry mails every member exactly once.
+        self._run()
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(EMAIL_OUTBOX_ENABLED=True)
+    def test_outbox_rows_commit_with_the_status_change(self):
+        self._run()
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+        self.assertEqual(mail.outbox, [])
+
+    def test_second_run_transitions_nothing(self):
+        self._run()
+        self.assertEqual(self._run()['transitioned_to_pending'], 0)
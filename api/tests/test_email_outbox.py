@@ -0,0 +1,119 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import outbox_utils
+from api.models import EmailOutbox
+
+
+def _enqueue(to='a@example.com', **fields):
+    msg = EmailMultiAlternatives(subject='Hi', body='text', to=[to], headers={'X-Tag': 'test'})
+    msg.attach_alternative('<p>html</p>', 'text/html')
+    row = outbox_utils.enqueue_email(msg, template_name='test')
+    if fields:
+        EmailOutbox.objects.filter(pk=row.pk).update(**fields)
+        row.refresh_from_db()
+    return row
+
+
+class _FlakyConnection:
+    """Email backend connection that rejects the given recipients."""
+
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        if messages[0].to[0] in self.reject:
+            raise ConnectionError('550 mailbox unavailable')
+        mail.outbox.extend(messages)
+        return len(messages)
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class EmailOutboxDrainTests(TestCase):
+    def _drain(self, reject=()):
+        with mock.patch.object(outbox_utils, 'get_connection', return_value=_FlakyConnection(reject)):
+            return outbox_utils.drain_email_outbox()
+
+    def _drain_with_failures(self, reject):
+        with self.assertLogs('api.outbox_utils', 'WARNING'):
+            return self._drain(reject)
+
+    def test_due_rows_are_sent_once_with_html_and_headers(self):
+        row = _enqueue()
+        totals = self._drain()
+        self.assertEqual(totals['sent'], 1)
+        self.assertEqual(totals['remaining'], 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].alternatives[0].content, '<p>html</p>')
+        self.assertEqual(mail.outbox[0].extra_headers, {'X-Tag': 'test'})
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, row.claim_token), (EmailOutbox.STATUS_SENT, 1, ''))
+
+        self._drain()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_rows_not_yet_due_are_skipped(self):
+        _enqueue(next_attempt_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self._drain()['sent'], 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_claimed_rows_are_invisible_to_other_drainers_until_the_lease_ends(self):
+        _enqueue()
+        now = timezone.now()
+        first = outbox_utils._claim(10, now)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(outbox_utils._claim(10, now), [])
+        # The first drainer died without finishing: the row is due again after the lease.
+        later = outbox_utils._claim(10, now + outbox_utils.LEASE)
+        self.assertEqual([row.id for row in later], [first[0].id])
+        self.assertNotEqual(later[0].claim_token, first[0].claim_token)
+
+    def test_failures_back_off_exponentially_then_give_up(self):
+        bad = _enqueue('bad@example.com')
+        good = _enqueue('good@example.com')
+
+        before = timezone.now()
+        totals = self._drain_with_failures({'bad@example.com'})
+        self.assertEqual((totals['sent'], totals['retrying']), (1, 1))
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), (EmailOutbox.STATUS_PENDING, 1))
+        self.assertIn('ConnectionError', bad.last_error)
+        self.assertGreaterEqual(bad.next_attempt_at, before + timedelta(seconds=60))
+        good.refresh_from_db()
+        self.assertEqual(good.status, EmailOutbox.STATUS_SENT)
+
+        EmailOutbox.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+        before = timezone.now()
+        self._drain_with_failures({'bad@example.com'})
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 2)
+        self.assertGreaterEqual(bad.next_attempt_at, before + timedelta(seconds=120))
+
+        EmailOutbox.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+        totals = self._drain_with_failures({'bad@example.com'})
+        self.assertEqual(totals['failed'], 1)
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), (EmailOutbox.STATUS_FAILED, 3))
+
+    def test_backoff_is_capped(self):
+        self.assertEqual(outbox_utils._backoff(1), timedelta(seconds=60))
+        self.assertEqual(outbox_utils._backoff(3), timedelta(seconds=240))
+        self.assertEqual(outbox_utils._backoff(30), timedelta(seconds=outbox_utils.BACKOFF_MAX_SECONDS))
+
+    def test_old_sent_rows_are_pruned(self):
+        old = _enqueue(status=EmailOutbox.STATUS_SENT, sent_at=timezone.now() - timedelta(days=8))
+        recent = _enqueue(status=EmailOutbox.STATUS_SENT, sent_at=timezone.now() - timedelta(days=1))
+        self._drain()
+        self.assertFalse(EmailOutbox.objects.filter(pk=old.pk).exists())
+        self.assertTrue(EmailOutbox.objects.filter(pk=recent.pk).exists())
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.models import Expense, ExpenseCategory, ExpenseSplit
+
+from .helpers import client_for, make_expense, make_place, make_user
+
+
+class ExpenseBulkTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.member = make_user('member')
+        self.place = make_place(self.owner, self.member)
+        self.category = ExpenseCategory.objects.create(place=self.place, name='Food')
+        self.mine = make_expense(self.place, self.owner, split_with=[self.member])
+        self.theirs = make_expense(self.place, self.member, split_with=[self.owner])
+        self.url = f'/api/places/{self.place.id}/expenses/bulk/'
+
+    def _post(self, user, body):
+        with self.captureOnCommitCallbacks(execute=True):
+            return client_for(user).post(self.url, body, format='json')
+
+    def test_set_category_with_non_numeric_value_is_400(self):
+        response = self._post(self.owner, {'ids': [self.mine.id], 'op': 'set_category', 'value': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_set_category_from_another_place_is_400(self):
+        other = make_place(self.owner, name='Other')
+        foreign = ExpenseCategory.objects.create(place=other, name='Food')
+        response = self._post(self.owner, {'ids': [self.mine.id], 'op': 'set_category', 'value': foreign.id})
+        self.assertEqual(response.status_code, 400)
+
+    def test_set_category_updates_all_permitted(self):
+        response = self._post(
+            self.owner, {'ids': [self.mine.id, self.theirs.id], 'op': 'set_category', 'value': str(self.category.id)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data['updated']), sorted([self.mine.id, self.theirs.id]))
+        self.assertEqual(Expense.objects.filter(category=self.category).count(), 2)
+
+    def test_member_only_touches_expenses_they_added(self):
+        response = self._post(self.member, {'ids': [self.mine.id, self.theirs.id, 999999], 'op': 'delete'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [self.theirs.id])
+        self.assertEqual(
+            response.data['skipped'],
+            [{'id': self.mine.id, 'reason': 'forbidden'}, {'id': 999999, 'reason': 'not_found'}],
+        )
+        self.assertTrue(Expense.objects.filter(id=self.mine.id).exists())
+        self.assertFalse(Expense.objects.filter(id=self.theirs.id).exists())
+
+    def test_set_paid_by_rejects_non_member(self):
+        outsider = make_user('outsider')
+        response = self._post(self.owner, {'ids': [self.mine.id], 'op': 'set_paid_by', 'value': outsider.id})
+        self.assertEqual(response.status_code, 400)
+
+    def test_set_splits_replaces_split_members(self):
+        response = self._post(self.owner, {'ids': [self.mine.id], 'op': 'set_splits', 'value': [self.member.id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(ExpenseSplit.objects.filter(expense=self.mine).values_list('user_id', flat=True)), [self.member.id]
+        )
+
+    def test_activity_text_pluralizes(self):
+        with mock.patch('api.views._log_activity') as log:
+            self._post(self.owner, {'ids': [self.mine.id], 'op': 'set_category', 'value': self.category.id})
+            self._post(self.owner, {'ids': [self.mine.id, self.theirs.id], 'op': 'delete'})
+        descriptions = [call.kwargs['description'] for call in log.call_args_list]
+        self.assertEqual(descriptions, ['Edited 1 expense', 'Deleted 2 expenses'])
@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from api import import_utils
+from api.models import Expense, ExpenseCategory, ExpenseCycle, ExpenseSplit
+
+from .helpers import client_for, make_place, make_user
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+class ExpenseImportTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', email='alice@example.com')
+        self.bob = make_user('bob')
+        self.place = make_place(self.alice, self.bob)
+        self.cycle = ExpenseCycle.objects.create(
+            place=self.place, start_date=date.today() - timedelta(days=3), end_date=date.today() + timedelta(days=4),
+        )
+        self.food = ExpenseCategory.objects.create(place=self.place, name='Food')
+        self.client = client_for(self.alice)
+        self.url = f'/api/places/{self.place.id}/expenses/import/'
+
+    def _csv(self, text, **params):
+        upload = SimpleUploadedFile('expenses.csv', text.encode(), content_type='text/csv')
+        return self.client.post(self.url + ('?dry_run=1' if params.get('dry_run') else ''), {'file': upload})
+
+    def test_csv_imports_valid_rows_and_reports_invalid_ones(self):
+        response = self._csv(
+            'amount,description,date,paid_by,split,category\n'
+            '30.00,Groceries,2026-01-05,bob,alice;bob,food\n'
+            '-1,Bad amount,2026-01-05,,,\n'
+            '12.5,Taxi,2026-01-06,alice@example.com,,\n'
+            '5,Unknown payer,2026-01-06,carol,,\n'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([e['row'] for e in response.data['errors']], [3, 5])
+
+        groceries = Expense.objects.get(description='Groceries')
+        self.assertEqual(groceries.paid_by, self.bob)
+        self.assertEqual(groceries.added_by, self.alice)
+        self.assertEqual(groceries.cycle, self.cycle)
+        self.assertEqual(groceries.category, self.food)
+        self.assertEqual(set(groceries.splits.values_list('user_id', flat=True)), {self.alice.id, self.bob.id})
+        taxi = Expense.objects.get(description='Taxi')
+        self.assertEqual(taxi.amount, Decimal('12.50'))
+        self.assertEqual(list(taxi.splits.values_list('user_id', flat=True)), [self.alice.id])
+
+    def test_ndjson_raw_body(self):
+        body = (
+            '{"amount": "8", "description": "Bread", "date": "2026-01-07", "split": ["alice", "bob"]}\n'
+            'not json\n'
+            '\n'
+            '{"amount": "3", "description": "Milk", "date": "2026-01-07"}\n'
+        )
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual(response.data['errors'], [{'row': 2, 'errors': ['line is not a JSON object']}])
+        self.assertEqual(ExpenseSplit.objects.filter(expense__description='Bread').count(), 2)
+
+    def test_dry_run_validates_without_inserting(self):
+        response = self._csv('amount,description,date\n4,Coffee,2026-01-08\n', dry_run=True)
+        self.assertEqual(response.data['imported'], 1)
+        self.assertFalse(Expense.objects.exists())
+
+    def test_rows_are_inserted_in_chunks(self):
+        rows = ''.join(f'{n + 1},Row {n},2026-01-09\n' for n in range(5))
+        with mock.patch.object(import_utils, 'CHUNK_SIZE', 2), \
+                mock.patch.object(import_utils, '_insert_chunk', wraps=import_utils._insert_chunk) as insert:
+            response = self._csv('amount,description,date\n' + rows)
+        self.assertEqual(response.data['imported'], 5)
+        self.assertEqual([len(call.args[3]) for call in insert.call_args_list], [2, 2, 1])
+        self.assertEqual(ExpenseSplit.objects.filter(expense__place=self.place).count(), 5)
+
+    @override_settings(EXPENSE_IMPORT_MAX_ROWS=2)
+    def test_max_rows_truncates(self):
+        rows = ''.join(f'{n + 1},Row {n},2026-01-09\n' for n in range(3))
+        response = self._csv('amount,description,date\n' + rows)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertTrue(response.data['truncated'])
+
+    def test_non_member_is_forbidden(self):
+        outsider = make_user('mallory')
+        upload = SimpleUploadedFile('e.csv', b'amount,description,date\n1,x,2026-01-01\n', content_type='text/csv')
+        response = client_for(outsider).post(self.url, {'file': upload})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Expense.objects.exists())
+
+    def test_members_are_notified_with_a_singular_count(self):
+        self._csv('amount,description,date\n4,Coffee,2026-01-08\n')
+        notification = self.bob.notifications.get()
+        self.assertEqual(notification.message, 'alice imported 1 expense')
+        self.assertFalse(self.alice.notifications.exists())
@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Expense, ExpenseCycle
+
+from .helpers import client_for, make_expense, make_place, make_user
+
+
+class ExpenseCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alice')
+        self.place = make_place(self.user)
+        self.cycle = ExpenseCycle.objects.create(
+            place=self.place, start_date=date.today() - timedelta(days=3), end_date=date.today() + timedelta(days=4),
+        )
+        for n in range(25):
+            make_expense(self.place, self.user, description=f'e{n}', cycle=self.cycle)
+        self.client = client_for(self.user)
+        self.url = f'/api/places/{self.place.id}/expenses/'
+
+    def _page(self, cursor=None):
+        params = {'pagination': 'cursor', 'page_size': 10}
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    @staticmethod
+    def _cursor(next_url):
+        return parse_qs(urlparse(next_url).query)['cursor'][0] if next_url else None
+
+    def test_pages_cover_every_expense_once_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            page = self._page(cursor)
+            seen += [row['id'] for row in page['results']]
+            cursor = self._cursor(page['next'])
+            if cursor is None:
+                break
+        expected = list(Expense.objects.filter(place=self.place).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_new_expenses_do_not_shift_later_pages(self):
+        first = self._page()
+        make_expense(self.place, self.user, description='added while scrolling', cycle=self.cycle)
+        second = self._page(self._cursor(first['next']))
+        overlap = {r['id'] for r in first['results']} & {r['id'] for r in second['results']}
+        self.assertEqual(overlap, set())
+        self.assertEqual(len(second['results']), 10)
+
+    def test_later_pages_cost_the_same_queries_and_skip_count(self):
+        with CaptureQueriesContext(connection) as page_one:
+            first = self._page()
+        with CaptureQueriesContext(connection) as page_two:
+            self._page(self._cursor(first['next']))
+        self.assertEqual(len(page_one), len(page_two))
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in page_two.captured_queries))
+
+    def test_page_number_pagination_stays_the_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 25)
+
+    def test_keyset_order_is_served_by_the_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN output is SQLite-specific')
+        qs = Expense.objects.filter(place=self.place).order_by('-created_at', '-id')[:10]
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('expense_place_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
@@ -0,0 +1,46 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from api.models import Expense
+from api.search_utils import FTS_TABLE, ensure_fts_triggers, search_description
+
+from .helpers import make_expense, make_place, make_user
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 index is SQLite-only')
+class ExpenseFtsSearchTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alice')
+        self.place = make_place(self.user)
+
+    def _search(self, text):
+        return set(search_description(Expense.objects.filter(place=self.place), text).values_list('id', flat=True))
+
+    def test_prefix_match_and_edits_are_indexed(self):
+        pizza = make_expense(self.place, self.user, description='Pizza night')
+        make_expense(self.place, self.user, description='Rent')
+        self.assertEqual(self._search('piz'), {pizza.id})
+
+        pizza.description = 'Sushi night'
+        pizza.save(update_fields=['description'])
+        self.assertEqual(self._search('piz'), set())
+        self.assertEqual(self._search('sushi'), {pizza.id})
+
+    def test_operators_in_input_are_plain_text(self):
+        make_expense(self.place, self.user, description='Groceries')
+        self.assertEqual(self._search('OR NOT *'), set())
+
+    def test_post_migrate_recreates_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER {FTS_TABLE}_{suffix}')
+        stale = make_expense(self.place, self.user, description='Taxi home')
+        self.assertEqual(self._search('taxi'), set())
+
+        ensure_fts_triggers(using='default')
+
+        self.assertEqual(self._search('taxi'), {stale.id})  # 'rebuild' picked up the missed insert
+        fresh = make_expense(self.place, self.user, description='Taxi back')
+        self.assertEqual(self._search('taxi'), {stale.id, fresh.id})
@@ -0,0 +1,75 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from api import idempotency_utils
+from api.models import Expense, ExpenseCycle
+
+from .helpers import client_for, make_place, make_user
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+class IdempotentExpenseCreateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('alice')
+        self.place = make_place(self.user)
+        ExpenseCycle.objects.create(
+            place=self.place, start_date=date.today() - timedelta(days=3), end_date=date.today() + timedelta(days=4),
+        )
+        self.client = client_for(self.user)
+        self.url = f'/api/places/{self.place.id}/expenses/'
+        self.body = {
+            'amount': '12.50',
+            'description': 'Milk',
+            'date': date.today().isoformat(),
+            'paid_by': self.user.id,
+            'split_user_ids': [self.user.id],
+        }
+
+    def _post(self, key=None, body=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(self.url, body or self.body, format='json', **headers)
+
+    def test_retry_replays_first_response_without_a_second_write(self):
+        first = self._post('k-1')
+        self.assertEqual(first.status_code, 201, first.data)
+        retry = self._post('k-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(Expense.objects.filter(place=self.place).count(), 1)
+
+    def test_key_reused_with_another_body_is_422(self):
+        self._post('k-1')
+        response = self._post('k-1', {**self.body, 'amount': '99.00'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Expense.objects.filter(place=self.place).count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self._post('shared')
+        bob = make_user('bob')
+        self.place.members.create(user=bob)
+        response = client_for(bob).post(
+            self.url, {**self.body, 'paid_by': bob.id, 'split_user_ids': [bob.id]},
+            format='json', HTTP_IDEMPOTENCY_KEY='shared',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Expense.objects.filter(place=self.place).count(), 2)
+
+    def test_without_key_every_post_runs(self):
+        self._post()
+        self._post()
+        self.assertEqual(Expense.objects.filter(place=self.place).count(), 2)
+
+    def test_duplicate_in_flight_gets_409(self):
+        lock_key = f'{idempotency_utils._cache_key(mock.Mock(user=self.user, path=self.url), "k-1")}:lock'
+        cache.add(lock_key, 1, 30)
+        with mock.patch.object(idempotency_utils, 'LOCK_WAIT_SECONDS', 0.05):
+            response = self._post('k-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Expense.objects.exists())
+
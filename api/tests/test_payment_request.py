@@ -0,0 +1,67 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.models import Notification, PaymentRequestCooldown
+
+from .helpers import client_for, make_expense, make_place, make_user
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+class PaymentRequestCooldownTests(TestCase):
+    def setUp(self):
+        self.me = make_user('alice')
+        self.target = make_user('bob')
+        self.place = make_place(self.me, self.target)
+        make_expense(self.place, self.me, amount='20.00', split_with=[self.target])
+        self.client = client_for(self.me)
+        self.url = f'/api/places/{self.place.id}/request_payment/'
+
+    def _request(self):
+        return self.client.post(self.url, {'user_id': self.target.id}, format='json')
+
+    def _sent(self):
+        return Notification.objects.filter(
+            user=self.target, type=Notification.TYPE_PAYMENT_REQUEST
+        ).count()
+
+    def test_second_request_within_cooldown_is_rejected_without_the_limiter(self):
+        self.assertEqual(self._request().status_code, 200)
+        response = self._request()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 12 * 3600 - 60)
+        self.assertEqual(self._sent(), 1)
+        self.assertEqual(PaymentRequestCooldown.objects.count(), 1)
+
+    def test_request_allowed_again_after_cooldown(self):
+        self.assertEqual(self._request().status_code, 200)
+        PaymentRequestCooldown.objects.update(last_sent_at=timezone.now() - timedelta(hours=12, seconds=1))
+        self.assertEqual(self._request().status_code, 200)
+        self.assertEqual(self._sent(), 2)
+
+    def test_cooldown_is_per_place(self):
+        other_place = make_place(self.me, self.target, name='Cabin')
+        make_expense(other_place, self.me, amount='20.00', split_with=[self.target])
+        self.assertEqual(self._request().status_code, 200)
+        response = self.client.post(
+            f'/api/places/{other_place.id}/request_payment/', {'user_id': self.target.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_failed_notification_does_not_consume_the_cooldown(self):
+        with mock.patch('api.views.create_notification', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self._request()
+        self.assertFalse(PaymentRequestCooldown.objects.exists())
+        self.assertEqual(self._request().status_code, 200)
+
+    def test_nothing_owed_is_rejected_before_the_cooldown(self):
+        stranger = make_user('carol')
+        place = make_place(self.me, stranger, name='Office')
+        response = self.client.post(
+            f'/api/places/{place.id}/request_payment/', {'user_id': stranger.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentRequestCooldown.objects.exists())
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TestCase, modify_settings, override_settings
+
+from api import db_router
+from api.db_router import REPLICA_ALIAS, ReplicaRouter, pin_to_primary, replica_reads
+from api.models import Place
+from api.realtime import publish_change
+
+from .helpers import client_for, make_place, make_user
+
+
+def _request(user_id):
+    return SimpleNamespace(user=SimpleNamespace(pk=user_id))
+
+
+@override_settings(REPLICA_STICKY_SECONDS=10)
+class ReplicaStickinessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(db_router, 'replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_use_the_replica_until_the_user_is_pinned(self):
+        self.assertEqual(db_router._read_alias_for(_request(1)), REPLICA_ALIAS)
+        pin_to_primary(user_ids=[1])
+        self.assertEqual(db_router._read_alias_for(_request(1)), DEFAULT_DB_ALIAS)
+        self.assertEqual(db_router._read_alias_for(_request(2)), REPLICA_ALIAS)
+
+    def test_place_pin_applies_to_every_member(self):
+        pin_to_primary(place_id=7)
+        self.assertEqual(db_router._read_alias_for(_request(2), place_id=7), DEFAULT_DB_ALIAS)
+        self.assertEqual(db_router._read_alias_for(_request(2), place_id=8), REPLICA_ALIAS)
+
+    def test_pins_expire_after_the_sticky_window(self):
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            pin_to_primary(user_ids=[1], place_id=7)
+        self.assertEqual(set_many.call_args.args[1], 10)
+
+    def test_unreachable_cache_reads_from_the_primary(self):
+        with mock.patch.object(cache, 'get_many', side_effect=ConnectionError), self.assertLogs('api.db_router', 'WARNING'):
+            self.assertEqual(db_router._read_alias_for(_request(1)), DEFAULT_DB_ALIAS)
+
+    def test_router_follows_replica_reads_only_inside_the_view(self):
+        router = ReplicaRouter()
+        seen = []
+
+        @replica_reads
+        def view(request, place_id=None):
+            seen.append(router.db_for_read(Place))
+
+        view(_request(1), place_id=3)
+        pin_to_primary(place_id=3)
+        view(_request(1), place_id=3)
+        self.assertEqual(seen, [REPLICA_ALIAS, DEFAULT_DB_ALIAS])
+        self.assertIsNone(router.db_for_read(Place))
+        self.assertEqual(router.db_for_write(Place), DEFAULT_DB_ALIAS)
+
+    def test_publish_change_pins_place_and_users_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            publish_change('expense', place_id=5, user_ids=[9])
+            self.assertEqual(db_router._read_alias_for(_request(9)), REPLICA_ALIAS)
+        with mock.patch('api.realtime._publish_now'):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(db_router._read_alias_for(_request(9)), DEFAULT_DB_ALIAS)
+        self.assertEqual(db_router._read_alias_for(_request(1), place_id=5), DEFAULT_DB_ALIAS)
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+@modify_settings(MIDDLEWARE={'append': 'api.middleware.ReplicaStickinessMiddleware'})
+class ReplicaStickinessMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(db_router, 'replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = make_user('alice')
+        self.client = client_for(self.user)
+
+    def _alias(self):
+        return db_router._read_alias_for(_request(self.user.pk))
+
+    def test_successful_write_pins_the_jwt_user(self):
+        response = self.client.post('/api/places/', {'name': 'Loft'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self._alias(), DEFAULT_DB_ALIAS)
+
+    def test_reads_and_failed_writes_do_not_pin(self):
+        place = make_place(self.user)
+        self.client.get('/api/places/')
+        self.assertEqual(self._alias(), REPLICA_ALIAS)
+        response = self.client.patch(f'/api/places/{place.id}/', {'name': ''}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._alias(), REPLICA_ALIAS)
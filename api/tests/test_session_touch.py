@@ -0,0 +1,105 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import session_utils
+from api.models import UserSession
+
+from .helpers import make_user
+
+
+class _FakeHashClient:
+    """The handful of Redis hash commands the touch buffer uses."""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = value.encode()
+
+    def hsetnx(self, key, field, value):
+        self.hashes.setdefault(key, {}).setdefault(field, value)
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client, self.ops = client, []
+
+    def __getattr__(self, name):
+        return lambda *args: self.ops.append((name, args))
+
+    def execute(self):
+        results = []
+        for name, args in self.ops:
+            if name == 'hgetall':
+                results.append(dict(self.client.hashes.get(args[0], {})))
+            elif name == 'delete':
+                results.append(int(self.client.hashes.pop(args[0], None) is not None))
+            else:
+                results.append(getattr(self.client, name)(*args))
+        return results
+
+
+@override_settings(SESSION_TOUCH_URL='redis://touch-buffer', SESSION_TOUCH_INTERVAL_SECONDS=60)
+class SessionTouchBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_fake = _FakeHashClient()
+        patcher = mock.patch.object(session_utils, '_get_touch_client', return_value=self.client_fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = make_user('alice')
+        old = timezone.now() - timedelta(days=1)
+        self.sessions = [
+            UserSession.objects.create(
+                user=user, jti=f'jti-{n}', expires_at=timezone.now() + timedelta(days=7), last_used_at=old
+            )
+            for n in range(3)
+        ]
+
+    def test_touches_make_no_queries_and_coalesce_to_the_latest(self):
+        first, latest = timezone.now(), timezone.now() + timedelta(seconds=30)
+        with self.assertNumQueries(0):
+            for when in (first, latest, first + timedelta(seconds=5)):
+                session_utils.record_session_touch(self.sessions[0].pk, when)
+        buffered = self.client_fake.hashes[session_utils.SESSION_TOUCH_KEY]
+        self.assertEqual(len(buffered), 1)
+
+    def test_flush_writes_every_session_with_one_bulk_update(self):
+        when = timezone.now()
+        for session in self.sessions:
+            session_utils.record_session_touch(session.pk, when)
+        with self.assertNumQueries(2):  # live-row lookup + one bulk UPDATE
+            result = session_utils.flush_session_touches()
+        self.assertEqual(result, {'flushed': 3})
+        self.assertEqual(UserSession.objects.filter(last_used_at=when).count(), 3)
+        self.assertNotIn(session_utils.SESSION_TOUCH_KEY, self.client_fake.hashes)
+
+    def test_flush_runs_at_most_once_per_interval(self):
+        session_utils.record_session_touch(self.sessions[0].pk, timezone.now())
+        session_utils.flush_session_touches()
+        session_utils.record_session_touch(self.sessions[1].pk, timezone.now())
+        self.assertEqual(session_utils.flush_session_touches(), {'flushed': 0, 'skipped': True})
+
+    def test_revoked_sessions_are_skipped(self):
+        session_utils.record_session_touch(self.sessions[0].pk, timezone.now())
+        self.sessions[0].delete()
+        self.assertEqual(session_utils.flush_session_touches(), {'flushed': 0})
+
+    def test_failed_flush_requeues_without_overwriting_newer_touches(self):
+        session_utils.record_session_touch(self.sessions[0].pk, timezone.now())
+        with mock.patch.object(UserSession.objects, 'bulk_update', side_effect=RuntimeError('db down')):
+            result = session_utils.flush_session_touches()
+        self.assertEqual(result, {'flushed': 0, 'requeued': 1})
+        self.assertEqual(len(self.client_fake.hashes[session_utils.SESSION_TOUCH_KEY]), 1)
+
+    def test_buffer_errors_drop_the_touch_instead_of_writing(self):
+        with mock.patch.object(self.client_fake, 'hset', side_effect=ConnectionError):
+            with self.assertNumQueries(0):
+                session_utils.record_session_touch(self.sessions[0].pk, timezone.now())
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import StreamTicket
+from api.realtime import place_channel, redeem_stream_ticket, user_channel
+from api.views import _event_stream_channels
+
+from .helpers import client_for, make_place, make_user
+
+
+class StreamTicketTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alice')
+        self.place = make_place(self.user)
+
+    def _issue(self):
+        response = client_for(self.user).post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['ticket']
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().post('/api/events/ticket/').status_code, 401)
+
+    def test_ticket_is_single_use(self):
+        ticket = self._issue()
+        self.assertEqual(
+            _event_stream_channels(ticket), [user_channel(self.user.id), place_channel(self.place.id)],
+        )
+        self.assertIsNone(_event_stream_channels(ticket))
+
+    def test_only_the_hash_is_stored(self):
+        ticket = self._issue()
+        self.assertFalse(StreamTicket.objects.filter(key_hash=ticket).exists())
+        self.assertEqual(StreamTicket.objects.count(), 1)
+
+    def test_expired_and_unknown_tickets_are_refused(self):
+        ticket = self._issue()
+        StreamTicket.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(redeem_stream_ticket(ticket))
+        self.assertIsNone(redeem_stream_ticket('not-a-ticket'))
+
+    def test_issuing_clears_expired_tickets(self):
+        self._issue()
+        StreamTicket.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self._issue()
+        self.assertEqual(StreamTicket.objects.count(), 1)
+
+    def test_inactive_user_is_refused(self):
+        ticket = self._issue()
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertIsNone(redeem_stream_ticket(ticket))
+
@@ -0,0 +1,54 @@
+from rest_framework.throttling import BaseThrottle
+
+from .ratelimit_utils import hit
+from .session_utils import get_client_ip
+
+
+class GCRAThrottle(BaseThrottle):
+    """
+    DRF throttle backed by ratelimit_utils (shared across workers via Redis).
+
+    Set `scope` to a key of settings.RATELIMITS. Throttles run before the view
+    body, so rejected requests never reach password hashing or DB writes.
+    """
+
+    scope = None
+
+    def get_ident_key(self, request, view):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{get_client_ip(request) or "unknown"}'
+
+    def allow_request(self, request, view):
+        allowed, self._wait = hit(self.scope, self.get_ident_key(request, view))
+        return allowed
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class RegisterThrottle(GCRAThrottle):
+    scope = 'register'
+
+
+class SettlementThrottle(GCRAThrottle):
+    scope = 'settlement'
+
+
+class LoginThrottle(GCRAThrottle):
+    """Per client IP, plus per username so one account cannot be sprayed from many IPs."""
+
+    scope = 'login'
+
+    def allow_request(self, request, view):
+        if not super().allow_request(request, view):
+            return False
+        try:
+            username = (request.data.get('username') or '').strip().lower()
+        except Exception:
+            username = ''
+        if not username:
+            return True
+        allowed, self._wait = hit('login_user', username[:150])
+        return allowed
@@ -0,0 +1,59 @@
+import logging
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+
+from .blacklist_utils import blacklist_jti, is_jti_blacklisted, use_redis_blacklist
+from .membership_utils import add_membership_claims
+
+logger = logging.getLogger(__name__)
+
+
+class EquiloRefreshToken(RefreshToken):
+    """
+    RefreshToken whose blacklist lives in the backend picked by REFRESH_BLACKLIST_BACKEND.
+
+    With the Redis backend, issuing, rotating and checking a token make no
+    OutstandingToken / BlacklistedToken queries (see blacklist_utils). Access
+    tokens minted from it carry place-membership claims (see membership_utils).
+    """
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        add_membership_claims(access, self.payload.get(api_settings.USER_ID_CLAIM))
+        return access
+
+    def check_blacklist(self) -> None:
+        if not use_redis_blacklist():
+            return super().check_blacklist()
+        try:
+            blacklisted = is_jti_blacklisted(self.payload[api_settings.JTI_CLAIM])
+        except Exception:
+            # Fail closed: accepting a possibly rotated token would allow replay.
+            logger.error('refresh blacklist lookup failed', exc_info=True)
+            raise TokenError(_('Token blacklist unavailable'))
+        if blacklisted:
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        if not use_redis_blacklist():
+            return super().blacklist()
+        if not blacklist_jti(self.payload[api_settings.JTI_CLAIM], self.payload.get('exp')):
+            # Lost a race with a concurrent rotation / logout of the same token.
+            raise TokenError(_('Token is blacklisted'))
+        return None
+
+    def outstand(self):
+        if not use_redis_blacklist():
+            return super().outstand()
+        return None
+
+    @classmethod
+    def for_user(cls, user):
+        if not use_redis_blacklist():
+            return super().for_user(user)
+        # Skip BlacklistMixin.for_user, which records an OutstandingToken row.
+        return super(BlacklistMixin, cls).for_user(user)
@@ -13,6 +13,8 @@ urlpatterns = [
     path('notifications/', views.notifications_list),
     path('notifications/mark_all_read/', views.notifications_mark_all_read),
     path('notifications/<int:notification_id>/read/', views.notifications_mark_read),
+    path('events/', views.event_stream, name='event-stream'),
+    path('events/ticket/', views.event_stream_ticket, name='event-stream-ticket'),
     path('places/<int:place_id>/request_payment/', views.request_payment, name='place-request-payment'),
     path('places/<int:place_id>/members/remove/', views.remove_member, name='place-remove-member'),
     path('places/<int:place_id>/leave/', views.leave_place, name='place-leave'),
@@ -33,6 +35,11 @@ urlpatterns = [
     path('join/<str:token>/', views.join_place),
     path('email/unsubscribe/<str:token>/', views.email_unsubscribe, name='email_unsubscribe'),
     path('cron/transition-cycles/', views.cron_transition_cycles, name='cron-transition-cycles'),
+    path('cron/drain-activity-log/', views.cron_drain_activity_log, name='cron-drain-activity-log'),
+    path('cron/drain-email-outbox/', views.cron_drain_email_outbox, name='cron-drain-email-outbox'),
+    path('cron/send-digests/', views.cron_send_digests, name='cron-send-digests'),
+    path('cron/process-profile-photos/', views.cron_process_profile_photos, name='cron-process-profile-photos'),
+    path('cron/flush-session-touches/', views.cron_flush_session_touches, name='cron-flush-session-touches'),
     path('', include(router.urls)),
     # Nested under place
     path('places/<int:place_id>/members/', views.PlaceMemberList.as_view(), name='place-members'),
@@ -49,6 +56,8 @@ urlpatterns = [
     path('places/<int:place_id>/expenses/', views.ExpenseViewSet.as_view({
         'get': 'list', 'post': 'create',
     }), name='place-expenses-list'),
+    path('places/<int:place_id>/expenses/import/', views.expense_import, name='place-expenses-import'),
+    path('places/<int:place_id>/expenses/bulk/', views.expense_bulk, name='place-expenses-bulk'),
     path('places/<int:place_id>/expenses/<int:pk>/', views.ExpenseViewSet.as_view({
         'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
     }), name='place-expenses-detail'),
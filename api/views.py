@@ -1,33 +1,41 @@
-import io
+import base64
+import csv
+import functools
 import logging
 import secrets
-from datetime import date, timedelta, timezone as dt_utc
+from datetime import date, datetime, timedelta, timezone as dt_utc
 from decimal import Decimal
 
+from asgiref.sync import sync_to_async
 from django.conf import settings as django_settings
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import Q, Count, Sum, Case, When, F, DecimalField, OuterRef, Subquery
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from rest_framework import status, generics
 from rest_framework.exceptions import PermissionDenied
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.viewsets import ModelViewSet
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView as BaseTokenObtainPairView
 from rest_framework_simplejwt.views import TokenRefreshView as BaseTokenRefreshView
 
 from .jwt_serializers import EquiloTokenObtainPairSerializer, EquiloTokenRefreshSerializer
-from .models import Place, PlaceMember, ExpenseCategory, Expense, ExpenseSplit, PlaceInvite, UserProfile, Notification, ExpenseCycle, UserSession, Settlement, ActivityLog
+from .models import Place, PlaceMember, ExpenseCategory, Expense, ExpenseSplit, PlaceInvite, UserProfile, Notification, ExpenseCycle, UserSession, Settlement, ActivityLog, PaymentRequestCooldown
 from .session_utils import (
     blacklist_outstanding_for_jti,
     clear_refresh_cookie,
     get_refresh_token_from_request,
     jti_from_refresh_string,
+    mark_sessions_revoked,
+    revoke_sessions,
     session_pk_from_access_header,
     set_refresh_cookie,
     upsert_session_for_refresh_token,
@@ -41,6 +49,8 @@ from .serializers import (
     PlaceMemberSerializer,
     ExpenseCategorySerializer,
     ExpenseSerializer,
+    NormalizedExpenseSerializer,
+    build_expense_included,
     PlaceInviteSerializer,
     NotificationSerializer,
     ExpenseCycleSerializer,
@@ -52,7 +62,33 @@ from .cache_utils import (
     set_cached_cycle_summary,
     invalidate_cycle_summary,
 )
-from .email_utils import send_transactional_email, read_unsubscribe_token
+from .email_utils import BatchEmailRenderer, send_transactional_email, read_unsubscribe_token
+from .outbox_utils import outbox_enabled
+from . import photo_utils
+from .db_router import replica_reads
+from .realtime import (
+    get_broker,
+    issue_stream_ticket,
+    place_channel,
+    publish_change,
+    redeem_stream_ticket,
+    user_channel,
+)
+from .membership_utils import bump_membership_version, get_membership, is_place_member
+from .ratelimit_utils import rate_limit
+from .throttling import LoginThrottle, RegisterThrottle, SettlementThrottle
+from .idempotency_utils import idempotent, run_idempotent
+from .import_utils import detect_format, import_expenses
+from .search_utils import SearchParamError, apply_expense_filters, has_search_params
+from .notification_utils import (
+    bulk_create_notifications,
+    coalesce_notifications,
+    create_notification,
+    get_unread_count,
+    mark_all_notifications_read,
+    mark_notification_read,
+    recount_notification_counters,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -70,52 +106,38 @@ def _safe_display_name(u):
     return name or getattr(u, 'username', '') or ''
 
 
-def _compress_profile_photo(uploaded_file):
-    """Resize and compress image for profile photo. Max 512px, JPEG quality 85. Returns file-like or None on error."""
-    try:
-        from PIL import Image
-    except ImportError:
-        return uploaded_file
-    try:
-        img = Image.open(uploaded_file).convert('RGB')
-    except Exception:
-        return uploaded_file
-    max_size = 512
-    w, h = img.size
-    if w > max_size or h > max_size:
-        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-    buf = io.BytesIO()
-    img.save(buf, format='JPEG', quality=85, optimize=True)
-    buf.seek(0)
-    data = buf.getvalue()
-    name = (uploaded_file.name or 'photo.jpg').rsplit('.', 1)[0] + '.jpg'
-    return InMemoryUploadedFile(io.BytesIO(data), 'profile_photo', name, 'image/jpeg', len(data), None)
-
-
 def _log_activity(request, activity_type, place=None, expense=None, target_user=None, amount=None, description='', extra=None):
-    """Create an ActivityLog entry for the activity feed."""
+    """
+    Record an ActivityLog entry for the activity feed.
+    Buffered on the request and bulk-inserted after the response is sent
+    (ActivityLogBufferMiddleware); written immediately when no buffer is installed.
+    Either way the entry only counts once the surrounding transaction commits, so
+    a rolled-back change leaves no activity behind.
+    """
     if not request or not getattr(request, 'user', None) or not request.user.is_authenticated:
         return
-    kwargs = {
-        'user': request.user,
-        'type': activity_type,
-        'place': place,
-        'expense': expense,
-        'target_user': target_user,
-        'amount': amount,
-        'description': (description or '')[:500],
-        'extra': extra or {},
-    }
-    ActivityLog.objects.create(**kwargs)
+    entry = ActivityLog(
+        user=request.user,
+        type=activity_type,
+        place=place,
+        expense=expense,
+        target_user=target_user,
+        amount=amount,
+        description=(description or '')[:500],
+        extra=extra or {},
+    )
+    buffer = getattr(request, 'activity_log_buffer', None)
+    transaction.on_commit(entry.save if buffer is None else lambda: buffer.append(entry))
 
 
-def _profile_photo_url(request, user):
-    """Return absolute URL for user's profile photo, or None."""
+def _profile_photo_url(request, user, size=photo_utils.DEFAULT_SIZE):
+    """Return absolute URL for user's profile photo (the *size* px variant once rendered), or None."""
     if not user:
         return None
     try:
-        if getattr(user, 'profile', None) and user.profile.profile_photo:
-            return request.build_absolute_uri(user.profile.profile_photo.url)
+        url = photo_utils.profile_photo_url(getattr(user, 'profile', None), size)
+        if url:
+            return request.build_absolute_uri(url)
     except Exception:
         pass
     return None
@@ -124,26 +146,59 @@ def _profile_photo_url(request, user):
 @api_view(['GET', 'PATCH'])
 @permission_classes([IsAuthenticated])
 def me(request):
-    """Current user info (GET) or update profile (PATCH: email, display_name, profile_photo). Username is read-only."""
+    """
+    Current user info (GET) or update profile (PATCH: email, display_name, profile_photo,
+    email_digest = immediate | daily | weekly). Username is read-only.
+    """
     if request.method == 'PATCH':
+        digest = request.data.get('email_digest')
+        if digest is not None and digest not in dict(UserProfile.DIGEST_CHOICES):
+            return Response(
+                {'email_digest': ['Must be one of: immediate, daily, weekly.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         user = request.user
         data = request.data
         # Username is not changeable via this endpoint
         if 'email' in data:
             user.email = (data['email'] or '').strip()
-        user.save()
         profile, _ = UserProfile.objects.get_or_create(user=user, defaults={'display_name': ''})
         if 'display_name' in data:
             profile.display_name = (data['display_name'] or '').strip()
+        photo_data = None
         if 'profile_photo' in request.FILES:
-            photo_file = _compress_profile_photo(request.FILES['profile_photo'])
-            profile.profile_photo = photo_file
+            # Stored as uploaded; resizing happens off-request (api.photo_utils).
+            try:
+                photo_data = photo_utils.store_upload(profile, request.FILES['profile_photo'])
+            except photo_utils.InvalidPhoto as exc:
+                return Response({'profile_photo': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
         elif request.data.get('remove_profile_photo') in (True, 'true', '1'):
-            profile.profile_photo = None
+            photo_utils.clear_photo(profile)
+        user.save()
+        if digest is not None and digest != profile.email_digest:
+            profile.email_digest = digest
+            # The first digest covers notifications from now on, not the backlog.
+            profile.last_digest_at = timezone.now()
         profile.save()
+        if photo_data is not None:
+            photo_utils.schedule_processing(profile, photo_data)
         _log_activity(request, ActivityLog.TYPE_PROFILE_UPDATED, description='Profile updated')
-        return Response(UserSerializer(user, context={'request': request}).data)
-    return Response(UserSerializer(request.user, context={'request': request}).data)
+        return Response(_me_data(request, user))
+    return Response(_me_data(request, request.user))
+
+
+def _me_data(request, user):
+    """UserSerializer data plus the owner-only email_digest preference and photo variants."""
+    data = dict(UserSerializer(user, context={'request': request}).data)
+    profile = getattr(user, 'profile', None)
+    data['email_digest'] = getattr(profile, 'email_digest', UserProfile.DIGEST_IMMEDIATE)
+    # All sizes/formats for the owner's own profile screens: {fmt: {size: url}}, null until rendered.
+    variants = photo_utils.profile_photo_variants(profile)
+    data['profile_photo_variants'] = variants and {
+        fmt: {size: request.build_absolute_uri(url) for size, url in urls.items()}
+        for fmt, urls in variants.items()
+    }
+    return data
 
 
 @api_view(['POST'])
@@ -188,6 +243,7 @@ def delete_account(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterThrottle])
 def register(request):
     """Register a new user. Returns user + tokens."""
     serializer = UserSerializer(data=request.data)
@@ -213,9 +269,9 @@ def register(request):
     )
     # Ensure profile exists for display_name/profile_photo consumers
     UserProfile.objects.get_or_create(user=user, defaults={'display_name': ''})
-    from rest_framework_simplejwt.tokens import RefreshToken
+    from .tokens import EquiloRefreshToken
 
-    refresh = RefreshToken.for_user(user)
+    refresh = EquiloRefreshToken.for_user(user)
     session = upsert_session_for_refresh_token(str(refresh), request, user)
     if session:
         refresh['sid'] = session.pk
@@ -233,6 +289,8 @@ class EquiloTokenObtainPairView(BaseTokenObtainPairView):
     """Login: access + refresh_jti in body; refresh token only in HttpOnly cookie."""
 
     serializer_class = EquiloTokenObtainPairSerializer
+    # Throttled before the serializer runs, so floods never reach password hashing.
+    throttle_classes = [LoginThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -271,16 +329,18 @@ class CookieTokenRefreshView(BaseTokenRefreshView):
 @permission_classes([AllowAny])
 def auth_logout(request):
     """Blacklist current refresh (cookie or body) and clear refresh cookie."""
-    from rest_framework_simplejwt.tokens import RefreshToken
+    from .tokens import EquiloRefreshToken
 
     raw = get_refresh_token_from_request(request)
     if raw:
         try:
-            token = RefreshToken(raw)
+            token = EquiloRefreshToken(raw)
             jti = str(token.get('jti', '') or '')
             token.blacklist()
             if jti:
-                UserSession.objects.filter(jti=jti).delete()
+                sessions = UserSession.objects.filter(jti=jti)
+                mark_sessions_revoked(sessions.values_list('pk', flat=True))
+                sessions.delete()
         except Exception:
             pass
     response = Response({'detail': 'Logged out.'})
@@ -294,13 +354,13 @@ def sessions_register(request):
     """
     Register the current device's session from refresh cookie (or body for legacy).
     """
-    from rest_framework_simplejwt.tokens import RefreshToken
+    from .tokens import EquiloRefreshToken
 
     refresh_str = get_refresh_token_from_request(request)
     if not refresh_str:
         return Response({'detail': 'No refresh token (cookie or body).'}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        token = RefreshToken(refresh_str)
+        token = EquiloRefreshToken(refresh_str)
         uid = token.get('user_id') or token.get('sub')
         if uid is None or str(uid) != str(request.user.id):
             return Response({'detail': 'Refresh token does not belong to current user.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -319,16 +379,11 @@ def sessions_register(request):
 @permission_classes([IsAuthenticated])
 def sessions_list(request):
     """
-    List active sessions. Ensures this browser's session row exists when a refresh cookie is present.
+    List active sessions (read-only; rows are written at login/refresh or via sessions/register/).
     is_current uses refresh cookie jti and/or access token `sid` (for UI only).
     """
     user = request.user
     refresh_str = get_refresh_token_from_request(request)
-    if refresh_str:
-        try:
-            upsert_session_for_refresh_token(refresh_str, request, user)
-        except Exception:
-            pass
     current_jti = jti_from_refresh_string(refresh_str) if refresh_str else None
     current_sid = session_pk_from_access_header(request)
     sessions = UserSession.objects.filter(user=user, expires_at__gt=timezone.now()).order_by('-created_at')
@@ -354,7 +409,8 @@ def session_revoke(request, jti):
     is_this_device = (cookie_jti and cookie_jti == jti) or (
         current_sid is not None and row_pk == current_sid
     )
-    blacklist_outstanding_for_jti(jti, user.id)
+    blacklist_outstanding_for_jti(jti, user.id, expires_at=session.expires_at)
+    mark_sessions_revoked([row_pk])
     session.delete()
     data = {'detail': 'Session revoked.'}
     if is_this_device:
@@ -378,12 +434,8 @@ def sessions_revoke_all(request):
     keep_jti = jti_from_refresh_string(refresh_str)
     if not keep_jti:
         return Response({'detail': 'Invalid refresh token.'}, status=status.HTTP_400_BAD_REQUEST)
-    sessions = UserSession.objects.filter(user=user, expires_at__gt=timezone.now())
-    for session in sessions:
-        if session.jti == keep_jti:
-            continue
-        blacklist_outstanding_for_jti(session.jti, user.id)
-        session.delete()
+    others = UserSession.objects.filter(user=user, expires_at__gt=timezone.now()).exclude(jti=keep_jti)
+    revoke_sessions(others, user.id)
     return Response({'detail': 'All other sessions revoked.'})
 
 
@@ -407,6 +459,7 @@ def stats(request):
 
 # ----- Places -----
 
+@method_decorator(replica_reads, name='list')
 class PlaceViewSet(ModelViewSet):
     serializer_class = PlaceSerializer
     permission_classes = [IsAuthenticated]
@@ -424,7 +477,7 @@ class PlaceViewSet(ModelViewSet):
     def _is_place_owner(self, place, user):
         return (
             place.created_by_id == user.id
-            or place.members.filter(user=user, role=PlaceMember.ROLE_OWNER).exists()
+            or is_place_member(self.request, place.id, role=PlaceMember.ROLE_OWNER)
         )
 
     def update(self, request, *args, **kwargs):
@@ -447,22 +500,31 @@ class PlaceViewSet(ModelViewSet):
         place = self.get_object()
         if not self._is_place_owner(place, request.user):
             raise PermissionDenied('Only the place owner can delete this place.')
-        return super().destroy(request, *args, **kwargs)
+        place_id = place.id
+        member_ids = list(place.members.values_list('user_id', flat=True))
+        response = super().destroy(request, *args, **kwargs)
+        bump_membership_version(member_ids)
+        # The cascade removed this place's notifications behind the counters' back.
+        recount_notification_counters(member_ids)
+        publish_change('place', place_id, user_ids=member_ids)
+        return response
 
     def perform_create(self, serializer):
         super().perform_create(serializer)
+        bump_membership_version([self.request.user.id])
         _log_activity(self.request, ActivityLog.TYPE_PLACE_CREATED, place=serializer.instance, description=serializer.instance.name)
 
 
 # ----- Place members (list only, join via invite) -----
 
+@method_decorator(replica_reads, name='list')
 class PlaceMemberList(generics.ListAPIView):
     serializer_class = PlaceMemberSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         place_id = self.kwargs['place_id']
-        if not PlaceMember.objects.filter(place_id=place_id, user=self.request.user).exists():
+        if not is_place_member(self.request, place_id):
             return PlaceMember.objects.none()
         return PlaceMember.objects.filter(place_id=place_id)
 
@@ -475,7 +537,7 @@ class ExpenseCategoryViewSet(ModelViewSet):
 
     def get_queryset(self):
         place_id = self.kwargs.get('place_id')
-        if not place_id or not PlaceMember.objects.filter(place_id=place_id, user=self.request.user).exists():
+        if not place_id or not is_place_member(self.request, place_id):
             return ExpenseCategory.objects.none()
         qs = ExpenseCategory.objects.filter(place_id=place_id)
         # Ensure all preset categories exist (fixes new places and places that only got one category)
@@ -505,30 +567,56 @@ class ExpensePageNumberPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class ExpenseCursorPagination(CursorPagination):
+    """
+    Opt-in keyset pagination (?pagination=cursor, or any request carrying ?cursor=).
+    No COUNT query and no OFFSET scan, so late pages cost the same as the first one,
+    and rows added concurrently do not shift the pages a client is scrolling through.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
 class ExpenseViewSet(ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = ExpensePageNumberPagination
 
+    @property
+    def paginator(self):
+        """Page-number pagination by default; cursor pagination when the client opts in."""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or params.get(ExpenseCursorPagination.cursor_query_param):
+                self._paginator = ExpenseCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
         place_id = self.kwargs.get('place_id')
-        membership = None
-        if place_id:
-            try:
-                membership = PlaceMember.objects.get(place_id=place_id, user=self.request.user)
-            except PlaceMember.DoesNotExist:
-                pass
+        membership = get_membership(self.request, place_id) if place_id else None
         if not place_id or not membership:
             return Expense.objects.none()
-        qs = (
-            Expense.objects.filter(place_id=place_id)
-            .select_related('paid_by', 'added_by', 'category', 'place', 'cycle')
-            .prefetch_related('splits__user')
-            .order_by('-created_at')
-        )
+        qs = Expense.objects.filter(place_id=place_id).order_by('-created_at')
+        if self._normalized():
+            # Splits only need user ids here; users are side-loaded once per page.
+            qs = qs.select_related('paid_by__profile', 'added_by__profile', 'category', 'cycle').prefetch_related('splits')
+        else:
+            qs = qs.select_related('paid_by', 'added_by', 'category', 'place', 'cycle').prefetch_related('splits__user')
         # Only show expenses added on or after when this user joined the place
         qs = qs.filter(created_at__gte=membership.joined_at)
-        cycle_id = self.request.query_params.get('cycle_id')
+        params = self.request.query_params
+        searching = self.action == 'list' and has_search_params(params)
+        if searching:
+            try:
+                qs = apply_expense_filters(qs, params)
+            except SearchParamError as exc:
+                from rest_framework.exceptions import ValidationError
+                raise ValidationError({'detail': str(exc)})
+        cycle_id = params.get('cycle_id')
         if cycle_id:
             try:
                 cid = int(cycle_id)
@@ -536,16 +624,43 @@ class ExpenseViewSet(ModelViewSet):
                     return qs.filter(cycle_id=cid)
             except ValueError:
                 pass
+        if searching:
+            # Search spans the place's whole history unless a cycle_id narrows it.
+            return qs
         current = _get_current_cycle(place_id)
         if current:
             return qs.filter(cycle_id=current.id)
         # No open cycle: show only current cycle (none), not past expenses
         return qs.none()
 
+    def _normalized(self):
+        """Opt-in side-loaded list shape: ?normalized=1."""
+        return self.action == 'list' and self.request.query_params.get('normalized') in ('1', 'true')
+
+    @method_decorator(replica_reads)
+    def list(self, request, *args, **kwargs):
+        """
+        With ?normalized=1, expenses reference paid_by / added_by / split users, category
+        and cycle by id, and each referenced object appears once under "included".
+        """
+        if not self._normalized():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        expenses = list(page if page is not None else queryset)
+        data = NormalizedExpenseSerializer(expenses, many=True).data
+        included = build_expense_included(expenses, self.get_serializer_context())
+        if page is None:
+            return Response({'results': data, 'included': included})
+        response = self.get_paginated_response(data)
+        response.data['included'] = included
+        return response
+
     def _can_edit_expense(self, request, expense):
-        if not expense.place.members.filter(user=request.user).exists():
+        membership = get_membership(request, expense.place_id)
+        if membership is None:
             return False
-        if expense.place.members.filter(user=request.user, role=PlaceMember.ROLE_OWNER).exists():
+        if membership.role == PlaceMember.ROLE_OWNER:
             return True
         if expense.added_by_id == request.user.id:
             return True
@@ -564,36 +679,66 @@ class ExpenseViewSet(ModelViewSet):
             extra={'expense_id': instance.id},
         )
         super().perform_destroy(instance)
+        publish_change('expense', place.id)
+
+    def _reload_for_response(self, serializer):
+        """Re-read the saved expense with its relations so rendering it costs a fixed number of queries."""
+        serializer.instance = (
+            Expense.objects.select_related(
+                'paid_by__profile', 'added_by__profile', 'category', 'place', 'cycle'
+            )
+            .prefetch_related('splits__user__profile')
+            .get(pk=serializer.instance.pk)
+        )
 
     def perform_update(self, serializer):
         instance = serializer.instance
         if not self._can_edit_expense(self.request, instance):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('Only the person who added this expense or the place owner can edit it.')
-        super().perform_update(serializer)
-        _log_activity(
-            self.request, ActivityLog.TYPE_EXPENSE_EDITED,
-            place=instance.place, expense=instance,
-            amount=instance.amount, description=instance.description,
-        )
+        with transaction.atomic():
+            super().perform_update(serializer)
+            _log_activity(
+                self.request, ActivityLog.TYPE_EXPENSE_EDITED,
+                place=instance.place, expense=instance,
+                amount=instance.amount, description=instance.description,
+            )
+            publish_change('expense', instance.place_id)
+        self._reload_for_response(serializer)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         place_id = self.kwargs.get('place_id')
-        if place_id:
+        if place_id and self.request.method == 'POST':
             try:
                 context['place'] = Place.objects.get(id=place_id)
                 context['current_cycle'] = _get_current_cycle(place_id)
             except Place.DoesNotExist:
                 pass
+        elif place_id and self.request.method in ('PUT', 'PATCH'):
+            # Category validation on edit is scoped to the place; the open cycle is not needed.
+            context['place'] = Place(id=place_id)
         return context
 
+    def create(self, request, *args, **kwargs):
+        # Retried POSTs carrying the same Idempotency-Key replay the first response.
+        return run_idempotent(request, lambda: super(ExpenseViewSet, self).create(request, *args, **kwargs))
+
     def perform_create(self, serializer):
-        place = Place.objects.get(id=self.kwargs['place_id'])
-        current_cycle = _get_current_cycle(place.id)
-        if not current_cycle:
+        place = serializer.context.get('place')
+        if place is None:
+            raise Http404('Place not found')
+        if not serializer.context.get('current_cycle'):
             from rest_framework.exceptions import ValidationError
             raise ValidationError({'cycle': 'No open cycle. Start a new cycle first from the Summary tab.'})
+        # One membership read validates payer/splits and addresses the notification fan-out.
+        member_ids = set(place.members.values_list('user_id', flat=True))
+        serializer.context['member_ids'] = member_ids
+        with transaction.atomic():
+            self._create_expense(serializer, place, member_ids)
+        self._reload_for_response(serializer)
+
+    def _create_expense(self, serializer, place, member_ids):
         expense = serializer.save(place=place)
 
         _log_activity(
@@ -601,6 +746,7 @@ class ExpenseViewSet(ModelViewSet):
             place=place, expense=expense,
             amount=expense.amount, description=expense.description,
         )
+        publish_change('expense', place.id)
 
         # Notifications: create a lightweight notification for other members
         actor = self.request.user
@@ -612,18 +758,17 @@ class ExpenseViewSet(ModelViewSet):
             'expense_id': expense.id,
             'amount': float(expense.amount),
         }
-        member_ids = list(place.members.exclude(user=actor).values_list('user_id', flat=True))
-        Notification.objects.bulk_create([
-            Notification(
-                user_id=uid,
-                place=place,
-                type=Notification.TYPE_EXPENSE_ADDED,
-                title=title,
-                message=msg,
-                data=data,
-            )
-            for uid in member_ids
-        ])
+        # Bursts (e.g. a stack of receipts) merge into one "N new expenses" row per member.
+        coalesce_notifications(
+            member_ids - {actor.id},
+            place=place,
+            type=Notification.TYPE_EXPENSE_ADDED,
+            title=title,
+            burst_title=f"{{count}} new expenses in {place.name}",
+            message=msg,
+            data=data,
+            window_seconds=getattr(django_settings, 'NOTIFICATION_COALESCE_WINDOW_SECONDS', 0),
+        )
 
 
 # ----- Invites -----
@@ -637,7 +782,7 @@ class PlaceInviteViewSet(ModelViewSet):
         place_id = self.kwargs.get('place_id')
         if not place_id:
             return PlaceInvite.objects.none()
-        if not PlaceMember.objects.filter(place_id=place_id, user=self.request.user).exists():
+        if not is_place_member(self.request, place_id):
             return PlaceInvite.objects.none()
         # Only show email invites in the list; link-only invites are not shown as "pending"
         return PlaceInvite.objects.filter(
@@ -647,7 +792,7 @@ class PlaceInviteViewSet(ModelViewSet):
 
     def perform_create(self, serializer):
         place = Place.objects.get(id=self.kwargs['place_id'])
-        if not place.members.filter(user=self.request.user, role=PlaceMember.ROLE_OWNER).exists():
+        if not is_place_member(self.request, place.id, role=PlaceMember.ROLE_OWNER):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('Only the place owner can send invites.')
         email = serializer.validated_data.get('email') or None
@@ -697,13 +842,15 @@ def join_place(request, token):
         return Response({'error': 'You are already a member of this place.'}, status=status.HTTP_400_BAD_REQUEST)
 
     PlaceMember.objects.get_or_create(place=invite.place, user=request.user, defaults={'role': PlaceMember.ROLE_MEMBER})
+    bump_membership_version([request.user.id])
     invite.status = PlaceInvite.STATUS_ACCEPTED
     invite.save(update_fields=['status'])
 
     _log_activity(request, ActivityLog.TYPE_PLACE_JOINED, place=invite.place, description=invite.place.name)
+    publish_change('member', invite.place.id, user_ids=[request.user.id])
 
     # Notification: welcome message for the joiner
-    Notification.objects.create(
+    create_notification(
         user=request.user,
         place=invite.place,
         type=Notification.TYPE_WELCOME,
@@ -732,10 +879,11 @@ def join_place(request, token):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def notifications_list(request):
-    """List notifications for the current user (newest first)."""
+    """List notifications for the current user (newest first). unread_count comes from NotificationCounter."""
     qs = Notification.objects.filter(user=request.user).select_related('place').order_by('-created_at')
-    unread_count = qs.filter(is_read=False).count()
+    unread_count = get_unread_count(request.user)
     # simple pagination via ?limit=
     limit = request.query_params.get('limit')
     try:
@@ -753,8 +901,7 @@ def notifications_list(request):
 @permission_classes([IsAuthenticated])
 def notifications_mark_all_read(request):
     """Mark all notifications as read for the current user."""
-    now = timezone.now()
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True, read_at=now)
+    mark_all_notifications_read(request.user)
     return Response({'detail': 'ok'})
 
 
@@ -762,11 +909,80 @@ def notifications_mark_all_read(request):
 @permission_classes([IsAuthenticated])
 def notifications_mark_read(request, notification_id):
     """Mark a single notification as read for the current user."""
-    now = timezone.now()
-    Notification.objects.filter(user=request.user, id=notification_id).update(is_read=True, read_at=now)
+    mark_notification_read(request.user, notification_id)
     return Response({'detail': 'ok'})
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def event_stream_ticket(request):
+    """
+    POST /api/events/ticket/
+    Single-use ticket for opening the event stream: ``{"ticket": "...", "expires_in": 30}``.
+    Connect to /api/events/?ticket=<ticket> before it expires; reconnects need a new one.
+    """
+    ticket, ttl = issue_stream_ticket(request.user)
+    return Response({'ticket': ticket, 'expires_in': ttl})
+
+
+def _event_stream_channels(ticket):
+    """Redeem the stream ticket and return the channels its user may follow, or None."""
+    user = redeem_stream_ticket(ticket)
+    if user is None:
+        return None
+    place_ids = PlaceMember.objects.filter(user=user).values_list('place_id', flat=True)
+    return [user_channel(user.id)] + [place_channel(pid) for pid in place_ids]
+
+
+async def event_stream(request):
+    """
+    GET /api/events/?ticket=<ticket from POST /api/events/ticket/>
+    Server-Sent Events stream of change events for the current user's places and notifications:
+
+        event: change
+        data: {"place_id": 3, "entity": "expense", "version": 42}
+
+    Clients refetch the affected resource on each event instead of polling. Auth happens
+    once at connect with a single-use ticket (EventSource cannot send headers, and an access
+    token in the URL would end up in logs). Membership changes are announced on the user channel; reconnect to
+    pick up new places. Requires an ASGI server (see equilo/asgi.py).
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Live updates need the ASGI server; keep polling.'},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+    ticket = request.GET.get('ticket') or ''
+    if not ticket:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    channels = await sync_to_async(_event_stream_channels)(ticket)
+    if channels is None:
+        return JsonResponse({'detail': 'Stream ticket is invalid, expired or already used.'}, status=401)
+
+    heartbeat = getattr(django_settings, 'REALTIME_HEARTBEAT_SECONDS', 15)
+
+    async def stream():
+        subscription = await get_broker().subscribe(channels)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                payload = await subscription.get(heartbeat)
+                if payload is None:
+                    # Comment line keeps proxies from closing an idle connection.
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: change\ndata: {payload}\n\n'
+        finally:
+            await subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def invite_by_token(request, token):
@@ -791,17 +1007,20 @@ def invite_by_token(request, token):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
+@rate_limit('payment_request')
 def request_payment(request, place_id):
     """
     Manual payment request from current user to another member in this place.
-    Enforced so that the same requester cannot notify the same member more than once every 12 hours.
+    Enforced so that the same requester cannot notify the same member more than once every 12 hours:
+    one PaymentRequestCooldown row per (requester, target, place), claimed with a conditional UPDATE.
     """
     try:
         place = Place.objects.get(id=place_id)
     except Place.DoesNotExist:
         return Response({'error': 'Place not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    if not PlaceMember.objects.filter(place=place, user=request.user).exists():
+    if not is_place_member(request, place.id):
         return Response({'error': 'Not a member of this place'}, status=status.HTTP_403_FORBIDDEN)
 
     target_id = request.data.get('user_id')
@@ -823,35 +1042,42 @@ def request_payment(request, place_id):
     if amount_owed <= 0:
         return Response({'error': 'This member does not owe you anything right now.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Enforce 12-hour cooldown per (requester, target, place) for manual payment requests.
-    window_start = timezone.now() - timedelta(hours=12)
-    recent_exists = Notification.objects.filter(
-        user_id=target_id,
-        place=place,
-        type=Notification.TYPE_PAYMENT_REQUEST,
-        data__kind='manual',
-        data__from_user_id=me.id,
-        created_at__gte=window_start,
-    ).exists()
-    if recent_exists:
-        return Response({'error': 'You can only send a payment request to this member once every 12 hours.'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
-
     actor_name = (getattr(getattr(me, 'profile', None), 'display_name', None) or '').strip() or me.username
     title = f'Payment request from {actor_name}'
     message = f'Requested payment for {place.name}.'
-    Notification.objects.create(
-        user_id=target_id,
-        place=place,
-        type=Notification.TYPE_PAYMENT_REQUEST,
-        title=title,
-        message=message,
-        data={
-            'kind': 'manual',
-            'from_user_id': me.id,
-            'place_id': place.id,
-            'amount': float(amount_owed),
-        },
-    )
+    # Enforce 12-hour cooldown per (requester, target, place) for manual payment requests.
+    now = timezone.now()
+    with transaction.atomic():
+        cooldown, created = PaymentRequestCooldown.objects.get_or_create(
+            requester=me, target_id=target_id, place=place, defaults={'last_sent_at': now},
+        )
+        # Claimed only if the last request is older than the cooldown; concurrent claims
+        # serialize on the row and all but one update nothing.
+        if not created and not PaymentRequestCooldown.objects.filter(
+            pk=cooldown.pk, last_sent_at__lte=now - PaymentRequestCooldown.COOLDOWN,
+        ).update(last_sent_at=now):
+            last_sent = PaymentRequestCooldown.objects.values_list('last_sent_at', flat=True).get(pk=cooldown.pk)
+            wait = (last_sent + PaymentRequestCooldown.COOLDOWN - now).total_seconds()
+            response = Response(
+                {'error': 'You can only send a payment request to this member once every 12 hours.'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+            response['Retry-After'] = str(max(1, int(wait)))
+            return response
+        # Same transaction: if the notification fails, the cooldown is not consumed.
+        create_notification(
+            user_id=target_id,
+            place=place,
+            type=Notification.TYPE_PAYMENT_REQUEST,
+            title=title,
+            message=message,
+            data={
+                'kind': 'manual',
+                'from_user_id': me.id,
+                'place_id': place.id,
+                'amount': float(amount_owed),
+            },
+        )
     try:
         target_user = User.objects.filter(id=target_id).select_related('profile').first()
         if target_user is not None:
@@ -886,7 +1112,7 @@ def remove_member(request, place_id):
     except Place.DoesNotExist:
         return Response({'error': 'Place not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    if not PlaceMember.objects.filter(place=place, user=request.user, role=PlaceMember.ROLE_OWNER).exists():
+    if not is_place_member(request, place.id, role=PlaceMember.ROLE_OWNER):
         return Response({'error': 'Only the place owner can remove members'}, status=status.HTTP_403_FORBIDDEN)
 
     target_id = request.data.get('user_id')
@@ -916,6 +1142,7 @@ def remove_member(request, place_id):
         )
 
     target_membership.delete()
+    bump_membership_version([target_user.id])
     _log_activity(
         request,
         ActivityLog.TYPE_MEMBER_REMOVED,
@@ -923,6 +1150,7 @@ def remove_member(request, place_id):
         target_user=target_user,
         description=f'Removed {_safe_display_name(target_user) or target_user.username} from the place',
     )
+    publish_change('member', place.id, user_ids=[target_user.id])
     return Response({'detail': 'Member removed'})
 
 
@@ -957,12 +1185,16 @@ def leave_place(request, place_id):
         )
 
     membership.delete()
+    bump_membership_version([request.user.id])
     _log_activity(request, ActivityLog.TYPE_PLACE_LEFT, place=place, description=f'Left {place.name}')
+    publish_change('member', place.id, user_ids=[request.user.id])
     return Response({'detail': 'You have left the place'})
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([SettlementThrottle])
+@idempotent
 def settlement_create(request):
     """
     POST /api/settlements/
@@ -1001,7 +1233,7 @@ def settlement_create(request):
     except Place.DoesNotExist:
         return Response({'error': 'Place not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    if not PlaceMember.objects.filter(place=place, user=me).exists():
+    if not is_place_member(request, place.id):
         return Response({'error': 'Not a member of this place'}, status=status.HTTP_403_FORBIDDEN)
     if not PlaceMember.objects.filter(place=place, user_id=from_user_id).exists():
         return Response({'error': 'Payer is not a member of this place'}, status=status.HTTP_400_BAD_REQUEST)
@@ -1096,6 +1328,7 @@ def settlement_create(request):
         place=place, target_user=settlement.to_user, amount=settlement.amount,
         description=note or f"Settled {settlement.amount}",
     )
+    publish_change('settlement', place.id)
     return Response({
         'id': settlement.id,
         'place_id': settlement.place_id,
@@ -1108,14 +1341,196 @@ def settlement_create(request):
     }, status=status.HTTP_201_CREATED)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@rate_limit('expense_import')
+def expense_import(request, place_id):
+    """
+    POST /api/places/<id>/expenses/import/
+    Bulk-add expenses to the place's open cycle from CSV or NDJSON (see import_utils for columns).
+    Send a multipart `file`, or the raw body with Content-Type text/csv / application/x-ndjson.
+    ?dry_run=1 validates without inserting. Valid rows are imported even if others fail.
+    Returns {imported, failed, errors: [{row, errors}], truncated}.
+    """
+    if not is_place_member(request, place_id):
+        return Response({'error': 'Not a member of this place'}, status=status.HTTP_403_FORBIDDEN)
+    place = Place.objects.filter(id=place_id).first()
+    if not place:
+        return Response({'error': 'Place not found'}, status=status.HTTP_404_NOT_FOUND)
+    cycle = _get_current_cycle(place.id)
+    if not cycle:
+        return Response({'cycle': 'No open cycle. Start a new cycle first from the Summary tab.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    content_type = request.content_type or ''
+    if content_type.startswith('multipart/'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        stream, fmt = upload, detect_format(upload.name, upload.content_type)
+    else:
+        stream, fmt = request.stream, detect_format('', content_type)
+        if stream is None:
+            return Response({'error': 'Empty upload'}, status=status.HTTP_400_BAD_REQUEST)
+
+    dry_run = request.query_params.get('dry_run') in ('1', 'true', 'yes')
+    try:
+        result = import_expenses(
+            stream,
+            fmt,
+            place_id=place.id,
+            cycle_id=cycle.id,
+            user_id=request.user.id,
+            max_rows=getattr(django_settings, 'EXPENSE_IMPORT_MAX_ROWS', 10000),
+            dry_run=dry_run,
+        )
+    except (UnicodeDecodeError, csv.Error) as exc:
+        return Response({'error': f'Could not read upload: {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if result['imported'] and not dry_run:
+        count = f"{result['imported']} expense{'' if result['imported'] == 1 else 's'}"
+        invalidate_cycle_summary(place.id, cycle.id)
+        _log_activity(
+            request, ActivityLog.TYPE_EXPENSE_ADDED,
+            place=place, description=f"Imported {count}",
+            extra={'import': True, 'count': result['imported']},
+        )
+        publish_change('expense', place.id)
+        actor_name = _safe_display_name(request.user) or request.user.username
+        bulk_create_notifications([
+            Notification(
+                user_id=uid,
+                place=place,
+                type=Notification.TYPE_EXPENSE_ADDED,
+                title=f"{count} imported into {place.name}",
+                message=f"{actor_name} imported {count}",
+                data={'place_id': place.id, 'import': True, 'count': result['imported']},
+            )
+            for uid in place.members.exclude(user=request.user).values_list('user_id', flat=True)
+        ])
+    return Response(result)
+
+
+_EXPENSE_BULK_OPS = ('delete', 'set_category', 'set_paid_by', 'set_splits')
+_EXPENSE_BULK_MAX_IDS = 1000
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def expense_bulk(request, place_id):
+    """
+    POST /api/places/<id>/expenses/bulk/
+    Body: { "ids": [...], "op": "delete" | "set_category" | "set_paid_by" | "set_splits", "value": ... }
+      - set_category: category id or null
+      - set_paid_by: member user id
+      - set_splits: list of member user ids
+    Same rules as single edits (owner: any expense; others: expenses they added). Permitted ids
+    are changed with set-based UPDATE/DELETE in one transaction; the rest come back in `skipped`.
+    Returns { op, updated: [ids], skipped: [{id, reason}] }.
+    """
+    membership = get_membership(request, place_id)
+    if membership is None:
+        return Response({'error': 'Not a member of this place'}, status=status.HTTP_403_FORBIDDEN)
+
+    op = request.data.get('op')
+    if op not in _EXPENSE_BULK_OPS:
+        return Response({'error': f"op must be one of: {', '.join(_EXPENSE_BULK_OPS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    raw_ids = request.data.get('ids')
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return Response({'error': 'ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(raw_ids) > _EXPENSE_BULK_MAX_IDS:
+        return Response({'error': f'At most {_EXPENSE_BULK_MAX_IDS} ids per request'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw_ids))
+    except (TypeError, ValueError):
+        return Response({'error': 'ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    value = request.data.get('value')
+    update_fields = {}
+    split_ids = None
+    if op == 'set_category':
+        if value in (None, ''):
+            update_fields['category_id'] = None
+        else:
+            try:
+                category_id = int(value)
+            except (TypeError, ValueError):
+                category_id = None
+            if category_id is not None:
+                category_id = (
+                    ExpenseCategory.objects.filter(place_id=place_id, id=category_id).values_list('id', flat=True).first()
+                )
+            if category_id is None:
+                return Response({'error': 'Category not found in this place'}, status=status.HTTP_400_BAD_REQUEST)
+            update_fields['category_id'] = category_id
+    elif op in ('set_paid_by', 'set_splits'):
+        member_ids = set(PlaceMember.objects.filter(place_id=place_id).values_list('user_id', flat=True))
+        if op == 'set_paid_by':
+            try:
+                paid_by_id = int(value)
+            except (TypeError, ValueError):
+                paid_by_id = None
+            if paid_by_id not in member_ids:
+                return Response({'error': 'paid_by must be a member of this place'}, status=status.HTTP_400_BAD_REQUEST)
+            update_fields['paid_by_id'] = paid_by_id
+        else:
+            try:
+                split_ids = list(dict.fromkeys(int(uid) for uid in (value or [])))
+            except (TypeError, ValueError):
+                split_ids = []
+            if not split_ids or not set(split_ids) <= member_ids:
+                return Response({'error': 'value must be a non-empty list of member user ids'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # One read decides every permission: owners may touch anything, others only what they added.
+    rows = dict(
+        Expense.objects.filter(place_id=place_id, id__in=ids).values_list('id', 'added_by_id')
+    )
+    is_owner = membership.role == PlaceMember.ROLE_OWNER
+    allowed, skipped = [], []
+    for expense_id in ids:
+        if expense_id not in rows:
+            skipped.append({'id': expense_id, 'reason': 'not_found'})
+        elif not is_owner and rows[expense_id] != request.user.id:
+            skipped.append({'id': expense_id, 'reason': 'forbidden'})
+        else:
+            allowed.append(expense_id)
+    if not allowed:
+        return Response({'op': op, 'updated': [], 'skipped': skipped})
+
+    targets = Expense.objects.filter(place_id=place_id, id__in=allowed)
+    cycle_ids = set(targets.exclude(cycle_id=None).values_list('cycle_id', flat=True))
+    with transaction.atomic():
+        if op == 'delete':
+            targets.delete()
+        elif split_ids is not None:
+            ExpenseSplit.objects.filter(expense_id__in=allowed).exclude(user_id__in=split_ids).delete()
+            ExpenseSplit.objects.bulk_create(
+                [ExpenseSplit(expense_id=eid, user_id=uid) for eid in allowed for uid in split_ids],
+                ignore_conflicts=True,
+            )
+        else:
+            targets.update(**update_fields)
+        _log_activity(
+            request,
+            ActivityLog.TYPE_EXPENSE_DELETED if op == 'delete' else ActivityLog.TYPE_EXPENSE_EDITED,
+            place=Place(id=place_id),
+            description=f"{'Deleted' if op == 'delete' else 'Edited'} {len(allowed)} expense{'' if len(allowed) == 1 else 's'}",
+            extra={'bulk': True, 'op': op, 'count': len(allowed), 'expense_ids': allowed},
+        )
+        publish_change('expense', place_id)
+    for cycle_id in cycle_ids:
+        invalidate_cycle_summary(place_id, cycle_id)
+    return Response({'op': op, 'updated': allowed, 'skipped': skipped})
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def settlement_list(request, place_id):
     """
     GET /api/places/<place_id>/settlements/
     Returns settlement history for the place (newest first).
     """
-    if not PlaceMember.objects.filter(place_id=place_id, user=request.user).exists():
+    if not is_place_member(request, place_id):
         return Response({'error': 'Not a member of this place'}, status=status.HTTP_403_FORBIDDEN)
     settlements = (
         Settlement.objects.filter(place_id=place_id)
@@ -1149,6 +1564,7 @@ def _get_current_cycle(place_id):
     )
 
 
+@method_decorator(replica_reads, name='list')
 class CycleListCreate(generics.ListCreateAPIView):
     """GET list cycles for place; POST create (start) a new cycle."""
     serializer_class = ExpenseCycleSerializer
@@ -1156,7 +1572,7 @@ class CycleListCreate(generics.ListCreateAPIView):
 
     def get_queryset(self):
         place_id = self.kwargs.get('place_id')
-        if not place_id or not PlaceMember.objects.filter(place_id=place_id, user=self.request.user).exists():
+        if not place_id or not is_place_member(self.request, place_id):
             return ExpenseCycle.objects.none()
         return ExpenseCycle.objects.filter(place_id=place_id).order_by('-start_date')
 
@@ -1172,7 +1588,7 @@ class CycleListCreate(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         place = self.kwargs.get('place_id') and Place.objects.filter(id=self.kwargs['place_id']).first()
-        if not place or not place.members.filter(user=self.request.user).exists():
+        if not place or not is_place_member(self.request, place.id):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('Not a member of this place.')
         if place.created_by_id != self.request.user.id:
@@ -1185,6 +1601,7 @@ class CycleListCreate(generics.ListCreateAPIView):
                 'then settle up and resolve it before starting a new cycle.'
             )
         serializer.save(place=place)
+        publish_change('cycle', place.id)
 
 
 @api_view(['POST'])
@@ -1195,7 +1612,7 @@ def cycle_resolve(request, place_id, pk):
     Only allowed when cycle is PENDING_SETTLEMENT and all balances are zero.
     """
     place = Place.objects.filter(id=place_id).first()
-    if not place or not PlaceMember.objects.filter(place_id=place_id, user=request.user).exists():
+    if not place or not is_place_member(request, place_id):
         return Response({'error': 'Not a member'}, status=status.HTTP_403_FORBIDDEN)
     if place.created_by_id != request.user.id:
         return Response({'error': 'Only the person who created the place can resolve a cycle.'}, status=status.HTTP_403_FORBIDDEN)
@@ -1212,6 +1629,7 @@ def cycle_resolve(request, place_id, pk):
     cycle.status = ExpenseCycle.STATUS_RESOLVED
     cycle.resolved_at = timezone.now()
     cycle.save(update_fields=['status', 'resolved_at'])
+    publish_change('cycle', place.id)
     return Response(ExpenseCycleSerializer(cycle).data)
 
 
@@ -1220,7 +1638,7 @@ def cycle_resolve(request, place_id, pk):
 def cycle_reopen(request, place_id, pk):
     """Reopen a resolved cycle (undo). Only the place creator; only when there is no open or pending cycle."""
     place = Place.objects.filter(id=place_id).first()
-    if not place or not PlaceMember.objects.filter(place_id=place_id, user=request.user).exists():
+    if not place or not is_place_member(request, place_id):
         return Response({'error': 'Not a member'}, status=status.HTTP_403_FORBIDDEN)
     if place.created_by_id != request.user.id:
         return Response(
@@ -1248,6 +1666,7 @@ def cycle_reopen(request, place_id, pk):
     cycle.status = ExpenseCycle.STATUS_OPEN
     cycle.resolved_at = None
     cycle.save(update_fields=['status', 'resolved_at'])
+    publish_change('cycle', place.id)
     return Response(ExpenseCycleSerializer(cycle).data)
 
 
@@ -1379,13 +1798,14 @@ def _compute_balance_from_expenses(expenses, me):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def place_summary(request, place_id):
     """
     GET /api/places/<id>/summary/?period=weekly|fortnightly&from=YYYY-MM-DD
     GET /api/places/<id>/summary/?cycle_id=<id>  (cycle-based; returns cycle stats)
     Returns: period/cycle stats, previous period total for comparison, by_member_balance list.
     """
-    if not PlaceMember.objects.filter(place_id=place_id, user=request.user).exists():
+    if not is_place_member(request, place_id):
         return Response({'error': 'Not a member'}, status=status.HTTP_403_FORBIDDEN)
     me = request.user
     cycle_id_param = request.query_params.get('cycle_id')
@@ -1663,10 +2083,19 @@ def _cycle_all_settled(place_id, cycle):
     return True
 
 
-def _send_cycle_ended_notifications(place, cycle):
+def cycle_ended_email_renderer():
+    """Batch renderer for cycle-ended emails; create one per transition run and share it."""
+    return BatchEmailRenderer('cycle_ended', blocks={'balance_block': '_cycle_ended_balances'})
+
+
+def _send_cycle_ended_notifications(place, cycle, renderer=None):
     """
     After a cycle is resolved, create a notification for each member with their
     settlement summary. Tapping opens place Summary tab to settle up.
+    Emails are rendered once per place by *renderer* (see cycle_ended_email_renderer)
+    and only the per-member parts are filled in. Called inside the transaction that
+    flips the cycle's status: outbox rows are written in it (and roll back with it),
+    while direct SMTP sends wait until it commits.
     """
     period_label = f"{cycle.start_date.strftime('%b %d')} – {cycle.end_date.strftime('%b %d')}"
     title = f"Cycle ended: {place.name} ({period_label})"
@@ -1674,19 +2103,35 @@ def _send_cycle_ended_notifications(place, cycle):
         f"{getattr(django_settings, 'FRONTEND_URL', '').rstrip('/')}"
         f"/places/{place.id}?tab=summary&settle=1"
     )
-    for member in place.members.select_related('user', 'user__profile'):
-        user = member.user
+    members = list(place.members.select_related('user', 'user__profile'))
+    summaries = {}
+    for member in members:
         try:
-            _, _, _, balance_with = _compute_cycle_summary(place.id, user, cycle)
+            summaries[member.user_id] = _compute_cycle_summary(place.id, member.user, cycle)[3]
         except Exception:
-            balance_with = {}
+            summaries[member.user_id] = {}
+    # Counterparty names: current members are already loaded; anyone who has left costs one query.
+    names = {m.user_id: _safe_display_name(m.user) or m.user.username for m in members}
+    former = {uid for balances in summaries.values() for uid in balances} - names.keys()
+    if former:
+        for other in User.objects.filter(id__in=former).select_related('profile'):
+            names[other.id] = _safe_display_name(other) or other.username
+    renderer = renderer or cycle_ended_email_renderer()
+    skeleton = renderer.skeleton(title, {
+        'place': place,
+        'cycle': cycle,
+        'period_label': period_label,
+        'deep_link': deep_link,
+    })
+    for member in members:
+        user = member.user
+        balance_with = summaries[member.user_id]
         parts = []
         balance_lines = []
         for other_uid, bal in balance_with.items():
             if bal == 0:
                 continue
-            other = User.objects.filter(id=other_uid).select_related('profile').first()
-            other_name = _safe_display_name(other) or (other.username if other else f"User {other_uid}")
+            other_name = names.get(other_uid) or f"User {other_uid}"
             if bal > 0:
                 parts.append(f"You owe ${bal:.2f} to {other_name}")
                 balance_lines.append(f"You owe ${bal:.2f} to {other_name}")
@@ -1698,7 +2143,7 @@ def _send_cycle_ended_notifications(place, cycle):
             message = " ".join(parts) + message
         else:
             message = f"Cycle {period_label} closed." + message
-        Notification.objects.create(
+        create_notification(
             user=user,
             place=place,
             type=Notification.TYPE_CYCLE_ENDED,
@@ -1710,21 +2155,18 @@ def _send_cycle_ended_notifications(place, cycle):
                 'open_settlement': True,
             },
         )
-        try:
-            send_transactional_email(
-                user,
-                template_name='cycle_ended',
-                subject=title,
-                ctx={
-                    'place': place,
-                    'cycle': cycle,
-                    'period_label': period_label,
-                    'balance_lines': balance_lines,
-                    'deep_link': deep_link,
-                },
-            )
-        except Exception:
-            logger.warning('cycle_ended email dispatch failed', exc_info=True)
+        send = functools.partial(_send_cycle_ended_email, renderer, skeleton, user, balance_lines)
+        if outbox_enabled():
+            send()
+        else:
+            transaction.on_commit(send)
+
+
+def _send_cycle_ended_email(renderer, skeleton, user, balance_lines):
+    try:
+        renderer.send(skeleton, user, {'balance_lines': balance_lines})
+    except Exception:
+        logger.warning('cycle_ended email dispatch failed', exc_info=True)
 
 
 def _activity_item_from_log(request, log):
@@ -1752,12 +2194,38 @@ def _activity_item_from_log(request, log):
     return item
 
 
+def _encode_activity_cursor(log):
+    """Opaque keyset cursor for the activity feed: position after this (created_at, id)."""
+    raw = f"{log.created_at.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_activity_cursor(cursor):
+    """Return (created_at, id) from a cursor produced by _encode_activity_cursor, or None if invalid."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        ts_raw, id_raw = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+        created_at = datetime.fromisoformat(ts_raw)
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at, dt_utc.utc)
+        return created_at, int(id_raw)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def activity_list(request):
     """
-    GET /api/activity/?limit=50
+    GET /api/activity/?limit=50&cursor=<next_cursor>
     Returns activity for the current user: expenses, places, joins, settlements, profile/password changes.
+
+    Served from ActivityLog alone, newest first, with keyset pagination on
+    (created_at, id): pass the returned ``next_cursor`` to load the next page.
+    ``next_cursor`` is null on the last page.
     """
     me = request.user
     my_place_ids = list(
@@ -1768,65 +2236,39 @@ def activity_list(request):
         limit = min(int(request.query_params.get('limit', 50)), 200)
     except ValueError:
         limit = 50
-
-    activity = []
-
-    # Legacy: expenses and places (for backward compat; new ones also in ActivityLog)
-    if my_place_ids:
-        expenses_qs = (
-            Expense.objects.filter(place_id__in=my_place_ids)
-            .select_related('place', 'paid_by', 'added_by', 'added_by__profile', 'paid_by__profile')
-            .order_by('-created_at')[: limit + 50]
-        )
-        for e in expenses_qs:
-            added_by = e.added_by or e.paid_by
-            display_name = _safe_display_name(added_by) or getattr(added_by, 'username', '') or ''
-            activity.append({
-                'type': 'expense_added',
-                'id': e.id,
-                'created_at': e.created_at.isoformat(),
-                'description': e.description,
-                'amount': float(e.amount),
-                'place_id': e.place_id,
-                'place_name': e.place.name,
-                'user_id': added_by.id,
-                'user_display_name': display_name or added_by.username,
-                'user_profile_photo': _profile_photo_url(request, added_by),
-            })
-        places_created = Place.objects.filter(
-            created_by=me, id__in=my_place_ids
-        ).order_by('-created_at')[:limit]
-        for p in places_created:
-            activity.append({
-                'type': 'place_created',
-                'id': p.id,
-                'created_at': p.created_at.isoformat(),
-                'place_id': p.id,
-                'place_name': p.name,
-                'user_id': me.id,
-                'user_display_name': _safe_display_name(me) or me.username,
-                'user_profile_photo': _profile_photo_url(request, me),
-            })
-
-    # ActivityLog: expense_edited, expense_deleted, place_joined, settlement, profile_updated, password_changed (expense_added/place_created come from legacy above)
-    log_qs = (
-        ActivityLog.objects.filter(
-            (Q(place_id__in=my_place_ids) | Q(place__isnull=True, user=me))
-            & ~Q(type__in=[ActivityLog.TYPE_EXPENSE_ADDED, ActivityLog.TYPE_PLACE_CREATED])
+    limit = max(1, limit)
+
+    cursor_param = request.query_params.get('cursor')
+    position = _decode_activity_cursor(cursor_param)
+    if cursor_param and position is None:
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+    log_qs = ActivityLog.objects.filter(
+        Q(place_id__in=my_place_ids) | Q(place__isnull=True, user=me)
+    ).exclude(
+        # As before the feed moved to ActivityLog: a place's creation shows only for its creator.
+        Q(type=ActivityLog.TYPE_PLACE_CREATED) & ~Q(user=me)
+    )
+    if position is not None:
+        created_at, log_id = position
+        log_qs = log_qs.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=log_id)
         )
-        .select_related('place', 'user', 'user__profile', 'target_user', 'target_user__profile', 'expense')
-        .order_by('-created_at')[: limit + 100]
+    # One extra row tells us whether another page exists without a COUNT.
+    logs = list(
+        log_qs.select_related('place', 'user', 'user__profile', 'target_user', 'target_user__profile')
+        .order_by('-created_at', '-id')[: limit + 1]
     )
-    for log in log_qs:
-        activity.append(_activity_item_from_log(request, log))
-
-    activity.sort(key=lambda x: x['created_at'], reverse=True)
-    results = activity[:limit]
-    return Response({'results': results})
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    results = [_activity_item_from_log(request, log) for log in logs]
+    next_cursor = _encode_activity_cursor(logs[-1]) if has_more and logs else None
+    return Response({'results': results, 'next_cursor': next_cursor})
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def dashboard(request):
     """
     GET /api/dashboard/
@@ -1847,12 +2289,7 @@ def dashboard(request):
         PlaceMember.objects.filter(user=me).values_list('place_id', flat=True)
     )
     # Only count manual payment requests (from the "Request payment" form), not expense-added etc.
-    payment_requests_pending = Notification.objects.filter(
-        user=me,
-        type=Notification.TYPE_PAYMENT_REQUEST,
-        data__kind='manual',
-        is_read=False,
-    ).count()
+    payment_requests_pending = get_unread_count(me, f"{Notification.TYPE_PAYMENT_REQUEST}:manual")
     if not my_place_ids:
         return Response({
             'this_month': {
@@ -2043,6 +2480,19 @@ def email_unsubscribe(request, token):
     )
 
 
+def _cron_auth_error(request):
+    """Return an error Response when a cron call is not authorised, else None."""
+    expected = (getattr(django_settings, 'CRON_SECRET', '') or '').strip()
+    if not expected:
+        return Response(
+            {'error': 'CRON_SECRET is not configured on the server'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    if not _cron_secret_ok(request):
+        return Response({'error': 'unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
+    return None
+
+
 def _cron_secret_ok(request) -> bool:
     """
     Validate the shared secret for cron endpoints.
@@ -2062,6 +2512,7 @@ def _cron_secret_ok(request) -> bool:
 
 
 @api_view(['GET', 'POST'])
+@authentication_classes([])  # CRON_SECRET bearer is not a JWT
 @permission_classes([AllowAny])
 def cron_transition_cycles(request):
     """
@@ -2071,16 +2522,122 @@ def cron_transition_cycles(request):
     Replaces the Celery Beat schedule in production (Vercel cannot run a
     persistent worker). Local dev can either hit this endpoint manually or
     keep using ``celery -A equilo beat``; both call the same body.
+
+    Runs within a time budget (?budget=<seconds>, at most CRON_TIME_BUDGET_SECONDS).
+    When places remain, the response has ``more: true`` and a ``continuation``
+    token; the next call resumes from ?continuation=... or, without one, from the
+    cursor persisted for today's run.
     """
-    expected = (getattr(django_settings, 'CRON_SECRET', '') or '').strip()
-    if not expected:
-        return Response(
-            {'error': 'CRON_SECRET is not configured on the server'},
-            status=status.HTTP_503_SERVICE_UNAVAILABLE,
-        )
-    if not _cron_secret_ok(request):
-        return Response({'error': 'unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
+    error = _cron_auth_error(request)
+    if error is not None:
+        return error
 
+    from .cron_utils import budget_from_request, decode_continuation, encode_continuation, load_cursor, save_cursor
     from .tasks import transition_pending_cycles
-    result = transition_pending_cycles()
+
+    job, run = 'transition_cycles', timezone.now().date().isoformat()
+    token = request.query_params.get('continuation')
+    after = decode_continuation(token, job, run) if token else load_cursor(job, run)
+    result = transition_pending_cycles(budget=budget_from_request(request), after_place_id=after)
+    cursor = result.pop('cursor')
+    save_cursor(job, run, cursor)
+    result['continuation'] = encode_continuation(job, run, cursor) if result['more'] else None
+    return Response(result)
+
+
+@api_view(['GET', 'POST'])
+@authentication_classes([])  # CRON_SECRET bearer is not a JWT
+@permission_classes([AllowAny])
+def cron_drain_activity_log(request):
+    """
+    Drain the Redis activity-log spool (ACTIVITY_LOG_SPOOL_URL) into ActivityLog in
+    batches. Same body as the ``drain_activity_log_spool`` Celery task; no-op when
+    spooling is off. Stops starting batches once the time budget (?budget=) is
+    spent; ``more`` is true while entries remain.
+    """
+    error = _cron_auth_error(request)
+    if error is not None:
+        return error
+
+    from .activity_utils import drain_activity_spool
+    from .cron_utils import budget_from_request
+
+    result = drain_activity_spool(budget=budget_from_request(request))
+    result['more'] = result.get('remaining', 0) > 0
+    return Response(result)
+
+
+@api_view(['GET', 'POST'])
+@authentication_classes([])  # CRON_SECRET bearer is not a JWT
+@permission_classes([AllowAny])
+def cron_drain_email_outbox(request):
+    """
+    Send queued transactional email (EMAIL_OUTBOX_ENABLED) in batches over one
+    connection per batch. Same body as the ``drain_email_outbox`` Celery task;
+    honours the cron time budget (?budget=) and reports ``more`` while due rows remain.
+    """
+    error = _cron_auth_error(request)
+    if error is not None:
+        return error
+
+    from .cron_utils import budget_from_request
+    from .outbox_utils import drain_email_outbox
+
+    result = drain_email_outbox(budget=budget_from_request(request))
+    result['more'] = result['remaining'] > 0
     return Response(result)
+
+
+@api_view(['GET', 'POST'])
+@authentication_classes([])  # CRON_SECRET bearer is not a JWT
+@permission_classes([AllowAny])
+def cron_send_digests(request):
+    """
+    Daily: send daily/weekly notification digests to users who are due (see
+    api.digest_utils). Same body as the ``send_email_digests`` Celery task.
+    Honours the cron time budget (?budget=); repeat while ``more`` is true.
+    """
+    error = _cron_auth_error(request)
+    if error is not None:
+        return error
+
+    from .cron_utils import budget_from_request
+    from .digest_utils import send_digests
+
+    return Response(send_digests(budget=budget_from_request(request)))
+
+
+@api_view(['GET', 'POST'])
+@authentication_classes([])  # CRON_SECRET bearer is not a JWT
+@permission_classes([AllowAny])
+def cron_flush_session_touches(request):
+    """
+    Every minute: write buffered session last_used_at values with one bulk UPDATE
+    (SESSION_TOUCH_URL). Same body as the ``flush_session_touches`` Celery task;
+    no-op when touches are not buffered.
+    """
+    error = _cron_auth_error(request)
+    if error is not None:
+        return error
+
+    from .session_utils import flush_session_touches
+
+    return Response(flush_session_touches())
+
+
+@api_view(['GET', 'POST'])
+@authentication_classes([])  # CRON_SECRET bearer is not a JWT
+@permission_classes([AllowAny])
+def cron_process_profile_photos(request):
+    """
+    Every few minutes: render variants for profile photos still pending (web
+    process restarted mid-resize, pool errors, pre-existing photos). Same body
+    as the ``process_pending_profile_photos`` Celery task. Honours ?budget=.
+    """
+    error = _cron_auth_error(request)
+    if error is not None:
+        return error
+
+    from .cron_utils import budget_from_request
+
+    return Response(photo_utils.process_pending_photos(budget=budget_from_request(request)))
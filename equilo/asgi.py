@@ -1,5 +1,10 @@
 """
 ASGI config for equilo project.
+
+Serves the regular API plus the long-lived Server-Sent Events stream at
+/api/events/ (async view; needs an ASGI server, e.g.
+``uvicorn equilo.asgi:application``). The WSGI entry point used on Vercel
+answers /api/events/ with 501 so clients fall back to polling.
 """
 
 import os
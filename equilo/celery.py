@@ -17,6 +17,26 @@ app.conf.beat_schedule = {
         'task': 'api.tasks.auto_transition_past_cycles_to_pending',
         'schedule': crontab(hour=0, minute=5),
     },
+    'drain-activity-log-spool': {
+        'task': 'api.tasks.drain_activity_log_spool',
+        'schedule': crontab(minute='*'),
+    },
+    'drain-email-outbox': {
+        'task': 'api.tasks.drain_email_outbox',
+        'schedule': crontab(minute='*'),
+    },
+    'send-email-digests': {
+        'task': 'api.tasks.send_email_digests',
+        'schedule': crontab(hour=7, minute=0),
+    },
+    'process-pending-profile-photos': {
+        'task': 'api.tasks.process_pending_profile_photos',
+        'schedule': crontab(minute='*/5'),
+    },
+    'flush-session-touches': {
+        'task': 'api.tasks.flush_session_touches',
+        'schedule': crontab(minute='*'),
+    },
     'cleanup-expired-sessions': {
         'task': 'api.tasks.cleanup_expired_sessions',
         'schedule': crontab(hour=3, minute=20),
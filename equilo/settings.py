@@ -74,6 +74,7 @@ def _middleware_list():
         'django.contrib.auth.middleware.AuthenticationMiddleware',
         'django.contrib.messages.middleware.MessageMiddleware',
         'django.middleware.clickjacking.XFrameOptionsMiddleware',
+        'api.middleware.ActivityLogBufferMiddleware',
     ])
     return m
 
@@ -103,16 +104,27 @@ WSGI_APPLICATION = 'equilo.wsgi.app'
 # Database - Supabase (PostgreSQL) when DATABASE_URL is set, else SQLite for local dev
 # Always set ENGINE explicitly so we never fall back to Django's dummy backend.
 DATABASE_URL = os.environ.get('DATABASE_URL', '').strip()
+# Connection handling (api/db_utils.py): "serverless" (PgBouncer transaction-mode safe, a
+# connection per request; default on Vercel and for the port-6543 pooler), "pool" (psycopg 3
+# pool per worker process, for gunicorn on a direct/session connection; optional, needs
+# `pip install "psycopg[binary,pool]"` on top of requirements.txt) or "persistent".
+DB_CONNECTION_MODE = os.environ.get('DB_CONNECTION_MODE', '').strip().lower()
 if DATABASE_URL:
     import dj_database_url
-    _db = dj_database_url.config(
-        default=DATABASE_URL,
-        conn_max_age=600,
-        conn_health_checks=True,
-    )
+    from api.db_utils import apply_connection_mode, default_connection_mode
+
+    _db = dj_database_url.parse(DATABASE_URL)
     # Ensure ENGINE is always set (required; some envs may not set it)
     if not _db.get('ENGINE'):
         _db['ENGINE'] = 'django.db.backends.postgresql'
+    DB_CONNECTION_MODE = DB_CONNECTION_MODE or default_connection_mode(DATABASE_URL, bool(os.environ.get('VERCEL')))
+    _db_mode_options = {
+        'conn_max_age': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'pool_min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'pool_max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    }
+    _db = apply_connection_mode(_db, DB_CONNECTION_MODE, **_db_mode_options)
     DATABASES = {'default': _db}
 else:
     if os.environ.get('VERCEL'):
@@ -137,6 +149,25 @@ if 'default' not in DATABASES or not DATABASES['default'].get('ENGINE'):
         'Set DATABASE_URL (e.g. Supabase PostgreSQL URI) in your environment.'
     )
 
+# Read replica (api/db_router.py): heavy read-only views (dashboard, summary, activity, lists)
+# read from this database. After a user writes, or something in a place changes, that user /
+# place reads from the primary for REPLICA_STICKY_SECONDS (keep it above replica lag). The pins
+# live in the cache, so with several processes they need Redis.
+# Local test: cp db.sqlite3 db_replica.sqlite3 and DATABASE_REPLICA_URL=sqlite:///db_replica.sqlite3
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL', '').strip()
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '10'))
+if DATABASE_REPLICA_URL:
+    import dj_database_url
+
+    _replica = dj_database_url.parse(DATABASE_REPLICA_URL)
+    if DATABASE_URL:
+        _replica = apply_connection_mode(_replica, DB_CONNECTION_MODE, **_db_mode_options)
+    # Tests see the primary's data through the replica alias instead of a second test database.
+    _replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES['replica'] = _replica
+    DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+    MIDDLEWARE.append('api.middleware.ReplicaStickinessMiddleware')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -230,6 +261,16 @@ SIMPLE_JWT = {
     'TOKEN_REFRESH_SERIALIZER': 'api.jwt_serializers.EquiloTokenRefreshSerializer',
 }
 
+# Refresh-token blacklist: "db" (simplejwt token_blacklist tables) or "redis" (per-jti
+# keys expiring with the token; the refresh path skips the ever-growing tables).
+# LEGACY_BLOOM keeps tokens blacklisted in the DB before switching rejected, via an
+# in-process bloom filter so only bloom hits query BlacklistedToken.
+REFRESH_BLACKLIST_BACKEND = os.environ.get('REFRESH_BLACKLIST_BACKEND', 'db').strip().lower()
+REFRESH_BLACKLIST_URL = (
+    os.environ.get('REFRESH_BLACKLIST_URL') or os.environ.get('REDIS_URL') or os.environ.get('CELERY_BROKER_URL') or ''
+).strip()
+REFRESH_BLACKLIST_LEGACY_BLOOM = os.environ.get('REFRESH_BLACKLIST_LEGACY_BLOOM', '1').lower() in ('1', 'true', 'yes')
+
 # HttpOnly refresh cookie (set by login/register/refresh responses)
 REFRESH_TOKEN_COOKIE_NAME = os.environ.get('REFRESH_TOKEN_COOKIE_NAME', 'equilo_refresh')
 REFRESH_TOKEN_COOKIE_PATH = os.environ.get('REFRESH_TOKEN_COOKIE_PATH', '/')
@@ -241,6 +282,10 @@ if os.environ.get('REFRESH_TOKEN_CROSS_SITE', '').lower() in ('1', 'true', 'yes'
     REFRESH_TOKEN_SAMESITE = 'None'
     REFRESH_TOKEN_COOKIE_SECURE = True
 
+# Merge expense-added notifications for the same place + recipient arriving within this
+# many seconds into one "N new expenses" row. 0 = one notification per expense.
+NOTIFICATION_COALESCE_WINDOW_SECONDS = int(os.environ.get('NOTIFICATION_COALESCE_WINDOW_SECONDS', '0'))
+
 # Cap concurrent device sessions (oldest revoked when exceeded)
 MAX_ACTIVE_SESSIONS_PER_USER = int(os.environ.get('MAX_ACTIVE_SESSIONS_PER_USER', '10'))
 
@@ -254,6 +299,10 @@ CORS_ALLOWED_ORIGINS = [
 if os.environ.get('CORS_ORIGINS'):
     CORS_ALLOWED_ORIGINS.extend(origin.strip() for origin in os.environ['CORS_ORIGINS'].split(','))
 CORS_ALLOW_CREDENTIALS = True
+from corsheaders.defaults import default_headers
+
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Retry-After']
 CORS_ALLOW_ALL_ORIGINS = False
 
 # Celery (broker for tasks; Beat runs auto_resolve_past_cycles daily)
@@ -281,9 +330,90 @@ else:
         }
     }
 
+# Rate limits (GCRA; see api/ratelimit_utils.py). "<count>/<period>" with period s/m/h/d,
+# optionally multiplied (e.g. "2/12h"). Shared through Redis when a URL is available.
+RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+RATELIMIT_URL = (os.environ.get('RATELIMIT_URL') or _redis_url or '').strip()
+RATELIMITS = {
+    'login': os.environ.get('RATELIMIT_LOGIN', '20/m'),            # per client IP
+    'login_user': os.environ.get('RATELIMIT_LOGIN_USER', '10/m'),  # per username
+    'register': os.environ.get('RATELIMIT_REGISTER', '10/h'),      # per client IP
+    'settlement': os.environ.get('RATELIMIT_SETTLEMENT', '30/m'),  # per user
+    'payment_request': os.environ.get('RATELIMIT_PAYMENT_REQUEST', '30/h'),  # per user
+    'expense_import': os.environ.get('RATELIMIT_EXPENSE_IMPORT', '20/h'),  # per user
+}
+
+# Responses to POSTs sent with an Idempotency-Key header are replayed for retries this long.
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+
+# Upper bound on rows read from one /places/<id>/expenses/import/ upload.
+EXPENSE_IMPORT_MAX_ROWS = int(os.environ.get('EXPENSE_IMPORT_MAX_ROWS', '10000'))
+
+# Session revocation fast path: access tokens with a `sid` are checked against a
+# cache-backed revocation set instead of the UserSession table. Needs a cache shared by
+# all workers, so it defaults on only when Redis is configured.
+SESSION_REVOCATION_FAST_PATH = os.environ.get(
+    'SESSION_REVOCATION_FAST_PATH', '1' if _redis_url else '0'
+).lower() in ('1', 'true', 'yes')
+# With the fast path, last_used_at is buffered in a Redis hash at SESSION_TOUCH_URL and
+# written with one bulk UPDATE at most every SESSION_TOUCH_INTERVAL_SECONDS by Celery Beat
+# or /api/cron/flush-session-touches/. Without a URL (local dev) it is written directly,
+# at most once per session per interval.
+SESSION_TOUCH_URL = (os.environ.get('SESSION_TOUCH_URL') or _redis_url or '').strip()
+SESSION_TOUCH_INTERVAL_SECONDS = int(os.environ.get('SESSION_TOUCH_INTERVAL_SECONDS', '60'))
+
+# Place-membership claims in access tokens (api/membership_utils.py): place-scoped views
+# check membership from the JWT instead of querying PlaceMember. Membership changes bump
+# a per-user version in the cache, so like the session fast path it needs a shared cache.
+PLACE_CLAIMS_IN_TOKENS = os.environ.get(
+    'PLACE_CLAIMS_IN_TOKENS', '1' if _redis_url else '0'
+).lower() in ('1', 'true', 'yes')
+PLACE_CLAIMS_MAX_PLACES = int(os.environ.get('PLACE_CLAIMS_MAX_PLACES', '50'))
+
+# Live updates (SSE at /api/events/). Redis pub/sub fans change events out across
+# workers/instances; without a Redis URL an in-process broker is used (local dev).
+REALTIME_BROKER_URL = (os.environ.get('REALTIME_BROKER_URL') or _redis_url or '').strip()
+REALTIME_HEARTBEAT_SECONDS = int(os.environ.get('REALTIME_HEARTBEAT_SECONDS', '15'))
+# Lifetime of the single-use ticket (POST /api/events/ticket/) that opens a stream.
+REALTIME_TICKET_SECONDS = int(os.environ.get('REALTIME_TICKET_SECONDS', '30'))
+
+# Activity log: entries are buffered per request and bulk-inserted after the response.
+# Set a Redis URL to spool them instead; drained by Celery Beat or /api/cron/drain-activity-log/
+# (scheduled every minute in vercel.json).
+ACTIVITY_LOG_SPOOL_URL = os.environ.get('ACTIVITY_LOG_SPOOL_URL', '').strip()
+
+# Upper bound (seconds) on work started by one /api/cron/* call; keep below the platform
+# function timeout. Unfinished work is resumed by the next call (see api/cron_utils.py).
+CRON_TIME_BUDGET_SECONDS = float(os.environ.get('CRON_TIME_BUDGET_SECONDS', '20'))
+
+# Cycle transition batch (api/tasks.py): per-place units run on a thread pool by default,
+# as Celery groups with "celery" (needs running workers and CELERY_RESULT_BACKEND; the
+# cron waits for each group's results within its budget), or one by one with "serial".
+CYCLE_TRANSITION_EXECUTOR = os.environ.get('CYCLE_TRANSITION_EXECUTOR', 'threads').strip().lower()
+CYCLE_TRANSITION_MAX_WORKERS = int(os.environ.get('CYCLE_TRANSITION_MAX_WORKERS', '4'))
+
+# Profile photos (api/photo_utils.py): uploads are stored raw and resized off-request on a
+# process pool ("process"), by Celery workers with "celery", inline after commit with
+# "sync", or only by the sweep with "cron". Vercel freezes a function once it responds, so
+# a pool there would never finish, and "sync" would put the resize on the request path:
+# the default is "cron" on Vercel (photos serve the raw upload until the next
+# /api/cron/process-profile-photos/ run) and "process" elsewhere. Pending photos are
+# swept by Celery Beat / that cron under every executor.
+PROFILE_PHOTO_EXECUTOR = os.environ.get(
+    'PROFILE_PHOTO_EXECUTOR', 'cron' if _on_vercel else 'process'
+).strip().lower()
+PROFILE_PHOTO_MAX_WORKERS = int(os.environ.get('PROFILE_PHOTO_MAX_WORKERS', '2'))
+# Cache-Control max-age for the content-addressed variant files (they never change).
+PROFILE_PHOTO_CACHE_SECONDS = int(os.environ.get('PROFILE_PHOTO_CACHE_SECONDS', str(365 * 24 * 3600)))
+
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Results are only kept for tasks that opt in (ignore_result=False), i.e. the per-place
+# cycle transition units the "celery" executor waits on.
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or CELERY_BROKER_URL
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_RESULT_EXPIRES = 3600
 
 # Email (Brevo SMTP relay). When EMAIL_HOST_USER is empty, falls back to console
 # backend so local dev can see the rendered email in the runserver log instead
@@ -296,11 +426,24 @@ EMAIL_HOST = 'smtp-relay.brevo.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_TIMEOUT = 10
-if EMAIL_HOST_USER and EMAIL_HOST_PASSWORD:
+if os.environ.get('EMAIL_BACKEND'):
+    # e.g. django.core.mail.backends.filebased.EmailBackend with EMAIL_FILE_PATH for local testing
+    EMAIL_BACKEND = os.environ['EMAIL_BACKEND']
+    EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
+elif EMAIL_HOST_USER and EMAIL_HOST_PASSWORD:
     EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 else:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Email outbox (api/outbox_utils.py): requests enqueue rendered mail and a drainer sends it
+# in batches over one connection (Celery Beat every minute, or /api/cron/drain-email-outbox/,
+# which vercel.json schedules every minute). Mail waits until a drainer runs, so it defaults
+# on only when Redis/Celery is configured; on other hosts schedule Beat or the cron URL.
+EMAIL_OUTBOX_ENABLED = os.environ.get(
+    'EMAIL_OUTBOX_ENABLED', '1' if _redis_url else '0'
+).lower() in ('1', 'true', 'yes')
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+
 # Public URLs used by transactional email:
 #   FRONTEND_URL — base for "open the app" deep links (the React SPA)
 #   BACKEND_URL  — base for backend-served URLs (unsubscribe). Defaults to
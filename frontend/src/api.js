@@ -106,6 +106,29 @@ async function fetchWithTimeout(input, init = {}, timeoutMs = DEFAULT_TIMEOUT_MS
   }
 }
 
+/**
+ * POST that is safe to retry: one Idempotency-Key per call, reused for retries after
+ * network errors/timeouts so the server replays its first response instead of duplicating.
+ */
+export async function idempotentPost(url, body, retries = 2) {
+  const key = typeof crypto !== 'undefined' && crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+  for (let attempt = 0; ; attempt += 1) {
+    try {
+      return await api(url, {
+        method: 'POST',
+        headers: { 'Idempotency-Key': key },
+        body: JSON.stringify(body),
+      });
+    } catch (err) {
+      const retryable = err instanceof TypeError || err?.status === 0 || err?.status === 409;
+      if (!retryable || attempt >= retries) throw err;
+      await new Promise((resolve) => window.setTimeout(resolve, 500 * (attempt + 1)));
+    }
+  }
+}
+
 export async function api(url, options = {}) {
   const { _didRefresh, ...fetchOptions } = options;
   const headers = {
@@ -241,6 +264,60 @@ export async function getPlaceCount() {
 
 export const dashboard = () => api('/dashboard/');
 
+/**
+ * Subscribe to live change events ({ place_id, entity, version }) so pages refetch only when
+ * something changed. Each connect opens the stream with a fresh single-use ticket from
+ * POST /events/ticket/, so the access token never goes in a URL. Returns a handle (call
+ * .close() to stop), or null when unsupported.
+ */
+export function openEventStream(onChange) {
+  if (!getAccessToken() || typeof EventSource === 'undefined') return null;
+  let source = null;
+  let closed = false;
+  let retryId = null;
+  let delay = 5000;
+
+  const connect = async () => {
+    let ticket;
+    try {
+      ({ ticket } = await api('/events/ticket/', { method: 'POST' }));
+    } catch {
+      return; /* signed out or API unreachable: pages keep their normal fetches */
+    }
+    if (closed || !ticket) return;
+    let opened = false;
+    source = new EventSource(`${API_BASE}/events/?ticket=${encodeURIComponent(ticket)}`);
+    source.addEventListener('open', () => {
+      opened = true;
+      delay = 5000;
+    });
+    source.addEventListener('change', (e) => {
+      try {
+        onChange(JSON.parse(e.data));
+      } catch {
+        /* ignore malformed events */
+      }
+    });
+    source.addEventListener('error', () => {
+      // The browser would reconnect with the spent ticket; reconnect ourselves with a new one.
+      source.close();
+      // Never opened: no ASGI server (501) or ticket refused, so stay on polling.
+      if (closed || !opened) return;
+      retryId = window.setTimeout(connect, delay);
+      delay = Math.min(delay * 2, 60000);
+    });
+  };
+
+  connect();
+  return {
+    close() {
+      closed = true;
+      window.clearTimeout(retryId);
+      if (source) source.close();
+    },
+  };
+}
+
 export const activity = (limit = 50) =>
   api(`/activity/?limit=${encodeURIComponent(String(limit))}`);
 
@@ -251,10 +328,7 @@ export const places = {
   update: (id, body) => api(`/places/${id}/`, { method: 'PATCH', body: JSON.stringify(body) }),
   delete: (id) => api(`/places/${id}/`, { method: 'DELETE' }),
   requestPayment: (placeId, userId) =>
-    api(`/places/${placeId}/request_payment/`, {
-      method: 'POST',
-      body: JSON.stringify({ user_id: userId }),
-    }),
+    idempotentPost(`/places/${placeId}/request_payment/`, { user_id: userId }),
   leave: (placeId) =>
     api(`/places/${placeId}/leave/`, { method: 'POST' }),
 };
@@ -291,15 +365,31 @@ export const expenses = (placeId) => ({
     if (params.page != null) sp.set('page', String(params.page));
     if (params.page_size != null) sp.set('page_size', String(params.page_size));
     if (params.cycle_id != null) sp.set('cycle_id', String(params.cycle_id));
+    if (params.pagination != null) sp.set('pagination', String(params.pagination));
+    if (params.cursor != null) sp.set('cursor', String(params.cursor));
+    // Ids + one `included` block of users / categories / cycles instead of nested objects
+    if (params.normalized) sp.set('normalized', '1');
+    // Search / filters (q, category, category_type, paid_by, amount_min, amount_max, date_from, date_to)
+    for (const key of ['q', 'category', 'category_type', 'paid_by', 'amount_min', 'amount_max', 'date_from', 'date_to']) {
+      if (params[key] != null && params[key] !== '') sp.set(key, String(params[key]));
+    }
     const qs = sp.toString();
     return api(`/places/${placeId}/expenses/${qs ? `?${qs}` : ''}`);
   },
   get: (id) => api(`/places/${placeId}/expenses/${id}/`),
-  create: (body) =>
-    api(`/places/${placeId}/expenses/`, { method: 'POST', body: JSON.stringify(body) }),
+  create: (body) => idempotentPost(`/places/${placeId}/expenses/`, body),
   update: (id, body) =>
     api(`/places/${placeId}/expenses/${id}/`, { method: 'PATCH', body: JSON.stringify(body) }),
   delete: (id) => api(`/places/${placeId}/expenses/${id}/`, { method: 'DELETE' }),
+  /** Apply one op (delete | set_category | set_paid_by | set_splits) to many expenses. */
+  bulk: (ids, op, value) =>
+    api(`/places/${placeId}/expenses/bulk/`, { method: 'POST', body: JSON.stringify({ ids, op, value }) }),
+  /** Bulk import from a CSV / NDJSON File. Resolves to { imported, failed, errors, truncated }. */
+  import: (file, { dryRun = false } = {}) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    return apiWithFormData(`/places/${placeId}/expenses/import/${dryRun ? '?dry_run=1' : ''}`, formData, 'POST');
+  },
 });
 
 export const invites = (placeId) => ({
@@ -324,8 +414,7 @@ export const summary = (placeId, params = {}) => {
 export const settlements = (placeId) => ({
   list: () => api(`/places/${placeId}/settlements/`),
 });
-export const settlementCreate = (body) =>
-  api('/settlements/', { method: 'POST', body: JSON.stringify(body) });
+export const settlementCreate = (body) => idempotentPost('/settlements/', body);
 
 export const inviteByToken = (token) => api(`/invite/${token}/`);
 export const joinPlace = (token) => api(`/join/${token}/`, { method: 'POST' });
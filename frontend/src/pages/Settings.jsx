@@ -126,7 +126,8 @@ export default function Settings() {
     return () => { if (photoPreviewUrl) URL.revokeObjectURL(photoPreviewUrl); };
   }, [photoPreviewUrl]);
 
-  const effectivePhotoUrl = photoPreviewUrl ?? (removePhoto ? '' : user?.profile_photo ?? '');
+  const savedPhotoUrl = user?.profile_photo_variants?.webp?.['512'] ?? user?.profile_photo ?? '';
+  const effectivePhotoUrl = photoPreviewUrl ?? (removePhoto ? '' : savedPhotoUrl);
   const displayLabel = displayName.trim() || user?.username || '';
 
   useEffect(() => {